@@ -0,0 +1,168 @@
+"""瀏覽器設定比較：legacy (原本的完整載入) vs lean (eager + 擋資源) 的頁面就緒時間與記憶體
+
+    python -m benchmarks.bench_browser [--repeat 5] [--asset-delay 0.3]
+
+替身伺服器在富邦頁面裡插入圖片、字型、CSS 與「第三方」廣告腳本 (另一個 port)，每個資源延遲
+--asset-delay 秒回應，模擬真實頁面。需要本機有 Chromium 與 chromedriver。
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from benchmarks.fixture_server import fixture_path
+from chipk import fetch
+from chipk.browser import BLOCKED_URLS, block_urls, build_driver
+
+ASSETS = {
+    ".png": ("image/png", b"\x89PNG\r\n\x1a\n" + b"\0" * 60_000),
+    ".woff2": ("font/woff2", b"\0" * 40_000),
+    ".css": ("text/css", b"body{margin:0}" * 2_000),
+    ".js": ("application/javascript", b"/* ad */" * 5_000),
+}
+
+def heavy_page(html, third_party):
+    """在 </head> 前插入一般新聞/券商頁面常見的資源"""
+    tags = "".join([
+        '<link rel="stylesheet" href="/static/site.css">',
+        '<style>@font-face{font-family:x;src:url(/static/font.woff2)}body{font-family:x}</style>',
+        *(f'<img src="/static/banner{i}.png">' for i in range(6)),
+        f'<script src="{third_party}/static/ads.js"></script>',
+    ])
+    return html.replace(b"</head>", tags.encode() + b"</head>", 1)
+
+def make_handler(asset_delay, third_party):
+    class HeavyHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            ext = os.path.splitext(url.path)[1]
+            if url.path.startswith("/static/") and ext in ASSETS:
+                threading.Event().wait(asset_delay)
+                ctype, body = ASSETS[ext]
+            else:
+                path = fixture_path(url.path, url.query)
+                if path is None or not os.path.exists(path):
+                    self.send_error(404)
+                    return
+                with open(path, "rb") as f:
+                    body = heavy_page(f.read(), third_party)
+                ctype = "text/html"
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return HeavyHandler
+
+@contextmanager
+def serve_heavy(asset_delay):
+    # 第三方用 localhost 而非 127.0.0.1，才能以主機名稱擋掉
+    ad_server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(asset_delay, ""))
+    third_party = f"http://localhost:{ad_server.server_address[1]}"
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(asset_delay, third_party))
+    servers = [ad_server, server]
+    for s in servers:
+        s.daemon_threads = True
+        threading.Thread(target=s.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}", f"*localhost:{ad_server.server_address[1]}*"
+    finally:
+        for s in servers:
+            s.shutdown()
+            s.server_close()
+
+def _children(pid):
+    """Linux：從 /proc 找出 pid 底下所有子孫程序"""
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        parents.setdefault(ppid, []).append(int(entry))
+    found, todo = [], [pid]
+    while todo:
+        kids = parents.get(todo.pop(), [])
+        found += kids
+        todo += kids
+    return found
+
+def rss_mb(driver):
+    """chromedriver 與其下所有 Chromium 程序的 RSS 總和 (MB)；非 Linux 時為 None"""
+    if not os.path.isdir("/proc"):
+        return None
+    pid = driver.service.process.pid
+    total = 0
+    for p in [pid] + _children(pid):
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+        except OSError:
+            continue
+    return total / 1024
+
+def page_ready(driver, url):
+    """driver.get 到明細表格出現的時間"""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    t0 = time.perf_counter()
+    driver.get(url)
+    WebDriverWait(driver, 30).until(EC.presence_of_element_located((By.XPATH, "//*[contains(text(), '日期')]")))
+    return time.perf_counter() - t0
+
+def measure(profile, url, extra_blocked, repeat):
+    t0 = time.perf_counter()
+    driver = build_driver(profile)
+    start_s = time.perf_counter() - t0
+    try:
+        if profile != "legacy":
+            block_urls(driver, BLOCKED_URLS + [extra_blocked])
+        page_ready(driver, url)  # 暖機
+        samples = [page_ready(driver, url) for _ in range(repeat)]
+        return {"start_s": start_s, "median_s": statistics.median(samples), "best_s": min(samples),
+                "rss_mb": rss_mb(driver)}
+    finally:
+        driver.quit()
+
+def run(repeat=5, asset_delay=0.3):
+    original_base = fetch.FUBON_BASE
+    with serve_heavy(asset_delay) as (base, extra_blocked):
+        fetch.FUBON_BASE = base
+        try:
+            url = fetch.broker_daily_url("2313", ("9200", "9268", "1"), "2024-01-01", "2024-12-31")
+            results = {p: measure(p, url, extra_blocked, repeat) for p in ("legacy", "lean")}
+        finally:
+            fetch.FUBON_BASE = original_base
+
+    print(f"{'profile':<8} {'啟動 s':>8} {'就緒中位數 s':>12} {'最佳 s':>8} {'RSS MB':>8}")
+    for name, r in results.items():
+        rss = f"{r['rss_mb']:.0f}" if r["rss_mb"] is not None else "-"
+        print(f"{name:<8} {r['start_s']:>8.2f} {r['median_s']:>12.3f} {r['best_s']:>8.3f} {rss:>8}")
+    legacy, lean = results["legacy"], results["lean"]
+    print(f"頁面就緒快 {legacy['median_s'] / lean['median_s']:.1f}x")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--asset-delay", type=float, default=0.3, help="每個圖片/字型/CSS/廣告資源的回應延遲秒數")
+    args = parser.parse_args()
+    run(args.repeat, args.asset_delay)
+
+if __name__ == "__main__":
+    main()
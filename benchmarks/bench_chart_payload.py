@@ -0,0 +1,177 @@
+"""每次重跑送到瀏覽器的圖表大小：舊版 (基準版 main.py 原樣：全量日K、深拷貝兩份) 與新版 (細節層級、單一張圖) 比較
+
+    python -m benchmarks.bench_chart_payload [--days 490]
+"""
+import argparse
+import copy
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+from plotly.subplots import make_subplots
+
+from chipk.chart import COLOR_DOWN, COLOR_UP, build_chart, prepare_plot_df
+
+# ---- 測試資料 ----
+
+def make_chart_frame(n, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2024-01-02", periods=n)
+    close = 100 + np.cumsum(rng.normal(0, 1.5, n))
+    df = pd.DataFrame({
+        "Date": dates,
+        "DateStr": dates.strftime("%Y-%m-%d"),
+        "Open": close + rng.normal(0, 0.5, n),
+        "High": close + 2,
+        "Low": close - 2,
+        "Close": close,
+        "Volume": rng.integers(1_000, 50_000, n),
+        "買賣超_Final": rng.integers(-800, 800, n),
+    })
+    for w in (5, 10, 20, 60):
+        df[f"MA{w}"] = df["Close"].rolling(w, min_periods=1).mean()
+    df["cumulative_net"] = df["買賣超_Final"].cumsum()
+    return df
+
+# ---- 舊版 main.py (基準版本) 原樣的圖 ----
+
+SELECTED_MAS = ("MA5", "MA10", "MA20")  # App 預設勾選的均線
+RANK_START, RANK_END = "2025-04-01", "2025-06-30"
+
+def _safe_update(update, row, col, **kwargs):
+    try:
+        update(row=row, col=col, **kwargs)
+    except ValueError:
+        for k in ("showspikelabels", "spikesnap", "ticklabelposition"):
+            kwargs.pop(k, None)
+        update(row=row, col=col, **kwargs)
+
+def build_legacy_figure(merged_df, start_dt):
+    """照搬基準版 main.py：全量日K、2 欄 customdata、逐日列出缺日的 rangebreaks"""
+    plot_df = merged_df.copy()
+    plot_df["Date"] = pd.to_datetime(plot_df["DateStr"], errors="coerce")
+    plot_df = plot_df.dropna(subset=["Date"]).sort_values("Date").reset_index(drop=True)
+    x_range_end_val = plot_df["Date"].iloc[-1] + timedelta(days=3)
+
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.03,
+                        row_heights=[0.85, 0.15], specs=[[{"secondary_y": False}], [{"secondary_y": True}]])
+    x_data = plot_df["Date"]
+
+    trading_days = pd.DatetimeIndex(pd.to_datetime(plot_df["Date"]).dt.normalize().dropna().unique()).sort_values()
+    missing_days_dt = pd.date_range(trading_days[0], trading_days[-1], freq="D").difference(trading_days)
+    missing_dates = [d.strftime("%Y-%m-%d") for d in missing_days_dt]
+
+    plot_df["買賣超_Final"] = pd.to_numeric(plot_df.get("買賣超_Final", 0), errors="coerce").fillna(0)
+    custom = np.stack([
+        plot_df["DateStr"].astype(str).to_numpy(),
+        plot_df["買賣超_Final"].to_numpy(dtype=float),
+    ], axis=-1)
+
+    fig.add_trace(go.Candlestick(
+        x=x_data, open=plot_df["Open"], high=plot_df["High"], low=plot_df["Low"], close=plot_df["Close"],
+        name="股價", increasing_line_color=COLOR_UP, decreasing_line_color=COLOR_DOWN,
+        increasing_fillcolor=COLOR_UP, decreasing_fillcolor=COLOR_DOWN, hoverinfo="skip",
+    ), row=1, col=1)
+    fig.add_trace(go.Scatter(
+        x=x_data, y=plot_df["Close"], mode="markers", marker=dict(size=18, opacity=0), customdata=custom,
+        hovertemplate=("<b>日期：%{customdata[0]}</b><br><b>收盤：%{y:.1f}</b><br>"
+                       "<b>買賣超：%{customdata[1]:,.0f} 張</b><extra></extra>"),
+        showlegend=False,
+    ), row=1, col=1)
+
+    ma_colors = {"MA5": "orange", "MA10": "cyan", "MA20": "magenta", "MA60": "green"}
+    for ma in SELECTED_MAS:
+        fig.add_trace(go.Scatter(
+            x=x_data, y=pd.to_numeric(plot_df[ma], errors="coerce"), name=ma, mode="lines", connectgaps=True,
+            line=dict(color=ma_colors.get(ma, "white"), width=1.5), hoverinfo="skip",
+        ), row=1, col=1)
+
+    extended_buy_sell = list(merged_df["買賣超_Final"])
+    bar_colors = [COLOR_UP if (v is not None and v > 0) else COLOR_DOWN if (v is not None and v < 0) else "gray"
+                  for v in extended_buy_sell]
+    fig.add_trace(go.Bar(x=x_data, y=extended_buy_sell, name="每日買賣超", marker_color=bar_colors,
+                         opacity=0.55, hoverinfo="skip"), row=2, col=1, secondary_y=False)
+    fig.add_trace(go.Scatter(x=x_data, y=pd.to_numeric(merged_df["cumulative_net"], errors="coerce"),
+                             name="兩年累計買賣超", mode="lines", line=dict(color="yellow", width=2.5),
+                             connectgaps=True, hoverinfo="skip"), row=2, col=1, secondary_y=True)
+    fig.add_vrect(x0=pd.to_datetime(RANK_START), x1=pd.to_datetime(RANK_END), fillcolor="gray", opacity=0.15,
+                  layer="below", line_width=0, annotation_text="統計區間", annotation_position="top left",
+                  row="all", col=1)
+
+    _safe_update(fig.update_yaxes, 1, 1, autorange=True, fixedrange=True, showgrid=True,
+                 gridcolor="rgba(128,128,128,0.2)", ticklabelposition="inside",
+                 tickfont=dict(size=10, color="rgba(255,255,255,0.7)"),
+                 showspikes=True, spikemode="across", spikesnap="data", showspikelabels=True,
+                 spikedash="solid", spikecolor="rgba(255,255,255,0.6)", spikethickness=1)
+    fig.update_yaxes(fixedrange=True, showticklabels=True, row=2, col=1, secondary_y=False, showgrid=True,
+                     gridcolor="rgba(128,128,128,0.2)", ticklabelposition="inside",
+                     tickfont=dict(size=10, color="rgba(255,255,255,0.7)"))
+    fig.update_yaxes(fixedrange=True, showticklabels=True, row=2, col=1, secondary_y=True, showgrid=False,
+                     ticklabelposition="inside", tickfont=dict(size=10, color="yellow"))
+    for row in (1, 2):
+        _safe_update(fig.update_xaxes, row, 1, type="date", rangebreaks=[dict(values=missing_dates)],
+                     range=[start_dt, x_range_end_val], fixedrange=False,
+                     showspikes=True, spikemode="across", spikesnap="data", showspikelabels=True,
+                     spikedash="solid", spikecolor="rgba(255,255,255,0.6)", spikethickness=1)
+
+    fig.update_layout(
+        xaxis_rangeslider_visible=False, plot_bgcolor="rgba(20,20,20,1)", paper_bgcolor="rgba(20,20,20,1)",
+        font=dict(color="white", size=12),
+        title=dict(text="bench - 股價 籌碼追蹤", font=dict(size=28, color="white"), x=0, xanchor="left",
+                   y=0.985, yanchor="top", pad=dict(t=8, b=0, l=0, r=0)),
+        hovermode="x unified",
+        hoverlabel=dict(bgcolor="rgba(0,0,0,0.78)", bordercolor="rgba(255,255,255,0.25)",
+                        font=dict(color="white", size=16), align="left"),
+        spikedistance=-1, hoverdistance=50,
+        legend=dict(orientation="h", y=0.88, yanchor="top", x=0, xanchor="left", bgcolor="rgba(0,0,0,0.5)",
+                    font=dict(size=10)),
+    )
+    return fig
+
+def payload_bytes(fig):
+    # st.plotly_chart 以 plotly.io.to_json 序列化圖表
+    return len(pio.to_json(fig, validate=False).encode("utf-8"))
+
+def legacy_rerun(df, start_dt):
+    fig = build_legacy_figure(df, start_dt)
+    fig_desktop = copy.deepcopy(fig)
+    fig_mobile = copy.deepcopy(fig)
+    fig_desktop.update_layout(height=800, dragmode="pan", margin=dict(l=0, r=0, t=120, b=0))
+    fig_mobile.update_layout(height=520, dragmode="pan",
+                             title={**fig.layout.title.to_plotly_json(), "y": 1.0, "yanchor": "top"},
+                             margin=dict(l=0, r=0, t=100, b=0))
+    return payload_bytes(fig_desktop) + payload_bytes(fig_mobile)
+
+def current_rerun(df, start_dt):
+    plot_df = prepare_plot_df(df)
+    fig = build_chart(plot_df, start_dt, plot_df["Date"].iloc[-1], [dict(bounds=["sat", "mon"])], "bench",
+                      selected_mas=SELECTED_MAS, has_flow=True)
+    return payload_bytes(fig)
+
+def timed(fn, *args, repeat=3):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return out, best
+
+def run(days=490):
+    df = make_chart_frame(days)
+    results = []
+    for label, n in (("3月", 60), ("1年", 240), ("全部", days)):
+        start_dt = df["Date"].iloc[max(0, days - n)]
+        old_bytes, old_t = timed(legacy_rerun, df, start_dt)
+        new_bytes, new_t = timed(current_rerun, df, start_dt)
+        results.append((label, old_bytes, old_t, new_bytes, new_t))
+        print(f"{label:<4} 舊版 {old_bytes / 1024:8.1f} KB {old_t * 1000:7.1f} ms | "
+              f"新版 {new_bytes / 1024:8.1f} KB {new_t * 1000:7.1f} ms | {old_bytes / new_bytes:4.1f}x")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=490)
+    run(parser.parse_args().days)
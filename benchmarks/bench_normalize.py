@@ -0,0 +1,83 @@
+"""向量化整理 (chipk.normalize) 與舊版逐列寫法的速度比較
+
+    python -m benchmarks.bench_normalize [--rows 200000]
+"""
+import argparse
+import re
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from chipk.normalize import parse_dates, to_int, to_number
+
+# ---- 舊版寫法 (取自原本 main.py)，只作為比較基準 ----
+
+def legacy_clean_numbers(s):
+    s = s.astype(str).str.replace(',', '', regex=False).str.replace('+', '', regex=False).str.replace('nan', '', regex=False)
+    return pd.to_numeric(s, errors='coerce').fillna(0)
+
+def legacy_parse_date(d_str):
+    s = str(d_str).strip()
+    parts = re.split(r'[/-]', s)
+    if len(parts) == 3:
+        y, m, d = int(parts[0]), int(parts[1]), int(parts[2])
+        if y < 1911: y += 1911
+        return f"{y:04d}-{m:02d}-{d:02d}"
+    elif len(parts) == 2:
+        m, d = int(parts[0]), int(parts[1])
+        now = datetime.now()
+        y = now.year
+        if m > now.month + 2: y -= 1
+        return f"{y:04d}-{m:02d}-{d:02d}"
+    return None
+
+# ---- 測試資料 ----
+
+def make_numbers(n, seed=0):
+    rng = np.random.default_rng(seed)
+    values = rng.integers(-50000, 50000, n)
+    out = pd.Series([f"{v:+,}" if i % 3 else f"{v:,}" for i, v in enumerate(values)], dtype=object)
+    out[::97] = np.nan
+    return out
+
+def make_roc_dates(n):
+    start = date(2024, 1, 1)
+    days = [start + timedelta(days=i % 700) for i in range(n)]
+    return pd.Series([f"{d.year - 1911}/{d.month:02d}/{d.day:02d}" for d in days], dtype=object)
+
+def timed(fn, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def run(rows=200_000):
+    numbers = make_numbers(rows)
+    dates = make_roc_dates(rows)
+
+    assert (legacy_clean_numbers(numbers) == to_number(numbers)).all()
+    assert (dates.apply(legacy_parse_date) == parse_dates(dates)).all()
+
+    results = {
+        "numbers_legacy_s": timed(legacy_clean_numbers, numbers),
+        "numbers_vectorized_s": timed(to_int, numbers),
+        "dates_legacy_s": timed(lambda s: s.apply(legacy_parse_date), dates),
+        "dates_vectorized_s": timed(parse_dates, dates),
+    }
+    results["numbers_speedup"] = results["numbers_legacy_s"] / results["numbers_vectorized_s"]
+    results["dates_speedup"] = results["dates_legacy_s"] / results["dates_vectorized_s"]
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    args = parser.parse_args()
+    for k, v in run(args.rows).items():
+        print(f"{k:24s} {v:10.4f}")
+
+if __name__ == "__main__":
+    main()
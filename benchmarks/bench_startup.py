@@ -0,0 +1,57 @@
+"""冷啟動成本：在全新的 Python 程序裡執行 main.py 頂層的 import，與 CLI 啟動時間
+
+    python -m benchmarks.bench_startup [--repeat 5]
+"""
+import argparse
+import ast
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def top_level_imports(path):
+    """取出檔案最外層的 import 敘述 (不執行 Streamlit 畫面程式)"""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+def cold_run(args, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, *args], cwd=ROOT, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples), min(samples)
+
+def heavy_modules(code):
+    # 列出頂層 import 之後已載入的重量級套件
+    probe = code + "\nimport sys\nprint(','.join(m for m in ('selenium', 'plotly', 'yfinance', 'twstock', 'webdriver_manager', 'lxml') if m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, capture_output=True, text=True, check=True)
+    return out.stdout.strip().splitlines()[-1] if out.stdout.strip() else ""
+
+def run(repeat=5):
+    app_imports = top_level_imports(os.path.join(ROOT, "main.py"))
+    baseline = cold_run(["-c", "import streamlit, pandas"], repeat)
+    app = cold_run(["-c", app_imports], repeat)
+    cli = cold_run(["-m", "chipk", "--help"], repeat)
+    return {
+        "python_streamlit_pandas_s": baseline[0],
+        "main_imports_s": app[0],
+        "main_imports_extra_s": app[0] - baseline[0],
+        "cli_help_s": cli[0],
+        "main_heavy_modules": heavy_modules(app_imports),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    for k, v in run(args.repeat).items():
+        print(f"{k:28s} {v:10.3f}" if isinstance(v, float) else f"{k:28s} {v}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""以 fixtures/ 的頁面 (仿富邦格式的合成頁面或重新錄製的頁面) 充當本機替身伺服器，離線跑抓取流程
+
+    python -m benchmarks.fixture_server [--port 8766] [--delay 0.05]
+    CHIPK_FUBON_BASE=http://127.0.0.1:8766 streamlit run main.py
+"""
+import argparse
+import os
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+def fixture_path(path, query):
+    """zco.djhtm → zco.html；zco0.djhtm 依 page 參數對應 zco0_p{N}.html (股票、分點、日期一律忽略)"""
+    name = path.rsplit("/", 1)[-1]
+    if name == "zco.djhtm":
+        return os.path.join(FIXTURE_DIR, "zco.html")
+    if name == "zco0.djhtm":
+        params = {k.lower(): v[0] for k, v in parse_qs(query).items()}
+        page = params.get("page", "1")
+        if page.isdigit():
+            return os.path.join(FIXTURE_DIR, f"zco0_p{int(page)}.html")
+    return None
+
+def make_handler(delay):
+    class FixtureHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            path = fixture_path(url.path, url.query)
+            if path is None or not os.path.exists(path):
+                self.send_error(404)
+                return
+            if delay:
+                threading.Event().wait(delay)
+            with open(path, "rb") as f:
+                body = f.read()
+            # 與富邦相同：header 不帶 charset，編碼寫在 <meta>
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return FixtureHandler
+
+@contextmanager
+def serve_fixtures(port=0, delay=0.0):
+    """背景執行替身伺服器，yield 其網址 (可直接當作 FUBON_BASE)"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(delay))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--delay", type=float, default=0.0, help="每個回應前的模擬延遲秒數")
+    args = parser.parse_args()
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(args.delay))
+    print(f"serving {FIXTURE_DIR} on http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
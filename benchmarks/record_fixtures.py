@@ -0,0 +1,54 @@
+"""從富邦錄製實際頁面取代 benchmarks/fixtures 的合成頁面 (原始 Big5 位元組，不做任何轉換)
+
+    python -m benchmarks.record_fixtures --stock 2313 --start 2025-10-15 --end 2026-10-15
+"""
+import argparse
+import os
+
+from chipk.fetch import broker_daily_url, decode_html, get_session, ranking_url
+from chipk.parsing import broker_key_of, find_broker_params, parse_ranking_html, resolve_page_urls
+
+from benchmarks.fixture_server import FIXTURE_DIR
+
+def fetch_raw(url, timeout=15):
+    resp = get_session().get(url, timeout=timeout)
+    resp.raise_for_status()
+    return resp.content
+
+def save(name, content):
+    path = os.path.join(FIXTURE_DIR, name)
+    with open(path, "wb") as f:
+        f.write(content)
+    print(f"{path}  {len(content):,} bytes")
+
+def record(stock_id, start_date, end_date):
+    url = ranking_url(stock_id, start_date, end_date)
+    raw = fetch_raw(url)
+    parsed = parse_ranking_html(decode_html(raw), url)
+    if parsed is None:
+        raise SystemExit(f"排行頁沒有資料：{url}")
+    save("zco.html", raw)
+
+    # 以買超第一名的分點錄製每日明細的所有分頁
+    df_buy, _, _, _, broker_info = parsed
+    broker_key = broker_key_of(find_broker_params(broker_info, df_buy["broker"].iloc[0]))
+    detail_url = broker_daily_url(stock_id, broker_key, start_date, end_date)
+    first = fetch_raw(detail_url)
+    page_urls = resolve_page_urls(decode_html(first), detail_url) or []
+    for old in os.listdir(FIXTURE_DIR):
+        if old.startswith("zco0_p"):
+            os.remove(os.path.join(FIXTURE_DIR, old))
+    save("zco0_p1.html", first)
+    for i, page_url in enumerate(page_urls, start=2):
+        save(f"zco0_p{i}.html", fetch_raw(page_url))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stock", default="2313")
+    parser.add_argument("--start", required=True)
+    parser.add_argument("--end", required=True)
+    args = parser.parse_args()
+    record(args.stock, args.start, args.end)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""以錄製的富邦頁面跑整套計時 (解析、抓取流程、合併累計、畫圖)，結果存成 JSON 供版本間比較
+
+    python -m benchmarks.suite [--repeat 5] [--out benchmarks/results/mine.json]
+                               [--compare benchmarks/results/baseline.json]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+
+from chipk import fetch
+from chipk.fetch import decode_html, fetch_broker_daily, fetch_ranking
+from chipk.chart import build_chart, merge_broker_flow, prepare_plot_df
+from chipk.normalize import parse_dates
+from chipk.parsing import (
+    clean_sub_df,
+    extract_daily_table,
+    parse_broker_daily_frames,
+    parse_ranking_html,
+)
+
+from benchmarks.bench_chart_payload import payload_bytes
+from benchmarks.fixture_server import FIXTURE_DIR, serve_fixtures
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+REGRESSION_RATIO = 1.2  # 比基準慢超過 20% 就標示
+
+STOCK_ID = "2313"
+BROKER_KEY = ("9200", "9200", "1")
+START_DATE, END_DATE = "2025-10-15", "2026-10-15"
+
+# ---- 測試資料 ----
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURE_DIR, name), "rb") as f:
+        return decode_html(f.read())
+
+def load_daily_pages():
+    names = sorted((n for n in os.listdir(FIXTURE_DIR) if n.startswith("zco0_p")),
+                   key=lambda n: int(n[len("zco0_p"):-len(".html")]))
+    return [load_fixture(n) for n in names]
+
+def raw_ranking_sides(html):
+    # 與 parse_ranking_html 相同的切法，留給 clean_sub_df 計時
+    for table in pd.read_html(StringIO(html), match="買超券商"):
+        hits = table.index[table.astype(str).eq("買超券商").any(axis=1)]
+        if len(hits):
+            body = table.iloc[hits[0] + 1:]
+            sides = []
+            for cols in ([0, 1, 2, 3, 4], [5, 6, 7, 8, 9]):
+                side = body.iloc[:, cols].copy()
+                side.columns = ['broker', 'buy', 'sell', 'net', 'pct']
+                sides.append(side)
+            return sides
+    raise ValueError("fixture 沒有排行表")
+
+def price_frame(dates):
+    rng = np.random.default_rng(0)
+    close = 100 + np.cumsum(rng.normal(0, 1.5, len(dates)))
+    df = pd.DataFrame({
+        "DateStr": dates, "Open": close, "High": close + 2, "Low": close - 2,
+        "Close": close, "Volume": rng.integers(1_000, 50_000, len(dates)),
+    })
+    for w in (5, 10, 20, 60):
+        df[f"MA{w}"] = df["Close"].rolling(w, min_periods=1).mean()
+    return df
+
+def chart_figure(merged_df):
+    plot_df = prepare_plot_df(merged_df)
+    start_dt = plot_df["Date"].iloc[max(0, len(plot_df) - 60)]
+    fig = build_chart(plot_df, start_dt, plot_df["Date"].iloc[-1], [dict(bounds=["sat", "mon"])], "bench",
+                      selected_mas=("MA5", "MA10", "MA20"), has_flow=True)
+    return payload_bytes(fig)
+
+# ---- 計時 ----
+
+def timed(fn, repeat):
+    fn()  # 暖身：第一次 import / 連線建立不計
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return {
+        "best_ms": round(min(samples) * 1000, 3),
+        "median_ms": round(statistics.median(samples) * 1000, 3),
+        "repeat": repeat,
+    }
+
+def run(repeat=5, delay=0.0):
+    ranking_html = load_fixture("zco.html")
+    daily_pages = load_daily_pages()
+    buy_side, sell_side = raw_ranking_sides(ranking_html)
+    daily_tables = [extract_daily_table(html) for html in daily_pages]
+    broker_daily_df = parse_broker_daily_frames(daily_tables)
+    raw_dates = pd.concat([t.iloc[:, 0] for t in daily_tables] * 20, ignore_index=True).astype(str)
+    df_price = price_frame(sorted(broker_daily_df["DateStr"].unique()))
+    merged_df = merge_broker_flow(df_price, broker_daily_df)
+
+    benches = {
+        "parse.read_html_ranking": lambda: pd.read_html(StringIO(ranking_html), match="買超券商"),
+        "parse.ranking_page": lambda: parse_ranking_html(ranking_html, fetch.ranking_url(STOCK_ID, START_DATE, END_DATE)),
+        "parse.clean_sub_df": lambda: (clean_sub_df(buy_side.copy()), clean_sub_df(sell_side.copy())),
+        "parse.daily_tables": lambda: [extract_daily_table(html) for html in daily_pages],
+        "parse.dates": lambda: parse_dates(raw_dates),
+        "parse.broker_daily_frames": lambda: parse_broker_daily_frames(daily_tables),
+        "merge.cumsum": lambda: merge_broker_flow(df_price, broker_daily_df),
+        "chart.figure": lambda: chart_figure(merged_df),
+    }
+
+    results = {name: timed(fn, repeat) for name, fn in benches.items()}
+
+    with serve_fixtures(delay=delay) as base:
+        original_base = fetch.FUBON_BASE
+        fetch.FUBON_BASE = base
+        try:
+            assert fetch_ranking(STOCK_ID, START_DATE, END_DATE) is not None, "替身伺服器的排行頁解析失敗"
+            assert fetch_broker_daily(STOCK_ID, BROKER_KEY, START_DATE, END_DATE)[0] is not None, "替身伺服器的明細頁解析失敗"
+            results["fetch.ranking"] = timed(lambda: fetch_ranking(STOCK_ID, START_DATE, END_DATE), repeat)
+            results["fetch.broker_daily"] = timed(
+                lambda: fetch_broker_daily(STOCK_ID, BROKER_KEY, START_DATE, END_DATE), repeat
+            )
+        finally:
+            fetch.FUBON_BASE = original_base
+
+    return {"meta": run_meta(repeat, delay), "results": results}
+
+def git_revision():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(__file__), timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def run_meta(repeat, delay):
+    return {
+        "revision": git_revision(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "repeat": repeat,
+        "server_delay_s": delay,
+    }
+
+def compare(results, baseline):
+    """以最佳值 (較不受機器雜訊影響) 印出與基準的比值，回傳變慢超過門檻的項目"""
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:28s} {r['best_ms']:10.2f} ms   (基準無此項)")
+            continue
+        ratio = r["best_ms"] / base["best_ms"] if base["best_ms"] else float("inf")
+        flag = "  ⚠️ 變慢" if ratio > REGRESSION_RATIO else ""
+        print(f"{name:28s} {r['best_ms']:10.2f} ms   基準 {base['best_ms']:10.2f} ms   {ratio:5.2f}x{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--delay", type=float, default=0.0, help="替身伺服器每個回應的模擬延遲秒數")
+    parser.add_argument("--out", help="結果 JSON 路徑 (預設 benchmarks/results/<revision>.json)")
+    parser.add_argument("--compare", help="與這個結果 JSON 比較")
+    args = parser.parse_args()
+
+    report = run(args.repeat, args.delay)
+    out = args.out or os.path.join(RESULTS_DIR, f"{report['meta']['revision'] or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(report["results"], baseline)
+        if regressions:
+            print(f"\n變慢的項目：{', '.join(regressions)}")
+    else:
+        for name, r in report["results"].items():
+            print(f"{name:28s} {r['median_ms']:10.2f} ms  (best {r['best_ms']:.2f})")
+    print(f"\n結果已寫入 {out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+# 籌碼K線核心模組：爬蟲、解析等與 Streamlit 介面無關的邏輯
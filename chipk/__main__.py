@@ -0,0 +1,5 @@
+import sys
+
+from chipk.cli import main
+
+sys.exit(main())
@@ -0,0 +1,163 @@
+import asyncio
+import random
+import time
+from urllib.parse import urlparse
+
+from chipk.fetch import USER_AGENT, broker_daily_url, decode_html, ranking_url, split_date_range
+from chipk.parsing import (
+    extract_daily_table,
+    has_next_page,
+    has_ranking_table,
+    parse_broker_daily_frames,
+    parse_ranking_html,
+    resolve_page_urls,
+)
+
+# ================= asyncio 抓取引擎 (大量股票/分點夜間爬取，python -m chipk collect 使用) =================
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """每秒補 rate 個 token，最多累積 burst 個"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class FetchError(Exception):
+    pass
+
+class AsyncFetcher:
+    """共用連線池的非同步抓取器；同一主機共用一個 token bucket"""
+
+    def __init__(self, rate=2.0, burst=4, max_connections=8, retries=3, backoff=0.5, timeout=15):
+        self.rate = rate
+        self.burst = burst
+        self.max_connections = max_connections
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._buckets = {}
+        self._session = None
+
+    async def __aenter__(self):
+        import aiohttp
+
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_connections),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={"User-Agent": USER_AGENT},
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+
+    def _bucket(self, url):
+        host = urlparse(url).netloc
+        if host not in self._buckets:
+            self._buckets[host] = TokenBucket(self.rate, self.burst)
+        return self._buckets[host]
+
+    async def fetch_html(self, url):
+        import aiohttp
+
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                # 指數退避加抖動，避免所有重試同時打回去
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+            await self._bucket(url).acquire()
+            try:
+                async with self._session.get(url) as resp:
+                    if resp.status in RETRY_STATUS:
+                        last_error = FetchError(f"HTTP {resp.status}: {url}")
+                        continue
+                    if resp.status >= 400:
+                        # 404 等其他錯誤重試也不會好，直接失敗
+                        raise FetchError(f"HTTP {resp.status}: {url}")
+                    content = await resp.read()
+                    return decode_html(content, resp.charset)
+            except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+                # 只有連線失敗、逾時、傳輸中斷才重試
+                last_error = e
+        raise FetchError(f"failed after {self.retries + 1} attempts: {url}") from last_error
+
+    async def fetch_parsed(self, url, parse):
+        """抓取後在執行緒裡跑 parse(html, url)，解析不會卡住 event loop"""
+        html = await self.fetch_html(url)
+        return await asyncio.to_thread(parse, html, url)
+
+    async def fetch_ranking(self, stock_id, start_date, end_date, limit=15):
+        """回傳格式同 chipk.fetch.fetch_ranking；limit=None 保留所有列出的分點"""
+        url = ranking_url(stock_id, start_date, end_date)
+
+        def parse(html, page_url):
+            if not has_ranking_table(html):
+                return None
+            parsed = parse_ranking_html(html, page_url, limit=limit)
+            return (*parsed, page_url) if parsed is not None else None
+
+        return await self.fetch_parsed(url, parse)
+
+    async def fetch_broker_daily(self, stock_id, broker_key, start_date, end_date, chunk_days=31):
+        target_url = broker_daily_url(stock_id, broker_key, start_date, end_date)
+        first_html = await self.fetch_html(target_url)
+        page_urls = resolve_page_urls(first_html, target_url)
+
+        if page_urls is not None:
+            pages, urls = [first_html], [target_url]
+            while page_urls:
+                pages += await asyncio.gather(*(self.fetch_html(u) for u in page_urls))
+                urls += page_urls
+                if not has_next_page(pages[-1]):
+                    break
+                # 分頁列只列附近幾頁時由最後一頁接著推，推不出來就視為失敗
+                page_urls = (resolve_page_urls(pages[-1], urls[-1]) or [])[len(pages) - 1:]
+                if not page_urls:
+                    return None, target_url
+        else:
+            chunk_urls = [broker_daily_url(stock_id, broker_key, s, e)
+                          for s, e in split_date_range(start_date, end_date, chunk_days)]
+            pages = list(await asyncio.gather(*(self.fetch_html(u) for u in chunk_urls)))
+            if any(has_next_page(html) for html in pages):
+                return None, target_url
+
+        def parse(pages):
+            return parse_broker_daily_frames([extract_daily_table(html) for html in pages if "日期" in html])
+
+        return await asyncio.to_thread(parse, pages), target_url
+
+async def _gather_settled(coros):
+    # 單一頁面失敗不影響其他結果，失敗者回傳例外物件
+    return await asyncio.gather(*coros, return_exceptions=True)
+
+async def crawl_rankings(jobs, limit=15, **fetcher_kwargs):
+    """jobs: [(stock_id, start_date, end_date)]，依序回傳排行結果或例外"""
+    async with AsyncFetcher(**fetcher_kwargs) as fetcher:
+        return await _gather_settled(fetcher.fetch_ranking(*job, limit=limit) for job in jobs)
+
+async def crawl_broker_daily(jobs, **fetcher_kwargs):
+    """jobs: [(stock_id, broker_key, start_date, end_date)]，依序回傳 (df, url) 或例外"""
+    async with AsyncFetcher(**fetcher_kwargs) as fetcher:
+        return await _gather_settled(fetcher.fetch_broker_daily(*job) for job in jobs)
+
+def run_rankings(jobs, limit=15, **fetcher_kwargs):
+    return asyncio.run(crawl_rankings(jobs, limit=limit, **fetcher_kwargs))
+
+def run_broker_daily(jobs, **fetcher_kwargs):
+    return asyncio.run(crawl_broker_daily(jobs, **fetcher_kwargs))
@@ -0,0 +1,110 @@
+import os
+import threading
+
+import pandas as pd
+
+from chipk.store import DB_PATH, connect, get_broker_store
+
+# ================= 分點 → 個股 反向索引 =================
+
+class BranchIndex:
+    """以分點 (BHID, b) 為鍵，記錄它在各股票、各統計區間的買賣超"""
+
+    def __init__(self, path=None):
+        self.path = path or DB_PATH
+        # 每日明細 (BrokerFlowStore) 也要加分點索引才能跨股加總
+        get_broker_store(self.path)
+        with connect(self.path) as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS branch_window (
+                    bhid TEXT NOT NULL,
+                    b TEXT NOT NULL,
+                    broker TEXT NOT NULL,
+                    stock_id TEXT NOT NULL,
+                    days INTEGER NOT NULL,
+                    start_date TEXT NOT NULL,
+                    end_date TEXT NOT NULL,
+                    buy REAL NOT NULL,
+                    sell REAL NOT NULL,
+                    net REAL NOT NULL,
+                    PRIMARY KEY (bhid, b, stock_id, days, end_date)
+                );
+                CREATE INDEX IF NOT EXISTS idx_branch_window_lookup
+                    ON branch_window (bhid, b, days, end_date, net);
+                CREATE INDEX IF NOT EXISTS idx_broker_daily_branch
+                    ON broker_daily (bhid, b, date);
+            """)
+
+    def add_rows(self, rows):
+        """rows 欄位同 chipk.scan.SCAN_COLUMNS；沒有 BHID 的列略過"""
+        data = [
+            (r["BHID"], r["b"], str(r["broker"]), str(r["stock_id"]), int(r["days"]),
+             r["start_date"], r["end_date"], float(r["buy"]), float(r["sell"]), float(r["net"]))
+            for r in rows if r.get("BHID") and r.get("b")
+        ]
+        if not data:
+            return 0
+        with _lock, connect(self.path) as conn:
+            conn.executemany("INSERT OR REPLACE INTO branch_window VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", data)
+        return len(data)
+
+    def add_scan(self, df):
+        return self.add_rows(df.to_dict("records"))
+
+    def version(self):
+        """資料庫檔案 (含 WAL) 的最後修改時間，給畫面端當快取鍵"""
+        paths = (self.path, self.path + "-wal")
+        return max((os.path.getmtime(p) for p in paths if os.path.exists(p)), default=0.0)
+
+    def branches(self):
+        with connect(self.path) as conn:
+            return pd.read_sql_query(
+                "SELECT bhid AS BHID, b, MAX(broker) AS broker, COUNT(DISTINCT stock_id) AS stocks "
+                "FROM branch_window GROUP BY bhid, b ORDER BY stocks DESC",
+                conn,
+            )
+
+    def window_days(self, bhid, b):
+        with connect(self.path) as conn:
+            rows = conn.execute("SELECT DISTINCT days FROM branch_window WHERE bhid=? AND b=? ORDER BY days", (bhid, b)).fetchall()
+        return [r[0] for r in rows]
+
+    def top_stocks(self, bhid, b, days, since=None, until=None, limit=20, side="buy"):
+        """分點在 days 日區間買超或賣超最多的股票；每檔取 [since, until] 內最新一次統計"""
+        # ✅ 每檔股票的掃描日期不一定相同，不能只看全分點最新的 end_date，否則較早掃的股票會消失
+        order = "DESC" if side == "buy" else "ASC"
+        where, params = "bhid=? AND b=? AND days=?", [bhid, b, days]
+        if since:
+            where += " AND end_date >= ?"
+            params.append(since)
+        if until:
+            where += " AND end_date <= ?"
+            params.append(until)
+        with connect(self.path) as conn:
+            return pd.read_sql_query(
+                "SELECT stock_id, start_date, end_date, buy, sell, net FROM ("
+                "SELECT *, ROW_NUMBER() OVER (PARTITION BY stock_id ORDER BY end_date DESC) AS rn "
+                f"FROM branch_window WHERE {where}) WHERE rn = 1 ORDER BY net {order} LIMIT ?",
+                conn, params=(*params, limit),
+            )
+
+    def accumulated(self, bhid, b, since, limit=20):
+        """由每日明細加總 since 之後分點在各股的累計買賣超"""
+        with connect(self.path) as conn:
+            return pd.read_sql_query(
+                "SELECT stock_id, SUM(buy) AS buy, SUM(sell) AS sell, SUM(buy - sell) AS net, "
+                "MIN(date) AS first_date, MAX(date) AS last_date "
+                "FROM broker_daily WHERE bhid=? AND b=? AND date >= ? "
+                "GROUP BY stock_id ORDER BY net DESC LIMIT ?",
+                conn, params=(bhid, b, since, limit),
+            )
+
+_lock = threading.Lock()
+_indexes = {}
+
+def get_branch_index(path=None):
+    path = path or DB_PATH
+    with _lock:
+        if path not in _indexes:
+            _indexes[path] = BranchIndex(path)
+        return _indexes[path]
@@ -0,0 +1,212 @@
+import atexit
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+from chipk.timing import span
+
+# ================= 無頭瀏覽器與 WebDriver 池 =================
+
+POOL_SIZE = int(os.environ.get("CHIPK_DRIVER_POOL_SIZE", "2"))
+MAX_USES = int(os.environ.get("CHIPK_DRIVER_MAX_USES", "50"))
+IDLE_SECONDS = float(os.environ.get("CHIPK_DRIVER_IDLE_SECONDS", "300"))
+BORROW_TIMEOUT = float(os.environ.get("CHIPK_DRIVER_BORROW_TIMEOUT", "60"))
+BROWSER_PROFILE = os.environ.get("CHIPK_BROWSER_PROFILE", "lean")
+
+# 抓表格用不到的資源：圖片、字型、樣式表，以及第三方廣告/追蹤 (富邦頁面本身的 JS 要留著，翻頁靠它)
+BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico", "*.bmp",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.css",
+    "*.mp4", "*.webm", "*.mp3",
+    "*googletagmanager.com*", "*google-analytics.com*", "*googlesyndication.com*", "*doubleclick.net*",
+    "*googleadservices.com*", "*facebook.net*", "*facebook.com*", "*hotjar.com*", "*criteo.*", "*scorecardresearch.com*",
+]
+
+@lru_cache(maxsize=1)
+def get_driver_path():
+    from webdriver_manager.chrome import ChromeDriverManager
+    return ChromeDriverManager().install()
+
+def browser_options(profile=None):
+    """lean：只為了讀表格，eager 載入、不載圖片/字型並關掉用不到的背景功能；legacy：原本的完整載入 (比較用)"""
+    from selenium.webdriver.chrome.options import Options
+
+    profile = profile or BROWSER_PROFILE
+    options = Options()
+    options.add_argument('--headless=new')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--disable-gpu')
+    options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+
+    if profile == "legacy":
+        options.add_argument('--window-size=1920,1080')
+    else:
+        # ✅ DOM 就緒就返回 (不等圖片與廣告)，表格是否出現由呼叫端的 WebDriverWait 判斷
+        options.page_load_strategy = "eager"
+        options.add_argument('--window-size=1024,768')
+        for arg in ('--disable-extensions', '--disable-background-networking', '--disable-component-update',
+                    '--disable-default-apps', '--disable-sync', '--disable-translate', '--mute-audio',
+                    '--no-first-run', '--blink-settings=imagesEnabled=false'):
+            options.add_argument(arg)
+        options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+
+    if shutil.which("chromium"):
+        options.binary_location = shutil.which("chromium")
+    elif shutil.which("chromium-browser"):
+        options.binary_location = shutil.which("chromium-browser")
+    return options
+
+def block_urls(driver, patterns=BLOCKED_URLS):
+    """以 CDP 擋掉符合 patterns 的請求 (萬用字元 *)；driver 不支援 CDP 時略過"""
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": list(patterns)})
+    except Exception:
+        pass
+
+def build_driver(profile=None):
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+
+    profile = profile or BROWSER_PROFILE
+    options = browser_options(profile)
+    if shutil.which("chromedriver"):
+        service = Service(shutil.which("chromedriver"))
+    else:
+        service = Service(get_driver_path())
+
+    with span("browser.start", profile=profile):
+        driver = webdriver.Chrome(service=service, options=options)
+    if profile != "legacy":
+        block_urls(driver)
+    return driver
+
+def _quit(driver):
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+class DriverPool:
+    """程序內共用的暖機瀏覽器池；size 為同時存在的 Chromium 上限"""
+
+    def __init__(self, size=POOL_SIZE, max_uses=MAX_USES, idle_seconds=IDLE_SECONDS,
+                 borrow_timeout=BORROW_TIMEOUT, factory=build_driver):
+        self.size = max(1, size)
+        self.max_uses = max_uses
+        self.idle_seconds = idle_seconds
+        self.borrow_timeout = borrow_timeout
+        self.factory = factory
+        self._cond = threading.Condition()
+        self._idle = []      # [(driver, uses, last_used)]
+        self._created = 0
+        self._closed = False
+        self._reaper = threading.Thread(target=self._reap_loop, name="chipk-driver-reaper", daemon=True)
+        self._reaper.start()
+
+    def _healthy(self, driver):
+        try:
+            driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def _acquire(self):
+        deadline = time.monotonic() + self.borrow_timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("driver pool is closed")
+                if self._idle:
+                    driver, uses, _ = self._idle.pop()
+                    return driver, uses
+                if self._created < self.size:
+                    self._created += 1
+                    return None, 0
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"no browser available within {self.borrow_timeout:.0f}s")
+                self._cond.wait(remaining)
+
+    def _discard(self, driver):
+        with self._cond:
+            self._created -= 1
+            self._cond.notify()
+        if driver is not None:
+            _quit(driver)
+
+    @contextmanager
+    def borrow(self):
+        with span("browser.borrow"):
+            driver, uses = self._acquire()
+            # 閒置中的瀏覽器可能已崩潰，借出前先檢查
+            if driver is not None and not self._healthy(driver):
+                _quit(driver)
+                driver, uses = None, 0
+            if driver is None:
+                try:
+                    driver = self.factory()
+                except Exception:
+                    self._discard(None)
+                    raise
+
+        broken = False
+        try:
+            yield driver
+        except BaseException:
+            broken = not self._healthy(driver)
+            raise
+        finally:
+            self._release(driver, uses + 1, broken)
+
+    def _release(self, driver, uses, broken):
+        if broken or uses >= self.max_uses or self._closed:
+            self._discard(driver)
+            return
+        with self._cond:
+            self._idle.append((driver, uses, time.monotonic()))
+            self._cond.notify()
+
+    def _reap_loop(self):
+        while not self._closed:
+            time.sleep(min(30, max(1, self.idle_seconds / 2)))
+            self.reap_idle()
+
+    def reap_idle(self):
+        now = time.monotonic()
+        with self._cond:
+            expired = [item for item in self._idle if now - item[2] >= self.idle_seconds]
+            self._idle = [item for item in self._idle if now - item[2] < self.idle_seconds]
+            self._created -= len(expired)
+            self._cond.notify(len(expired))
+        for driver, _, _ in expired:
+            _quit(driver)
+
+    def stats(self):
+        with self._cond:
+            return {"size": self.size, "created": self._created, "idle": len(self._idle)}
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+            self._cond.notify_all()
+        for driver, _, _ in idle:
+            _quit(driver)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_driver_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = DriverPool()
+            atexit.register(_pool.close)
+        return _pool
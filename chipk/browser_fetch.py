@@ -0,0 +1,165 @@
+from io import StringIO
+
+import pandas as pd
+
+from chipk.browser import get_driver_pool
+from chipk.fetch import broker_daily_url, ranking_url
+from chipk.governor import get_governor
+from chipk.parsing import (
+    MAX_PAGES,
+    extract_daily_table,
+    has_next_page,
+    page_total,
+    parse_broker_daily_frames,
+    parse_ranking_html,
+)
+from chipk.singleflight import get_single_flight
+from chipk.timing import span
+
+# ================= 瀏覽器備援抓取 (selenium 於第一次使用時才載入) =================
+
+TABLE_XPATH = "/html/body/div[1]/table/tbody/tr[2]/td[2]/table/tbody/tr/td/form/table/tbody/tr/td/table/tbody/tr[6]/td/table"
+# 每日明細第一欄 (日期) 的儲存格，用來判斷是否已換頁
+DATE_CELL_XPATH = "//td[contains(@class, 't3t1')]"
+PAGE_TIMEOUT = 15   # 等待換頁的上限；換頁一完成就往下走，不會每頁都等滿
+POLL_SECONDS = 0.05
+
+# ✅ 多個 session 同時要同一頁時只開一次瀏覽器，其他人共用結果
+
+def fetch_ranking_browser(stock_id, start_date, end_date):
+    """HTTP 拿不到排行表時改用瀏覽器開頁，回傳格式同 fetch_ranking (失敗時各欄為 None)"""
+    key = (str(stock_id), start_date, end_date)
+    return get_single_flight().do(
+        "browser.ranking", key, lambda: _fetch_ranking_browser(stock_id, start_date, end_date)
+    )[0]
+
+def fetch_broker_daily_browser(stock_id, broker_key, start_date, end_date):
+    """分頁需要 JS 時用瀏覽器逐頁點擊，回傳 (df, url)"""
+    key = (str(stock_id), tuple(str(v) for v in broker_key), start_date, end_date)
+    return get_single_flight().do(
+        "browser.broker_daily", key, lambda: _fetch_broker_daily_browser(stock_id, broker_key, start_date, end_date)
+    )[0]
+
+def _fetch_ranking_browser(stock_id, start_date, end_date):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    url = ranking_url(stock_id, start_date, end_date)
+    # ✅ 來源斷路中就不必借 (甚至啟動) 瀏覽器
+    if not get_governor().available():
+        return None, None, None, None, None, url
+
+    try:
+        # ✅ 從共用池借暖機的瀏覽器，用完歸還而不是 quit
+        with get_driver_pool().borrow() as driver:
+            with get_governor().request(), span("driver.get"):
+                driver.get(url)
+            try:
+                with span("driver.wait"):
+                    WebDriverWait(driver, 10).until(
+                        EC.presence_of_element_located((By.XPATH, "//*[contains(text(), '買超券商')]"))
+                    )
+            except Exception:
+                return None, None, None, None, None, url
+
+            with span("parse.ranking"):
+                parsed = parse_ranking_html(driver.page_source, url)
+        if parsed is None:
+            return None, None, None, None, None, url
+        return (*parsed, url)
+    except Exception:
+        return None, None, None, None, None, url
+
+def _first_date_cell(driver):
+    from selenium.webdriver.common.by import By
+
+    cells = driver.find_elements(By.XPATH, DATE_CELL_XPATH)
+    return cells[0] if cells else None
+
+def _page_changed(old_cell, old_date):
+    """舊頁面的日期格已失效 (整頁換掉) 或第一列日期不同，且新頁面的日期格已出現"""
+    from selenium.common.exceptions import StaleElementReferenceException
+
+    def changed(driver):
+        try:
+            cell = _first_date_cell(driver)
+            if cell is None:
+                return False
+            if cell == old_cell:
+                return cell.text.strip() != old_date and cell
+            return cell
+        except StaleElementReferenceException:
+            return False
+    return changed
+
+def _fetch_broker_daily_browser(stock_id, broker_key, start_date, end_date):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    target_url = broker_daily_url(stock_id, broker_key, start_date, end_date)
+    if not get_governor().available():
+        return None, target_url
+
+    try:
+        with get_driver_pool().borrow() as driver:
+            with get_governor().request(), span("driver.get"):
+                driver.get(target_url)
+            try:
+                with span("driver.wait", page=1):
+                    cell = WebDriverWait(driver, PAGE_TIMEOUT, poll_frequency=POLL_SECONDS).until(lambda d: _first_date_cell(d))
+            except Exception:
+                # 區間內沒有交易紀錄時頁面上沒有日期格
+                if "日期" not in driver.page_source:
+                    return None, target_url
+                cell = None
+
+            all_dfs = []
+            seen_dates = set()
+            total = None
+            page = 1
+            while page <= MAX_PAGES:
+                html = driver.page_source
+                first_date = cell.text.strip() if cell is not None else None
+                # ✅ 第一列日期重複代表讀到的還是上一頁，不重複收
+                if first_date in seen_dates:
+                    break
+                seen_dates.add(first_date)
+
+                with span("parse.read_html", page=page):
+                    try:
+                        table_html = driver.find_element(By.XPATH, TABLE_XPATH).get_attribute('outerHTML')
+                        tables = pd.read_html(StringIO(table_html))
+                        current_df = tables[0] if tables else None
+                    except Exception:
+                        current_df = extract_daily_table(html)
+                if current_df is not None:
+                    all_dfs.append(current_df)
+
+                # ✅ 最後一頁由頁面內容判斷：沒有「下一頁」或已到「共 N 頁」
+                total = total or page_total(html)
+                if not has_next_page(html) or (total and page >= total):
+                    break
+                # 還有下一頁卻沒有日期格可確認換頁、或點不到「下一頁」：視為失敗，不把前幾頁當完整明細
+                if cell is None:
+                    return None, target_url
+                next_links = driver.find_elements(By.XPATH, "//a[contains(text(), '下一頁')]")
+                if not next_links:
+                    return None, target_url
+
+                # ✅ 點下一頁後等頁面真的換掉 (舊日期格失效或第一列日期改變)，不固定 sleep
+                with get_governor().request(), span("driver.page_turn", page=page + 1):
+                    next_links[0].click()
+                    cell = WebDriverWait(driver, PAGE_TIMEOUT, poll_frequency=POLL_SECONDS).until(_page_changed(cell, first_date))
+                page += 1
+            else:
+                # 超過 MAX_PAGES 仍有下一頁
+                return None, target_url
+
+        with span("parse.broker_daily", pages=len(all_dfs), total=total):
+            df = parse_broker_daily_frames(all_dfs)
+        return df, target_url
+
+    except Exception:
+        # 翻頁逾時等情況不回傳半套資料，免得缺頁被當成完整區間存進資料庫
+        return None, target_url
@@ -0,0 +1,326 @@
+import hashlib
+import io
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+import pandas as pd
+
+from chipk.store import DATA_DIR
+from chipk.timing import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows：沒有 flock，只靠 os.replace 的原子性
+    fcntl = None
+
+# ================= 快取後端 (本機檔案 / Redis)：壓縮欄式存放 + 容量上限 LRU 淘汰 =================
+
+# 空白表示存在本機 CACHE_DIR；redis://host:6379/0 則多個副本共用同一個 Redis (需另外安裝 redis 套件)
+CACHE_URL = os.environ.get("CHIPK_CACHE_URL", "")
+CACHE_DIR = os.environ.get("CHIPK_CACHE_DIR", os.path.join(DATA_DIR, "cache"))
+CACHE_MAX_MB = float(os.environ.get("CHIPK_CACHE_MAX_MB", "256"))
+# 超過上限時一次淘汰到上限的這個比例，避免每次寫入都要掃描
+EVICT_TO = 0.9
+# 本機檔案的過期項目每隔這麼多秒才整批掃描刪除一次 (容量超過上限時仍會立即淘汰)
+SWEEP_SECONDS = 300
+
+_HEADER = struct.Struct("<d")  # fetched_at
+
+# ---------- 編碼：DataFrame 轉 Parquet (zstd)，其餘照常 pickle ----------
+
+class _Pickler(pickle.Pickler):
+    def persistent_id(self, obj):
+        if isinstance(obj, pd.DataFrame):
+            return _encode_frame(obj)
+        return None
+
+class _Unpickler(pickle.Unpickler):
+    def persistent_load(self, pid):
+        kind, blob = pid
+        if kind == "parquet":
+            return pd.read_parquet(io.BytesIO(blob))
+        return pickle.loads(zlib.decompress(blob))
+
+def _encode_frame(df):
+    try:
+        buf = io.BytesIO()
+        df.to_parquet(buf, compression="zstd")
+        return ("parquet", buf.getvalue())
+    except Exception:
+        # 欄位型別混雜等 Parquet 存不了的情況，退回壓縮 pickle
+        return ("pickle", zlib.compress(pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)))
+
+def encode(value):
+    buf = io.BytesIO()
+    _Pickler(buf, protocol=pickle.HIGHEST_PROTOCOL).dump(value)
+    return buf.getvalue()
+
+def decode(blob):
+    return _Unpickler(io.BytesIO(blob)).load()
+
+def _digest(namespace, key):
+    return hashlib.sha1(f"{namespace}\0{key}".encode("utf-8")).hexdigest()
+
+class _Counters:
+    """hit / miss / eviction 次數；同時累計到 Prometheus metrics"""
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def hit(self):
+        with self._lock:
+            self.hits += 1
+        metrics.count_cache(self.name, "hit")
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+        metrics.count_cache(self.name, "miss")
+
+    def evicted(self, n):
+        if not n:
+            return
+        with self._lock:
+            self.evictions += n
+        metrics.count_eviction(self.name, n)
+
+    def as_dict(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+# ---------- 本機檔案 ----------
+
+class FileBackend:
+    """一筆一個檔案，寫入先寫暫存檔再 os.replace；以 flock 鎖住整個目錄 (同機多個副本可共用)。
+    檔案 mtime 即最近使用時間，讀取時更新。總大小記在 .size 檔，寫入時只在鎖內加減差額，
+    超過上限或每 SWEEP_SECONDS 秒才掃描整個目錄淘汰"""
+
+    def __init__(self, directory=None, max_bytes=None, sweep_seconds=SWEEP_SECONDS):
+        self.directory = directory or CACHE_DIR
+        self.max_bytes = int(max_bytes if max_bytes is not None else CACHE_MAX_MB * 1024 * 1024)
+        self.sweep_seconds = sweep_seconds
+        os.makedirs(self.directory, exist_ok=True)
+        self.counters = _Counters("store.file")
+        self._size_path = os.path.join(self.directory, ".size")
+        self._ttls = {}       # namespace -> ttl，定期掃描時刪掉過期項目
+        self._swept_at = time.monotonic()
+
+    def _path(self, namespace, key):
+        return os.path.join(self.directory, namespace, _digest(namespace, key) + ".bin")
+
+    @contextmanager
+    def _locked(self):
+        with open(os.path.join(self.directory, ".lock"), "a+") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def get(self, namespace, key):
+        """回傳 (blob, fetched_at)，沒有時為 None"""
+        path = self._path(namespace, key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            self.counters.miss()
+            return None
+        self.counters.hit()
+        return data[_HEADER.size:], _HEADER.unpack_from(data)[0]
+
+    def set(self, namespace, key, blob, fetched_at, ttl=None):
+        path = self._path(namespace, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(fetched_at))
+            f.write(blob)
+        if ttl:
+            self._ttls[namespace] = ttl
+        with self._locked():
+            total = self._read_size()
+            try:
+                old = os.stat(path).st_size
+            except OSError:
+                old = 0
+            os.replace(tmp, path)
+            total += _HEADER.size + len(blob) - old
+            self._write_size(total)
+            sweep = time.monotonic() - self._swept_at >= self.sweep_seconds
+            removed = self._evict_locked(self._ttls if sweep else None) if total > self.max_bytes or sweep else 0
+        self.counters.evicted(removed)
+
+    def _read_size(self):
+        """鎖內呼叫；.size 不存在或損壞時掃描目錄重算"""
+        try:
+            with open(self._size_path) as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return sum(e[2] for e in self._entries())
+
+    def _write_size(self, total):
+        tmp = f"{self._size_path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(str(max(0, total)))
+        os.replace(tmp, self._size_path)
+
+    def _entries(self):
+        for namespace in os.listdir(self.directory):
+            folder = os.path.join(self.directory, namespace)
+            if not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                if not name.endswith(".bin"):
+                    continue
+                path = os.path.join(folder, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield namespace, path, st.st_size, st.st_mtime
+
+    def evict(self, ttl_by_namespace=None):
+        """刪掉超過 ttl_by_namespace 秒數 (以抓取時間計) 的項目；總量超過上限時由最久沒用的開始刪"""
+        with self._locked():
+            removed = self._evict_locked(ttl_by_namespace)
+        self.counters.evicted(removed)
+        return removed
+
+    def _evict_locked(self, ttl_by_namespace=None):
+        now = time.time()
+        ttl_by_namespace = ttl_by_namespace or {}
+        removed = 0
+        entries = sorted(self._entries(), key=lambda e: e[3])
+        total = sum(e[2] for e in entries)
+        limit = self.max_bytes * EVICT_TO if total > self.max_bytes else None
+        for namespace, path, size, _ in entries:
+            if limit is None or total <= limit:
+                ttl = ttl_by_namespace.get(namespace)
+                if ttl is None or now - self._fetched_at(path) <= ttl:
+                    continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        # 掃描時順便校正 .size (其他程序寫入失敗等造成的誤差)
+        self._write_size(total)
+        self._swept_at = time.monotonic()
+        return removed
+
+    def _fetched_at(self, path):
+        try:
+            with open(path, "rb") as f:
+                return _HEADER.unpack(f.read(_HEADER.size))[0]
+        except (OSError, struct.error):
+            return 0.0
+
+    def size(self):
+        with self._locked():
+            return self._read_size()
+
+    def stats(self):
+        return {"backend": "file", "bytes": self.size(), "max_bytes": self.max_bytes, **self.counters.as_dict()}
+
+# ---------- Redis (或相容的服務) ----------
+
+class RedisBackend:
+    """多個副本共用。只用 GET/SET/DEL/INCRBY/ZADD/ZRANGE/ZRANGEBYSCORE/ZREM/HGET/HSET/HDEL，client 可換成相容的替身 (例如 fakeredis)。
+    最近使用時間與過期時間各存在一個 sorted set，各筆大小存在 hash、總大小存在計數器；
+    已過期的 key 由 Redis 刪除，大小在下次寫入時依過期時間扣掉；超過上限時由最舊的開始刪"""
+
+    def __init__(self, url=None, max_bytes=None, client=None, prefix="chipk:cache:"):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url or CACHE_URL)
+        self.client = client
+        self.prefix = prefix
+        self.max_bytes = int(max_bytes if max_bytes is not None else CACHE_MAX_MB * 1024 * 1024)
+        self.counters = _Counters("store.redis")
+        self._lru = prefix + "lru"
+        self._expiry = prefix + "expiry"
+        self._bytes = prefix + "bytes"
+        self._sizes = prefix + "sizes"
+
+    def _key(self, namespace, key):
+        return f"{self.prefix}{namespace}:{_digest(namespace, key)}"
+
+    def get(self, namespace, key):
+        k = self._key(namespace, key)
+        data = self.client.get(k)
+        if data is None:
+            self.counters.miss()
+            return None
+        self.client.zadd(self._lru, {k: time.time()})
+        self.counters.hit()
+        return data[_HEADER.size:], _HEADER.unpack_from(data)[0]
+
+    def set(self, namespace, key, blob, fetched_at, ttl=None):
+        k = self._key(namespace, key)
+        data = _HEADER.pack(fetched_at) + blob
+        old = int(self.client.hget(self._sizes, k) or 0)
+        now = time.time()
+        self.client.set(k, data, ex=int(ttl) if ttl else None)
+        self.client.zadd(self._lru, {k: now})
+        if ttl:
+            self.client.zadd(self._expiry, {k: now + int(ttl)})
+        else:
+            self.client.zrem(self._expiry, k)
+        self.client.hset(self._sizes, k, len(data))
+        self.client.incrby(self._bytes, len(data) - old)
+        self.reap_expired()
+        self.evict()
+
+    def _forget(self, k):
+        """把 key 的大小從總量扣掉並移出索引 (key 本身已刪或已過期)"""
+        self.client.incrby(self._bytes, -int(self.client.hget(self._sizes, k) or 0))
+        self.client.hdel(self._sizes, k)
+        self.client.zrem(self._lru, k)
+        self.client.zrem(self._expiry, k)
+
+    def reap_expired(self, batch=64):
+        """扣掉已被 Redis 過期刪除的 key 的大小，避免總量只增不減"""
+        expired = self.client.zrangebyscore(self._expiry, 0, time.time(), start=0, num=batch)
+        for k in expired:
+            self._forget(k)
+        self.counters.evicted(len(expired))
+        return len(expired)
+
+    def evict(self, ttl_by_namespace=None):
+        removed = 0
+        if self.size() <= self.max_bytes:
+            return removed
+        while self.size() > self.max_bytes * EVICT_TO:
+            oldest = self.client.zrange(self._lru, 0, 15)
+            if not oldest:
+                self.client.set(self._bytes, 0)
+                break
+            for k in oldest:
+                removed += self.client.delete(k)
+                self._forget(k)
+        self.counters.evicted(removed)
+        return removed
+
+    def size(self):
+        return int(self.client.get(self._bytes) or 0)
+
+    def stats(self):
+        return {"backend": "redis", "bytes": self.size(), "max_bytes": self.max_bytes, **self.counters.as_dict()}
+
+def make_backend(url=None):
+    url = CACHE_URL if url is None else url
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    return FileBackend(url or None)
@@ -0,0 +1,243 @@
+import numpy as np
+import pandas as pd
+
+from chipk.lod import BAR_RULES, chart_level_of_detail
+
+# ================= K線 + 分點買賣超圖 (plotly 於第一次畫圖時才載入) =================
+
+COLOR_UP = '#ef5350'
+COLOR_DOWN = '#26a69a'
+MA_COLORS = {'MA5': 'orange', 'MA10': 'cyan', 'MA20': 'magenta', 'MA60': 'green'}
+
+CHART_CONFIG = {
+    "scrollZoom": True,
+    "displayModeBar": False,
+    "responsive": True,
+    "doubleClick": "reset"
+}
+
+def merge_broker_flow(df_price, broker_daily_df):
+    """股價與分點每日明細以 DateStr 對齊，沒有進出的日子買賣超補 0 後累加"""
+    broker_daily_df = broker_daily_df.drop_duplicates(subset=["DateStr"], keep="last").sort_values('DateStr')
+    merged_df = pd.merge(df_price, broker_daily_df, on='DateStr', how='left')
+    merged_df['買賣超_Final'] = merged_df['買賣超_Calc'].fillna(0)
+    merged_df['cumulative_net'] = merged_df['買賣超_Final'].cumsum()
+    return merged_df
+
+def prepare_plot_df(df):
+    # ✅ 先保證 Date 欄位存在並排序，避免 KeyError
+    plot_df = df.copy()
+    plot_df["Date"] = pd.to_datetime(plot_df["DateStr"], errors="coerce")
+    plot_df = plot_df.dropna(subset=["Date"]).sort_values("Date").reset_index(drop=True)
+    if '買賣超_Final' not in plot_df.columns:
+        plot_df['買賣超_Final'] = 0
+    plot_df["買賣超_Final"] = pd.to_numeric(plot_df["買賣超_Final"], errors="coerce").fillna(0)
+    if "cumulative_net" in plot_df.columns:
+        plot_df["cumulative_net"] = pd.to_numeric(plot_df["cumulative_net"], errors="coerce")
+    return plot_df
+
+def trading_days_of(plot_df):
+    trading_days = pd.to_datetime(plot_df['Date']).dt.normalize().dropna().unique()
+    return pd.DatetimeIndex(trading_days).sort_values()
+
+# 安全更新函式
+def safe_update_yaxes(fig, row, col, **kwargs):
+    try:
+        fig.update_yaxes(row=row, col=col, **kwargs)
+    except ValueError:
+        kwargs.pop("showspikelabels", None)
+        kwargs.pop("spikesnap", None)
+        kwargs.pop("ticklabelposition", None)
+        fig.update_yaxes(row=row, col=col, **kwargs)
+
+def safe_update_xaxes(fig, row, col, **kwargs):
+    try:
+        fig.update_xaxes(row=row, col=col, **kwargs)
+    except ValueError:
+        kwargs.pop("showspikelabels", None)
+        kwargs.pop("spikesnap", None)
+        kwargs.pop("ticklabelposition", None)
+        fig.update_xaxes(row=row, col=col, **kwargs)
+
+def build_chart(plot_df, start_dt, x_range_end, rangebreaks, title, selected_mas=(),
+                has_flow=False, rank_range=None, mobile=False):
+    """plot_df 為 prepare_plot_df 的結果；has_flow 表示含分點買賣超與累計欄位，rank_range 為排行統計區間 (畫灰底)"""
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    fig = make_subplots(
+        rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.03,
+        row_heights=[0.85, 0.15], specs=[[{"secondary_y": False}], [{"secondary_y": True}]]
+    )
+
+    # ✅ 細節層級：長區間改送週/月K並壓縮累計線，短區間只送可視範圍加左側緩衝
+    plot_df, cum_df, bar_period = chart_level_of_detail(plot_df, start_dt)
+    period_label = BAR_RULES[bar_period]
+
+    x_data = plot_df['Date']
+
+    custom = np.stack([
+        plot_df["DateStr"].astype(str).to_numpy(),
+        plot_df["買賣超_Final"].to_numpy(dtype=float),
+    ], axis=-1)
+
+    # K線圖
+    fig.add_trace(go.Candlestick(
+        x=x_data, open=plot_df['Open'], high=plot_df['High'],
+        low=plot_df['Low'], close=plot_df['Close'], name='股價',
+        increasing_line_color=COLOR_UP, decreasing_line_color=COLOR_DOWN,
+        increasing_fillcolor=COLOR_UP, decreasing_fillcolor=COLOR_DOWN,
+        hoverinfo="skip"
+    ), row=1, col=1)
+
+    # 隱形 Close 點
+    fig.add_trace(go.Scatter(
+        x=x_data,
+        y=plot_df["Close"],
+        mode="markers",
+        marker=dict(size=18, opacity=0),
+        customdata=custom,
+        hovertemplate=(
+            "<b>日期：%{customdata[0]}</b><br>"
+            "<b>收盤：%{y:.1f}</b><br>"
+            "<b>買賣超：%{customdata[1]:,.0f} 張</b>"
+            "<extra></extra>"
+        ),
+        showlegend=False,
+    ), row=1, col=1)
+
+    for ma in selected_mas:
+        if ma in plot_df.columns:
+            fig.add_trace(go.Scatter(
+                x=x_data, y=pd.to_numeric(plot_df[ma], errors='coerce'), name=ma,
+                mode='lines',
+                connectgaps=True,
+                line=dict(color=MA_COLORS.get(ma, 'white'), width=1.5),
+                hoverinfo='skip'
+            ), row=1, col=1)
+
+    if has_flow:
+        extended_buy_sell = list(plot_df['買賣超_Final'])
+
+        bar_colors = [
+            COLOR_UP if (v is not None and v > 0) else
+            COLOR_DOWN if (v is not None and v < 0) else 'gray'
+            for v in extended_buy_sell
+        ]
+
+        fig.add_trace(go.Bar(
+            x=x_data,
+            y=extended_buy_sell,
+            name=f'每{period_label}買賣超',
+            marker_color=bar_colors,
+            opacity=0.55,
+            hoverinfo='skip'
+        ), row=2, col=1, secondary_y=False)
+
+        fig.add_trace(go.Scatter(
+            x=cum_df['Date'],
+            y=cum_df['cumulative_net'],
+            name='兩年累計買賣超',
+            mode='lines',
+            line=dict(color='yellow', width=2.5),
+            connectgaps=True,
+            hoverinfo='skip'
+        ), row=2, col=1, secondary_y=True)
+
+        if rank_range is not None:
+            fig.add_vrect(
+                x0=pd.to_datetime(rank_range[0]),
+                x1=pd.to_datetime(rank_range[1]),
+                fillcolor="gray",
+                opacity=0.15,
+                layer="below",
+                line_width=0,
+                annotation_text="統計區間",
+                annotation_position="top left",
+                row='all', col=1
+            )
+
+    # 設定 Y 軸
+    safe_update_yaxes(
+        fig, row=1, col=1,
+        autorange=True,
+        fixedrange=True,
+        showgrid=True, gridcolor='rgba(128,128,128,0.2)',
+        ticklabelposition="inside",
+        tickfont=dict(size=10, color='rgba(255,255,255,0.7)'),
+        showspikes=True, spikemode="across", spikesnap="data",
+        showspikelabels=True,
+        spikedash="solid", spikecolor="rgba(255,255,255,0.6)", spikethickness=1
+    )
+    fig.update_yaxes(
+        fixedrange=True,
+        showticklabels=True,
+        row=2, col=1,
+        secondary_y=False,
+        showgrid=True, gridcolor='rgba(128,128,128,0.2)',
+        ticklabelposition="inside",
+        tickfont=dict(size=10, color='rgba(255,255,255,0.7)')
+    )
+    fig.update_yaxes(
+        fixedrange=True,
+        showticklabels=True,
+        row=2, col=1,
+        secondary_y=True,
+        showgrid=False,
+        ticklabelposition="inside",
+        tickfont=dict(size=10, color='yellow')
+    )
+
+    # ✅ 修正：使用 Streamlit 按鈕計算出的 range
+    for row in (1, 2):
+        safe_update_xaxes(
+            fig, row=row, col=1,
+            type='date',
+            rangebreaks=rangebreaks,
+            range=[start_dt, x_range_end],
+            fixedrange=False,
+            showspikes=True, spikemode="across", spikesnap="data",
+            showspikelabels=True,
+            spikedash="solid", spikecolor="rgba(255,255,255,0.6)", spikethickness=1
+        )
+
+    # ✅ 修正：移除 updatemenus，優化 hoverlabel 樣式 (字體 16 + 加粗)
+    fig.update_layout(
+        xaxis_rangeslider_visible=False,
+        plot_bgcolor='rgba(20,20,20,1)',
+        paper_bgcolor='rgba(20,20,20,1)',
+        font=dict(color='white', size=12),
+        title=dict(
+            text=title,
+            font=dict(size=28, color='white'),
+            x=0, xanchor="left",
+            y=0.985, yanchor="top",
+            pad=dict(t=8, b=0, l=0, r=0)
+        ),
+        hovermode='x unified',
+        hoverlabel=dict(
+            bgcolor="rgba(0,0,0,0.78)", # 深色背景
+            bordercolor="rgba(255,255,255,0.25)",
+            font=dict(color="white", size=16), # 放大字體
+            align="left"
+        ),
+        spikedistance=-1,
+        hoverdistance=50,
+        legend=dict(orientation="h", y=0.88, yanchor="top", x=0, xanchor="left", bgcolor='rgba(0,0,0,0.5)', font=dict(size=10)),
+    )
+
+    # ✅ 只送一張圖：依裝置決定高度與邊界
+    if mobile:
+        fig.update_layout(
+            height=520,
+            dragmode='pan',
+            title={"y": 1.0, "yanchor": "top"},
+            margin=dict(l=0, r=0, t=100, b=0)
+        )
+    else:
+        fig.update_layout(
+            height=800,
+            dragmode='pan',
+            margin=dict(l=0, r=0, t=120, b=0)
+        )
+    return fig
@@ -0,0 +1,83 @@
+import argparse
+import sys
+
+# ================= 命令列工具：python -m chipk =================
+
+def _cmd_scan(args):
+    from chipk.scan import _print_progress, read_watchlist, scan_watchlist, write_results
+
+    stock_ids = read_watchlist(args.watchlist)
+    days_list = [int(d) for d in args.days.split(",") if d.strip()]
+    if not stock_ids:
+        print("觀察清單沒有股票代號", file=sys.stderr)
+        return 1
+
+    df, failures = scan_watchlist(
+        stock_ids, days_list,
+        workers=args.workers, max_connections=args.max_connections,
+        end=args.end, progress=None if args.quiet else _print_progress,
+    )
+    if not args.no_index:
+        from chipk.branch_index import get_branch_index
+        get_branch_index().add_scan(df)
+
+    out = args.out or f"scan-{df['end_date'].max() if not df.empty else 'empty'}.csv"
+    write_results(df, out)
+    print(f"已寫入 {out}：{df['stock_id'].nunique()} 檔 / {len(df)} 筆，失敗 {len(failures)} 檔", file=sys.stderr)
+    return 0 if not failures else 2
+
+def _cmd_collect(args):
+    from chipk.scan import read_watchlist
+    from chipk.trading_calendar import get_trading_calendar
+    from chipk.windows import collect_daily_aio
+
+    calendar = get_trading_calendar()
+    end_date = calendar.nth_trading_day_before(args.end, 0) if args.end else calendar.last_settled_day()
+    start_date = calendar.nth_trading_day_before(end_date, args.days - 1)
+    failed_stocks = 0
+    for stock_id in read_watchlist(args.watchlist):
+        ok, failed = collect_daily_aio(stock_id, start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'),
+                                       rate=args.rate, max_connections=args.max_connections)
+        failed_stocks += bool(failed)
+        if not args.quiet:
+            print(f"{stock_id}: 新增 {ok} 天，失敗 {failed} 天", file=sys.stderr)
+    return 0 if not failed_stocks else 2
+
+def _cmd_calendar_update(args):
+    from chipk.trading_calendar import update_holidays
+
+    added = update_holidays()
+    print(f"休市表已更新，新增 {added} 天", file=sys.stderr)
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m chipk", description="籌碼K線批次工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    scan = sub.add_parser("scan", help="批次計算觀察清單的主力買賣超前 15 大")
+    scan.add_argument("--watchlist", required=True, help="股票清單檔，每行一個代號")
+    scan.add_argument("--days", default="5,20,60", help="統計天數 (交易日)，逗號分隔")
+    scan.add_argument("--out", help="輸出檔 (.csv 或 .parquet)，預設 scan-<結束日>.csv")
+    scan.add_argument("--workers", type=int, default=4, help="worker 程序數")
+    scan.add_argument("--max-connections", type=int, default=4, help="所有 worker 合計同時連到富邦的上限")
+    scan.add_argument("--end", help="區間結束日 (YYYY-MM-DD)，預設最近交易日")
+    scan.add_argument("--quiet", action="store_true", help="不顯示進度")
+    scan.add_argument("--no-index", action="store_true", help="不寫入分點反向索引")
+    scan.set_defaults(func=_cmd_scan)
+
+    collect = sub.add_parser("collect", help="回補單日排行，供任意統計天數在本機計算")
+    collect.add_argument("--watchlist", required=True, help="股票清單檔，每行一個代號")
+    collect.add_argument("--days", type=int, default=240, help="回補最近幾個交易日")
+    collect.add_argument("--max-connections", type=int, default=4, help="同時連到富邦的上限")
+    collect.add_argument("--rate", type=float, default=2.0, help="每秒送到富邦的請求數上限")
+    collect.add_argument("--end", help="回補結束日 (YYYY-MM-DD)，預設最近交易日")
+    collect.add_argument("--quiet", action="store_true", help="不顯示進度")
+    collect.set_defaults(func=_cmd_collect)
+
+    cal = sub.add_parser("calendar-update", help="從證交所更新休市日")
+    cal.set_defaults(func=_cmd_calendar_update)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
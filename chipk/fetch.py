@@ -0,0 +1,139 @@
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from chipk.governor import SourceUnavailable, get_governor
+from chipk.parsing import (
+    extract_daily_table,
+    has_next_page,
+    has_ranking_table,
+    parse_broker_daily_frames,
+    parse_ranking_html,
+    resolve_page_urls,
+)
+from chipk.timing import span
+
+# ================= 純 HTTP 抓取 (不啟動瀏覽器) =================
+
+# 可用環境變數指向本機替身伺服器，離線測試時不必連到富邦
+FUBON_BASE = os.environ.get("CHIPK_FUBON_BASE", "https://fubon-ebrokerdj.fbs.com.tw").rstrip("/")
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+_session_local = threading.local()
+
+def get_session():
+    # requests.Session 非執行緒安全，每個執行緒各持有一個連線池
+    session = getattr(_session_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=1)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update({"User-Agent": USER_AGENT})
+        _session_local.session = session
+    return session
+
+def ranking_url(stock_id, start_date, end_date):
+    return f"{FUBON_BASE}/z/zc/zco/zco.djhtm?a={stock_id}&e={start_date}&f={end_date}"
+
+def decode_html(content, declared=None):
+    # 富邦頁面為 Big5，header 常未帶 charset，改看 <meta>
+    charset = declared
+    if not charset:
+        m = re.search(rb'charset=["\']?([\w-]+)', content[:2048], re.I)
+        charset = m.group(1).decode("ascii") if m else "utf-8"
+    if charset.lower() in ("big5", "big-5", "x-big5"):
+        charset = "cp950"
+    try:
+        return content.decode(charset, errors="replace")
+    except LookupError:
+        return content.decode("utf-8", errors="replace")
+
+def fetch_html(url, timeout=10):
+    # ✅ 經過共用的流量控制：來源吃緊時自動降併發、退避，持續失敗時斷路 (拋 SourceUnavailable，不送出請求)
+    with get_governor().request(), span("http.get"):
+        resp = get_session().get(url, timeout=timeout)
+        resp.raise_for_status()
+    declared = resp.encoding if "charset" in resp.headers.get("Content-Type", "").lower() else None
+    return decode_html(resp.content, declared)
+
+def fetch_ranking(stock_id, start_date, end_date, timeout=10, limit=15):
+    """以 HTTP 取得排行頁，回傳 (df_buy, df_sell, sum_buy, sum_sell, broker_info, url)；頁面沒有排行表時回傳 None"""
+    url = ranking_url(stock_id, start_date, end_date)
+    try:
+        html = fetch_html(url, timeout=timeout)
+    except (requests.RequestException, SourceUnavailable):
+        return None
+    if not has_ranking_table(html):
+        return None
+    with span("parse.ranking"):
+        parsed = parse_ranking_html(html, url, limit=limit)
+    if parsed is None:
+        return None
+    return (*parsed, url)
+
+def broker_daily_url(stock_id, broker_key, start_date, end_date):
+    BHID, b, c_val = broker_key
+    return (f"{FUBON_BASE}/z/zc/zco/zco0/zco0.djhtm?A={stock_id}"
+            f"&BHID={BHID}"
+            f"&b={b}"
+            f"&C={c_val}"
+            f"&D={start_date}"
+            f"&E={end_date}"
+            f"&ver=V3")
+
+def split_date_range(start_date, end_date, days):
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    end = datetime.strptime(end_date, "%Y-%m-%d")
+    chunks = []
+    while start <= end:
+        chunk_end = min(start + timedelta(days=days - 1), end)
+        chunks.append((start.strftime("%Y-%m-%d"), chunk_end.strftime("%Y-%m-%d")))
+        start = chunk_end + timedelta(days=1)
+    return chunks
+
+def _fetch_pages(urls, max_workers, timeout):
+    if not urls:
+        return []
+    # executor.map 保持輸入順序，分頁串接後仍是原本的頁序
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(urls))) as pool:
+        pages = list(pool.map(lambda u: fetch_html(u, timeout=timeout), urls))
+    return pages
+
+def fetch_broker_daily(stock_id, broker_key, start_date, end_date, max_workers=4, chunk_days=31, timeout=10):
+    """以 HTTP 並行抓取分點每日明細所有分頁，回傳 (df, url)；需要瀏覽器才能翻頁時 df 為 None"""
+    target_url = broker_daily_url(stock_id, broker_key, start_date, end_date)
+    try:
+        first_html = fetch_html(target_url, timeout=timeout)
+        page_urls = resolve_page_urls(first_html, target_url)
+
+        if page_urls is not None:
+            pages, urls = [first_html], [target_url]
+            while page_urls:
+                pages += _fetch_pages(page_urls, max_workers, timeout)
+                urls += page_urls
+                if not has_next_page(pages[-1]):
+                    break
+                # ✅ 分頁列只列附近幾頁 (1 2 3 … 下一頁) 時，由最後一頁的分頁列接著推；推不出來就交給瀏覽器，不存不完整的明細
+                page_urls = (resolve_page_urls(pages[-1], urls[-1]) or [])[len(pages) - 1:]
+                if not page_urls:
+                    return None, target_url
+        else:
+            # 分頁是 JS 產生的：改把日期區間切小段並行抓，每段只需一頁
+            chunk_urls = [broker_daily_url(stock_id, broker_key, s, e)
+                          for s, e in split_date_range(start_date, end_date, chunk_days)]
+            pages = _fetch_pages(chunk_urls, max_workers, timeout)
+            if any(has_next_page(html) for html in pages):
+                return None, target_url
+
+        with span("parse.broker_daily", pages=len(pages)):
+            all_dfs = [extract_daily_table(html) for html in pages if "日期" in html]
+            return parse_broker_daily_frames(all_dfs), target_url
+    except Exception:
+        return None, target_url
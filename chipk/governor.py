@@ -0,0 +1,172 @@
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+
+from chipk.timing import metrics
+
+# ================= 富邦來源流量控制：AIMD 併發、指數退避、斷路器 =================
+
+MAX_CONCURRENCY = int(os.environ.get("CHIPK_SOURCE_MAX_CONCURRENCY", "8"))
+MIN_CONCURRENCY = 1
+# 回應超過這個秒數視為來源吃緊，併發上限減半
+LATENCY_TARGET = float(os.environ.get("CHIPK_SOURCE_LATENCY_TARGET", "3"))
+FAILURE_THRESHOLD = 5          # 連續失敗幾次後斷路
+OPEN_SECONDS = 30              # 斷路後多久放一個試探請求；試探失敗則加倍，最多 MAX_OPEN_SECONDS
+MAX_OPEN_SECONDS = 600
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30
+ACQUIRE_TIMEOUT = 30           # 排隊等併發名額的上限
+THROTTLE_STATUS = {429, 500, 502, 503, 504}
+
+STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+class SourceUnavailable(Exception):
+    """斷路器開啟或排隊逾時，請求沒有送出"""
+
+def is_source_failure(exc):
+    """來源端的問題 (逾時、連線失敗、429/5xx) 才算失敗；404、解析錯誤等不影響流量控制"""
+    if isinstance(exc, requests.HTTPError):
+        return exc.response is not None and exc.response.status_code in THROTTLE_STATUS
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout)):
+        return True
+    # selenium 的 TimeoutException / WebDriverException (不為此 import selenium)
+    return type(exc).__name__ in ("TimeoutException", "WebDriverException")
+
+class SourceGovernor:
+    """同一程序內所有抓取 (HTTP、瀏覽器、背景預抓與重抓) 共用：
+    成功且夠快時併發上限每次 +1/limit，失敗或過慢時減半 (每秒最多一次)；
+    失敗後依連續失敗次數指數退避；連續失敗 FAILURE_THRESHOLD 次斷路，斷路期間直接拋 SourceUnavailable"""
+
+    def __init__(self, name="fubon", max_concurrency=MAX_CONCURRENCY, latency_target=LATENCY_TARGET):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.latency_target = latency_target
+        self.limit = float(min(4, max_concurrency))
+        self.inflight = 0
+        self.failures = 0
+        self._cond = threading.Condition()
+        self._backoff_until = 0.0
+        self._last_decrease = 0.0
+        self._opened_at = None
+        self._open_for = OPEN_SECONDS
+        self._probing = False
+        self._publish()
+
+    @property
+    def state(self):
+        with self._cond:
+            return self._state(time.monotonic())
+
+    def _state(self, now):
+        if self._opened_at is None:
+            return "closed"
+        if now < self._opened_at + self._open_for:
+            return "open"
+        return "half_open"
+
+    def available(self):
+        """現在送出請求會不會被斷路器擋下 (斷路中，或半開且已有試探請求在跑)"""
+        with self._cond:
+            state = self._state(time.monotonic())
+            return state == "closed" or (state == "half_open" and not self._probing)
+
+    def retry_in(self):
+        """斷路中距離下次試探的秒數"""
+        with self._cond:
+            if self._opened_at is None:
+                return 0.0
+            return max(0.0, self._opened_at + self._open_for - time.monotonic())
+
+    @contextmanager
+    def request(self):
+        """包住一次對來源的請求：排隊取得名額，結束後依耗時與例外調整流量"""
+        self._acquire()
+        t0 = time.monotonic()
+        try:
+            yield
+        except BaseException as e:
+            self._release(time.monotonic() - t0, failure=is_source_failure(e), ok=False)
+            raise
+        self._release(time.monotonic() - t0, failure=False, ok=True)
+
+    def _acquire(self):
+        deadline = time.monotonic() + ACQUIRE_TIMEOUT
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                state = self._state(now)
+                if state == "open" or (state == "half_open" and self._probing):
+                    metrics.count_source(self.name, "rejected")
+                    raise SourceUnavailable(f"{self.name} 斷路中，{self._opened_at + self._open_for - now:.0f} 秒後重試")
+                if now >= deadline:
+                    metrics.count_source(self.name, "rejected")
+                    raise SourceUnavailable(f"{self.name} 排隊逾時")
+                if now < self._backoff_until:
+                    self._cond.wait(min(self._backoff_until, deadline) - now)
+                    continue
+                if self.inflight < int(self.limit):
+                    self.inflight += 1
+                    if state == "half_open":
+                        # ✅ 半開：只放一個試探請求，其他人繼續用快取
+                        self._probing = True
+                    self._publish()
+                    return
+                self._cond.wait(deadline - now)
+
+    def _release(self, latency, failure, ok):
+        with self._cond:
+            now = time.monotonic()
+            self.inflight -= 1
+            probing, self._probing = self._probing, False
+            if failure:
+                self.failures += 1
+                self._decrease(now)
+                delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (self.failures - 1))
+                self._backoff_until = now + delay * random.uniform(0.5, 1.5)
+                if probing or self.failures >= FAILURE_THRESHOLD:
+                    # 試探又失敗時斷路時間加倍
+                    self._open_for = min(MAX_OPEN_SECONDS, self._open_for * 2) if probing else OPEN_SECONDS
+                    self._opened_at = now
+                metrics.count_source(self.name, "failure")
+            elif ok:
+                self.failures = 0
+                if probing:
+                    self._opened_at = None
+                    self._open_for = OPEN_SECONDS
+                if latency > self.latency_target:
+                    self._decrease(now)
+                else:
+                    self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+                metrics.count_source(self.name, "ok")
+            self._publish()
+            self._cond.notify_all()
+
+    def _decrease(self, now):
+        if now - self._last_decrease >= 1.0:
+            self.limit = max(MIN_CONCURRENCY, self.limit / 2)
+            self._last_decrease = now
+
+    def _publish(self):
+        metrics.set_gauge("chipk_source_state", self.name, STATE_VALUES[self._state(time.monotonic())],
+                          "Circuit breaker state per source (0 closed, 1 half-open, 2 open).")
+        metrics.set_gauge("chipk_source_concurrency_limit", self.name, int(self.limit),
+                          "Current adaptive concurrency limit per source.")
+
+    def stats(self):
+        with self._cond:
+            return {"state": self._state(time.monotonic()), "limit": int(self.limit),
+                    "inflight": self.inflight, "failures": self.failures}
+
+_governor = None
+_governor_lock = threading.Lock()
+
+def get_governor():
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = SourceGovernor()
+        return _governor
@@ -0,0 +1,62 @@
+import numpy as np
+
+# ================= 圖表細節層級 (減少送到瀏覽器的資料量) =================
+
+MAX_DAILY_BARS = 150     # 可視範圍超過這麼多根日K就改週K
+MAX_WEEKLY_BARS = 150    # 週K仍超過就改月K
+TRIM_MARGIN_BARS = 60    # 短區間保留在可視範圍左側的緩衝，讓拖曳時還有資料
+
+BAR_RULES = {None: "日", "W-FRI": "週", "ME": "月"}
+
+def bar_rule(n_visible):
+    if n_visible <= MAX_DAILY_BARS:
+        return None
+    if n_visible / 5 <= MAX_WEEKLY_BARS:
+        return "W-FRI"
+    return "ME"
+
+def resample_bars(df, rule):
+    """日K併成週/月K；K棒日期取該期最後一個交易日，買賣超加總、累計與均線取期末值"""
+    agg = {"Date": "last", "DateStr": "last", "Open": "first", "High": "max", "Low": "min", "Close": "last"}
+    for col in df.columns:
+        if col.startswith("MA") or col == "cumulative_net":
+            agg[col] = "last"
+        elif col in ("Volume", "買賣超_Final"):
+            agg[col] = "sum"
+    out = df.set_index("Date", drop=False).resample(rule).agg(agg)
+    return out.dropna(subset=["Close"]).reset_index(drop=True)
+
+def minmax_downsample(y, n_buckets):
+    """每個區段只留最小與最大值的位置 (依原順序)，折線的高低點不會被抹平"""
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= 2 * n_buckets:
+        return np.arange(n)
+    edges = np.linspace(0, n, n_buckets + 1).astype(int)
+    starts, ends = edges[:-1], edges[1:]
+    filled = np.where(np.isnan(y), np.nanmean(y) if np.isfinite(np.nanmean(y)) else 0, y)
+    keep = []
+    for s, e in zip(starts, ends):
+        seg = filled[s:e]
+        keep.extend(sorted({s + int(np.argmin(seg)), s + int(np.argmax(seg))}))
+    keep = np.unique(np.r_[0, keep, n - 1])
+    return keep
+
+def chart_level_of_detail(plot_df, start_dt):
+    """回傳 (K棒資料, 累計線資料, 週期)；週期為 None 表示日K"""
+    visible = int((plot_df["Date"] >= start_dt).sum())
+    rule = bar_rule(visible)
+    has_cum = "cumulative_net" in plot_df.columns
+
+    if rule is None:
+        first = max(0, len(plot_df) - visible - TRIM_MARGIN_BARS)
+        bars = plot_df.iloc[first:].reset_index(drop=True)
+        cum = bars[["Date", "cumulative_net"]] if has_cum else None
+        return bars, cum, None
+
+    bars = resample_bars(plot_df, rule)
+    cum = None
+    if has_cum:
+        keep = minmax_downsample(plot_df["cumulative_net"].to_numpy(), len(bars))
+        cum = plot_df.iloc[keep][["Date", "cumulative_net"]].reset_index(drop=True)
+    return bars, cum, rule
@@ -0,0 +1,231 @@
+import re
+from io import StringIO
+from urllib.parse import urljoin, urlparse, parse_qs
+
+import pandas as pd
+
+from chipk.normalize import parse_dates, to_int, to_number
+
+# ================= 富邦主力進出頁面解析 =================
+
+def normalize_name(name):
+    return str(name).strip().replace(" ", "").replace("　", "")
+
+def clean_sub_df(d):
+    d = d.dropna(subset=['broker'])
+    mask = d['broker'].astype(str).str.contains("合計|平均|買超券商|賣超券商", na=False)
+    d = d[~mask]
+    for col in ['buy', 'sell', 'net']:
+        d[col] = to_int(d[col])
+    return d
+
+def _find_ranking_table(doc):
+    # 取最內層包含「買超券商」的表格 (外層版面表格也會包含這段文字)
+    tables = doc.xpath("//table[.//*[contains(text(), '買超券商')]][not(.//table[.//*[contains(text(), '買超券商')]])]")
+    return tables[0] if tables else None
+
+def _table_rows(table):
+    # 瀏覽器會自動補 tbody，原始 HTML 則不一定有
+    return table.xpath("./tr | ./tbody/tr | ./thead/tr")
+
+def _cell_text(row, idx):
+    cells = row.xpath("./td | ./th")
+    if idx < len(cells):
+        return cells[idx].text_content().strip()
+    return None
+
+def parse_broker_links(doc, page_url):
+    broker_info = {}
+    for link in doc.xpath("//table//a[contains(@href, 'zco0/zco0.djhtm')]"):
+        name = normalize_name(link.text_content())
+        href = link.get('href')
+        if name and href:
+            params = parse_qs(urlparse(urljoin(page_url, href)).query)
+            if 'b' in params and 'BHID' in params:
+                broker_info[name] = {
+                    'b': params['b'][0],
+                    'BHID': params['BHID'][0]
+                }
+    return broker_info
+
+def find_broker_params(broker_info, broker_name):
+    # 名稱完全相符優先，否則容許排行表與連結文字互相包含
+    target_key = normalize_name(broker_name)
+    if not broker_info:
+        return None
+    if target_key in broker_info:
+        return broker_info[target_key]
+    for k, v in broker_info.items():
+        if target_key in k or k in target_key:
+            return v
+    return None
+
+def broker_key_of(broker_params):
+    return (broker_params['BHID'], broker_params['b'], broker_params.get('C', '1'))
+
+def parse_ranking_sums(table):
+    sum_buy = {"total": "0", "avg": "0"}
+    sum_sell = {"total": "0", "avg": "0"}
+    if table is None:
+        return sum_buy, sum_sell
+
+    rows = _table_rows(table)
+    total_row = avg_row = None
+    for row in rows:
+        label = _cell_text(row, 0) or ""
+        if total_row is None and label.startswith("合計"):
+            total_row = row
+        elif avg_row is None and label.startswith("平均"):
+            avg_row = row
+    # 找不到標籤時沿用原本 XPath 的位置 (tr[22] / tr[23])
+    if total_row is None and len(rows) > 21:
+        total_row = rows[21]
+    if avg_row is None and len(rows) > 22:
+        avg_row = rows[22]
+
+    if total_row is not None:
+        sum_buy['total'] = _cell_text(total_row, 1) or "0"
+        sum_sell['total'] = _cell_text(total_row, 3) or "0"
+    if avg_row is not None:
+        sum_buy['avg'] = _cell_text(avg_row, 1) or "0"
+        sum_sell['avg'] = _cell_text(avg_row, 3) or "0"
+    return sum_buy, sum_sell
+
+def has_ranking_table(html):
+    return bool(html) and "買超券商" in html and "賣超券商" in html
+
+def parse_ranking_html(html, page_url, limit=15):
+    """解析 zco.djhtm 排行頁，回傳 (df_buy, df_sell, sum_buy, sum_sell, broker_info)；格式不符回傳 None
+    limit 為每邊保留的名次，None 表示頁面上全部列出的分點"""
+    import lxml.html
+
+    if not has_ranking_table(html):
+        return None
+
+    tables = pd.read_html(StringIO(html), match="買超券商")
+
+    # 外層版面表格也會被 match 到，取第一個真的有表頭列的
+    df, header_row = None, -1
+    for table in tables:
+        for i, row in table.iterrows():
+            row_str = row.astype(str).values
+            if "買超券商" in row_str and "賣超券商" in row_str:
+                df, header_row = table, i
+                break
+        if df is not None:
+            break
+    if df is None:
+        return None
+
+    doc = lxml.html.fromstring(html)
+    try:
+        broker_info = parse_broker_links(doc, page_url)
+    except Exception:
+        broker_info = {}
+    sum_buy, sum_sell = parse_ranking_sums(_find_ranking_table(doc))
+
+    df_clean = df.iloc[header_row+1:].copy()
+    df_buy = df_clean.iloc[:, [0, 1, 2, 3, 4]].copy()
+    df_buy.columns = ['broker', 'buy', 'sell', 'net', 'pct']
+    df_sell = df_clean.iloc[:, [5, 6, 7, 8, 9]].copy()
+    df_sell.columns = ['broker', 'buy', 'sell', 'net', 'pct']
+
+    df_buy = clean_sub_df(df_buy)
+    df_sell = clean_sub_df(df_sell)
+    df_buy = df_buy[df_buy['net'] > 0].sort_values('net', ascending=False).head(limit).reset_index(drop=True)
+    df_sell['abs_net'] = df_sell['net'].abs()
+    df_sell = df_sell.sort_values('abs_net', ascending=False).head(limit).drop(columns=['abs_net']).reset_index(drop=True)
+
+    return df_buy, df_sell, sum_buy, sum_sell, broker_info
+
+# ================= 分點每日明細 (zco0.djhtm) =================
+
+# 分頁數上限 (約 2 年的每日明細只有十幾頁)，避免頁面異常時送出大量請求
+MAX_PAGES = 60
+
+def has_next_page(html):
+    return bool(html) and "下一頁" in html
+
+def page_total(html):
+    """頁面文字上的總頁數 (「共 N 頁」/「第 x/N 頁」)，沒寫時回傳 None"""
+    m = re.search(r"共\s*(\d+)\s*頁", html) or re.search(r"第\s*\d+\s*/\s*(\d+)\s*頁", html)
+    return int(m.group(1)) if m else None
+
+def extract_daily_table(html):
+    tables = pd.read_html(StringIO(html), match="日期")
+    # 外層版面表格也會 match，從最內層 (最後一個) 開始找
+    for table in reversed(tables):
+        head = " ".join(str(c) for c in table.columns)
+        if len(table) > 0:
+            head += " " + " ".join(table.iloc[0].astype(str).values)
+        if "日期" in head and "買進" in head:
+            return table
+    return tables[0] if tables else None
+
+def resolve_page_urls(html, page_url):
+    """由第一頁的「下一頁」連結推出第 2..N 頁網址 (最多到 MAX_PAGES)；沒有分頁回傳 []，分頁是 JS 無法推算時回傳 None"""
+    import lxml.html
+
+    if not has_next_page(html):
+        return []
+
+    doc = lxml.html.fromstring(html, base_url=page_url)
+    next_links = [a for a in doc.xpath("//a[@href]") if "下一頁" in a.text_content()]
+    if not next_links or next_links[0].get("href", "").lower().startswith("javascript"):
+        return None
+
+    # 分頁參數 = 「下一頁」網址裡與目前網址不同的數字參數
+    next_link = next_links[0]
+    sample_url = urljoin(page_url, next_link.get("href"))
+    base_params = parse_qs(urlparse(page_url).query)
+    page_key = next((k for k, v in parse_qs(urlparse(sample_url).query).items()
+                     if v[0].isdigit() and base_params.get(k) != v), None)
+    if page_key is None:
+        return None
+
+    # 只看「下一頁」所在的分頁區塊：以「共 N 頁」為準，沒寫時取區塊內頁碼連結的最大值
+    block = next_link.getparent()
+    max_page = page_total(block.text_content())
+    if max_page is None:
+        max_page = 2
+        for a in block.xpath(".//a[@href]"):
+            v = parse_qs(urlparse(urljoin(page_url, a.get("href"))).query).get(page_key)
+            if v and v[0].isdigit() and normalize_name(a.text_content()).isdigit():
+                max_page = max(max_page, int(v[0]))
+    max_page = min(max_page, MAX_PAGES)
+
+    parsed = urlparse(sample_url)
+    pages = []
+    for n in range(2, max_page + 1):
+        query = re.sub(rf"(^|&){re.escape(page_key)}=\d+", rf"\g<1>{page_key}={n}", parsed.query)
+        pages.append(parsed._replace(query=query).geturl())
+    return pages
+
+def parse_broker_daily_frames(all_dfs):
+    """合併各分頁表格並整理成 日期/買進/賣出/買賣超/買賣超_Calc/DateStr；格式不符回傳 None"""
+    all_dfs = [d for d in all_dfs if d is not None]
+    if not all_dfs:
+        return None
+
+    df = pd.concat(all_dfs, ignore_index=True)
+    df.columns = [str(c).strip().replace(" ", "") for c in df.columns]
+
+    if '買賣超' not in df.columns and len(df.columns) >= 4:
+        df = df.iloc[:, :4]
+        df.columns = ['日期', '買進', '賣出', '買賣超']
+
+    required = ['日期', '買進', '賣出', '買賣超']
+    if not all(c in df.columns for c in required):
+        return None
+
+    df = df[df['日期'] != '日期'].copy()
+
+    for col in ['買進', '賣出', '買賣超']:
+        df[col] = to_number(df[col])
+
+    df['買賣超_Calc'] = df['買進'] - df['賣出']
+
+    df['DateStr'] = parse_dates(df['日期'])
+    df = df.dropna(subset=['DateStr'])
+    df = df.sort_values('DateStr', ascending=True)
+    return df
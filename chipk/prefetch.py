@@ -0,0 +1,84 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from chipk.fetch import fetch_broker_daily
+from chipk.store import get_broker_store
+
+# ================= 分點每日明細：增量同步與背景預抓 =================
+
+PREFETCH_TOP = int(os.environ.get("CHIPK_PREFETCH_TOP", "5"))
+PREFETCH_WORKERS = int(os.environ.get("CHIPK_PREFETCH_WORKERS", "2"))
+# 這麼多分鐘內已預抓成功的分點不再送出
+PREFETCH_RECENT_MINUTES = float(os.environ.get("CHIPK_PREFETCH_RECENT_MINUTES", "10"))
+
+def sync_broker_daily(stock_id, broker_key, start_date, end_date, fallback=None, store=None):
+    """把資料庫補到 end_date；fallback(stock_id, broker_key, start, end) 為 HTTP 失敗時的備援抓法"""
+    store = store or get_broker_store()
+    fetch_start = store.missing_from(stock_id, broker_key, start_date, end_date)
+    if fetch_start is None:
+        return True
+    df, _ = fetch_broker_daily(stock_id, broker_key, fetch_start, end_date)
+    if df is None and fallback is not None:
+        df, _ = fallback(stock_id, broker_key, fetch_start, end_date)
+    if df is None:
+        return False
+    store.save(stock_id, broker_key, df, fetch_start, end_date)
+    return True
+
+class BrokerPrefetcher:
+    """背景把熱門分點的明細先抓進資料庫；同一分點同時只會有一個任務，最近剛同步過的分點略過"""
+
+    def __init__(self, max_workers=PREFETCH_WORKERS, recent_minutes=PREFETCH_RECENT_MINUTES):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="chipk-prefetch")
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._synced = {}  # key -> 上次同步成功的 monotonic 時間
+        self.recent_seconds = recent_minutes * 60
+
+    def submit(self, stock_id, broker_key, start_date, end_date):
+        """送出背景同步；進行中時回傳同一個 future，最近剛同步過時回傳 None"""
+        key = (stock_id, broker_key[0], broker_key[1])
+        with self._lock:
+            if key in self._inflight:
+                return self._inflight[key]
+            synced = self._synced.get(key)
+            if synced is not None and time.monotonic() - synced < self.recent_seconds:
+                return None
+            future = self._pool.submit(self._sync, key, stock_id, broker_key, start_date, end_date)
+            self._inflight[key] = future
+        return future
+
+    def _sync(self, key, stock_id, broker_key, start_date, end_date):
+        ok = False
+        try:
+            ok = sync_broker_daily(stock_id, broker_key, start_date, end_date)
+            return ok
+        finally:
+            # 在 future 完成前整理好，等結果的人接著送出時看到的是最新狀態
+            with self._lock:
+                self._inflight.pop(key, None)
+                if ok:
+                    self._synced[key] = time.monotonic()
+
+    def wait_for(self, stock_id, broker_key, timeout=None):
+        """分點正在背景抓時等它完成，避免前景再抓一次"""
+        with self._lock:
+            future = self._inflight.get((stock_id, broker_key[0], broker_key[1]))
+        if future is None:
+            return
+        try:
+            future.result(timeout=timeout)
+        except Exception:
+            pass
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+def get_prefetcher():
+    global _prefetcher
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = BrokerPrefetcher()
+        return _prefetcher
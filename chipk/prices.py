@@ -0,0 +1,175 @@
+import threading
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from chipk.store import DB_PATH, connect
+from chipk.timing import span
+
+# ================= 股價歷史 (yfinance + 本機增量快取) =================
+
+MA_WINDOWS = (5, 10, 20, 60)
+MA_COLUMNS = [f"MA{w}" for w in MA_WINDOWS]
+BAR_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+HISTORY_DAYS = 730
+
+class PriceStore:
+    """每檔股票的日K與均線；只下載最後一根之後的K棒，均線只從尾端重算"""
+
+    def __init__(self, path=None):
+        self.path = path or DB_PATH
+        with connect(self.path) as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS price_bars (
+                    stock_id TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    open REAL, high REAL, low REAL, close REAL, volume REAL,
+                    ma5 REAL, ma10 REAL, ma20 REAL, ma60 REAL,
+                    PRIMARY KEY (stock_id, date)
+                );
+                CREATE TABLE IF NOT EXISTS price_ticker (
+                    stock_id TEXT PRIMARY KEY,
+                    ticker TEXT NOT NULL
+                );
+            """)
+
+    def ticker(self, stock_id):
+        with connect(self.path) as conn:
+            row = conn.execute("SELECT ticker FROM price_ticker WHERE stock_id=?", (stock_id,)).fetchone()
+        return row[0] if row else None
+
+    def tail(self, stock_id, n):
+        with connect(self.path) as conn:
+            df = pd.read_sql_query(
+                "SELECT date, close FROM price_bars WHERE stock_id=? ORDER BY date DESC LIMIT ?",
+                conn, params=(stock_id, n),
+            )
+        return df.iloc[::-1].reset_index(drop=True)
+
+    def save(self, stock_id, ticker, bars, replace=False):
+        rows = [
+            (stock_id, d, *(None if pd.isna(v) else float(v) for v in vals))
+            for d, vals in zip(bars["DateStr"], bars[BAR_COLUMNS + MA_COLUMNS].itertuples(index=False))
+        ]
+        with _lock, connect(self.path) as conn:
+            if replace:
+                conn.execute("DELETE FROM price_bars WHERE stock_id=?", (stock_id,))
+            conn.executemany("INSERT OR REPLACE INTO price_bars VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.execute("INSERT OR REPLACE INTO price_ticker VALUES (?, ?)", (stock_id, ticker))
+
+    def load(self, stock_id, start_date):
+        with connect(self.path) as conn:
+            df = pd.read_sql_query(
+                "SELECT date AS DateStr, open AS Open, high AS High, low AS Low, close AS Close, volume AS Volume, "
+                "ma5 AS MA5, ma10 AS MA10, ma20 AS MA20, ma60 AS MA60 "
+                "FROM price_bars WHERE stock_id=? AND date >= ? ORDER BY date",
+                conn, params=(stock_id, start_date),
+            )
+        # 索引不可沿用 DateStr 名稱，否則與 DateStr 欄位 merge 時會衝突
+        df.index = pd.DatetimeIndex(pd.to_datetime(df["DateStr"]).to_numpy())
+        return df
+
+def _download(ticker, **kwargs):
+    import yfinance as yf
+
+    with span("price.download", ticker=ticker):
+        df = yf.Ticker(ticker).history(**kwargs)
+    if df.empty:
+        return df
+    df.index = df.index.tz_localize(None)
+    df = df[BAR_COLUMNS].copy()
+    df["DateStr"] = df.index.strftime('%Y-%m-%d')
+    return df
+
+def get_stock_name(stock_id):
+    """twstock 代號表裡的股票名稱，查無時回傳空字串"""
+    try:
+        import twstock
+        if stock_id in twstock.codes:
+            return twstock.codes[stock_id].name
+        return ""
+    except Exception:
+        return ""
+
+def candidate_tickers(stock_id):
+    # twstock 代號表知道上市/上櫃時直接選對後綴，省掉一次失敗的下載
+    try:
+        import twstock
+        market = twstock.codes[stock_id].market if stock_id in twstock.codes else ""
+    except Exception:
+        market = ""
+    if market == "上櫃":
+        return [f"{stock_id}.TWO", f"{stock_id}.TW"]
+    return [f"{stock_id}.TW", f"{stock_id}.TWO"]
+
+def _download_full(stock_id, ticker=None):
+    # 上市 (.TW) 抓不到再試上櫃 (.TWO)
+    for t in ([ticker] if ticker else candidate_tickers(stock_id)):
+        df = _download(t, period="2y")
+        if not df.empty:
+            return t, df
+    return None, None
+
+def add_moving_averages(df, history=None):
+    """在 df 加上 MA 欄位；history 為 df 之前的收盤價，讓尾端增量計算時視窗完整"""
+    closes = df["Close"]
+    if history is not None and len(history):
+        closes = pd.concat([history, closes], ignore_index=True)
+    for w, col in zip(MA_WINDOWS, MA_COLUMNS):
+        df[col] = closes.rolling(window=w).mean().iloc[-len(df):].to_numpy()
+    return df
+
+def update_price_history(stock_id, store=None):
+    store = store or get_price_store()
+    ticker = store.ticker(stock_id)
+    # 多讀一根：從倒數第二根重算時，前面仍要有完整的 max(MA_WINDOWS) - 1 根收盤價
+    tail = store.tail(stock_id, max(MA_WINDOWS) + 1) if ticker else None
+
+    if tail is None or tail.empty:
+        ticker, df = _download_full(stock_id, ticker)
+        if df is None:
+            return None
+        store.save(stock_id, ticker, add_moving_averages(df), replace=True)
+        return ticker
+
+    # 從倒數第二根 (已收定) 重抓：最後一根可能是盤中還沒收定的K棒，一律以新資料覆蓋
+    anchor = tail.iloc[-2] if len(tail) > 1 else tail.iloc[-1]
+    new = _download(ticker, start=anchor["date"])
+    if new.empty:
+        return ticker
+
+    # 除權息後 yfinance 會回溯調整價格，已收定的那根對不上就整段重抓
+    overlap = new[new["DateStr"] == anchor["date"]]
+    if not overlap.empty and abs(overlap["Close"].iloc[0] - anchor["close"]) > 1e-6 * max(1.0, anchor["close"]):
+        ticker, df = _download_full(stock_id, ticker)
+        if df is not None:
+            store.save(stock_id, ticker, add_moving_averages(df), replace=True)
+        return ticker
+
+    history = tail[tail["date"] < new["DateStr"].iloc[0]]["close"].iloc[-(max(MA_WINDOWS) - 1):]
+    store.save(stock_id, ticker, add_moving_averages(new, history))
+    return ticker
+
+def get_price_history(stock_id, days=HISTORY_DAYS, store=None):
+    """最近 days 天的日K (含 DateStr 與 MA5/10/20/60)；查無資料回傳 None"""
+    store = store or get_price_store()
+    try:
+        ticker = update_price_history(stock_id, store)
+    except Exception:
+        # 網路失敗時仍回傳上次存下的資料
+        ticker = store.ticker(stock_id)
+    if ticker is None:
+        return None
+    start = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+    df = store.load(stock_id, start)
+    return df if not df.empty else None
+
+_lock = threading.Lock()
+_stores = {}
+
+def get_price_store(path=None):
+    path = path or DB_PATH
+    with _lock:
+        if path not in _stores:
+            _stores[path] = PriceStore(path)
+        return _stores[path]
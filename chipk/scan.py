@@ -0,0 +1,113 @@
+import multiprocessing
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from chipk.fetch import fetch_ranking
+from chipk.parsing import normalize_name
+from chipk.trading_calendar import get_trading_calendar
+
+# ================= 觀察清單批次掃描 =================
+
+SCAN_COLUMNS = [
+    "stock_id", "days", "start_date", "end_date", "side", "rank",
+    "broker", "BHID", "b", "buy", "sell", "net", "pct", "side_total", "side_avg",
+]
+
+_host_slots = None
+
+def read_watchlist(path):
+    # 每行一檔，可寫「2330 台積電」，# 之後為註解
+    stock_ids = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            token = line.split("#", 1)[0].strip().split()
+            stock_id = re.sub(r'\D', '', token[0]) if token else ""
+            if stock_id and stock_id not in stock_ids:
+                stock_ids.append(stock_id)
+    return stock_ids
+
+def ranking_windows(days_list, end=None):
+    # 與 main.calculate_date_range 相同：120 日以上少算一天
+    calendar = get_trading_calendar()
+    # 預設終點為最近已結算的交易日，盤前/盤中執行不會查到當天還沒有資料的盤
+    end_date = calendar.nth_trading_day_before(end, 0) if end else calendar.last_settled_day()
+    windows = []
+    for days in days_list:
+        adj_days = days - 1 if days >= 120 else days
+        start_date = calendar.nth_trading_day_before(end_date, adj_days - 1)
+        calendar.covers(start_date, end_date)  # 休市表沒涵蓋時記 warning
+        windows.append((days, start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')))
+    return windows
+
+def _init_worker(host_slots):
+    global _host_slots
+    _host_slots = host_slots
+
+def ranking_rows(stock_id, days, start_date, end_date, result):
+    df_buy, df_sell, sum_buy, sum_sell, broker_info, _ = result
+    rows = []
+    for side, df, sums in (("buy", df_buy, sum_buy), ("sell", df_sell, sum_sell)):
+        for rank, rec in enumerate(df.to_dict("records"), start=1):
+            params = broker_info.get(normalize_name(rec["broker"]), {})
+            rows.append({
+                "stock_id": stock_id, "days": days, "start_date": start_date, "end_date": end_date,
+                "side": side, "rank": rank, "broker": rec["broker"],
+                "BHID": params.get("BHID"), "b": params.get("b"),
+                "buy": rec["buy"], "sell": rec["sell"], "net": rec["net"], "pct": rec["pct"],
+                "side_total": sums["total"], "side_avg": sums["avg"],
+            })
+    return rows
+
+def scan_stock(stock_id, windows):
+    """單檔所有區間的前 15 大買賣超；回傳 (rows, 失敗的區間)"""
+    rows, failed = [], []
+    for days, start_date, end_date in windows:
+        try:
+            if _host_slots is not None:
+                # 所有 worker 共用的連線額度，避免同時打太多請求到富邦
+                with _host_slots:
+                    result = fetch_ranking(stock_id, start_date, end_date)
+            else:
+                result = fetch_ranking(stock_id, start_date, end_date)
+        except Exception:
+            result = None
+        if result is None:
+            failed.append(days)
+            continue
+        rows.extend(ranking_rows(stock_id, days, start_date, end_date, result))
+    return rows, failed
+
+def scan_watchlist(stock_ids, days_list, workers=4, max_connections=4, end=None, progress=None):
+    windows = ranking_windows(days_list, end)
+    host_slots = multiprocessing.BoundedSemaphore(max_connections)
+    all_rows, failures = [], {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(host_slots,)) as pool:
+        futures = {pool.submit(scan_stock, stock_id, windows): stock_id for stock_id in stock_ids}
+        for done, future in enumerate(as_completed(futures), start=1):
+            stock_id = futures[future]
+            try:
+                rows, failed = future.result()
+            except Exception:
+                rows, failed = [], [w[0] for w in windows]
+            all_rows.extend(rows)
+            if failed:
+                failures[stock_id] = failed
+            if progress:
+                progress(done, len(futures), stock_id, failed)
+
+    df = pd.DataFrame(all_rows, columns=SCAN_COLUMNS)
+    df = df.sort_values(["stock_id", "days", "side", "rank"]).reset_index(drop=True)
+    return df, failures
+
+def write_results(df, path):
+    if path.endswith(".parquet"):
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False, encoding="utf-8-sig")
+
+def _print_progress(done, total, stock_id, failed):
+    note = f" (失敗區間: {','.join(map(str, failed))})" if failed else ""
+    print(f"[{done}/{total}] {stock_id}{note}", file=sys.stderr)
@@ -0,0 +1,66 @@
+import threading
+
+from chipk.timing import record_flight, span
+
+# ================= single-flight：同樣的請求同時只抓一次 =================
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.waiters = 0
+
+class SingleFlight:
+    """同一個 key 同時只有一個執行緒 (第一個到的) 真的去抓，其他人等它並共用結果 (例外也一併拋出)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, name, key, fn):
+        """回傳 (value, shared)；shared 為 True 表示沒有自己抓，而是共用別人進行中的結果"""
+        flight_key = (name, key)
+        with self._lock:
+            call = self._calls.get(flight_key)
+            leader = call is None
+            if leader:
+                call = self._calls[flight_key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            record_flight(name, "coalesced")
+            with span(f"{name}.coalesced_wait"):
+                call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+
+        record_flight(name, "executed")
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            # 先移除再喚醒，之後進來的請求會重新抓而不是拿到這次的結果
+            with self._lock:
+                self._calls.pop(flight_key, None)
+            call.done.set()
+        return call.value, False
+
+    def inflight(self):
+        """目前進行中的 {(name, key): 等待人數}"""
+        with self._lock:
+            return {k: c.waiters for k, c in self._calls.items()}
+
+_flight = None
+_flight_lock = threading.Lock()
+
+def get_single_flight():
+    global _flight
+    with _flight_lock:
+        if _flight is None:
+            _flight = SingleFlight()
+        return _flight
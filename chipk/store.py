@@ -0,0 +1,113 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+# ================= 本機持久化資料庫 (SQLite) =================
+
+DATA_DIR = os.environ.get("CHIPK_DATA_DIR", os.path.join(os.path.expanduser("~"), ".chipk"))
+DB_PATH = os.path.join(DATA_DIR, "chipk.sqlite3")
+
+@contextmanager
+def connect(path=None):
+    path = path or DB_PATH
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+class BrokerFlowStore:
+    """分點每日進出明細，依 (股票, BHID, b) 分區；sync 表記錄已抓過的日期區間"""
+
+    def __init__(self, path=None):
+        self.path = path or DB_PATH
+        with connect(self.path) as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS broker_daily (
+                    stock_id TEXT NOT NULL,
+                    bhid TEXT NOT NULL,
+                    b TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    buy REAL NOT NULL,
+                    sell REAL NOT NULL,
+                    net REAL NOT NULL,
+                    PRIMARY KEY (stock_id, bhid, b, date)
+                );
+                CREATE TABLE IF NOT EXISTS broker_daily_sync (
+                    stock_id TEXT NOT NULL,
+                    bhid TEXT NOT NULL,
+                    b TEXT NOT NULL,
+                    first_date TEXT NOT NULL,
+                    last_date TEXT NOT NULL,
+                    synced_at TEXT NOT NULL,
+                    PRIMARY KEY (stock_id, bhid, b)
+                );
+            """)
+
+    def synced_range(self, stock_id, broker_key):
+        BHID, b, _ = broker_key
+        with connect(self.path) as conn:
+            row = conn.execute(
+                "SELECT first_date, last_date, synced_at FROM broker_daily_sync WHERE stock_id=? AND bhid=? AND b=?",
+                (stock_id, BHID, b),
+            ).fetchone()
+        return row
+
+    def missing_from(self, stock_id, broker_key, start_date, end_date):
+        """回傳需要從哪一天開始補抓；None 表示資料庫已涵蓋整個區間"""
+        row = self.synced_range(stock_id, broker_key)
+        if row is None:
+            return start_date
+        first_date, last_date, synced_at = row
+        if start_date < first_date:
+            return start_date
+        # 最後一天若是當天抓的，可能還沒收盤結算，重抓那一天
+        if last_date > end_date or (last_date == end_date and synced_at[:10] > last_date):
+            return None
+        return last_date
+
+    def save(self, stock_id, broker_key, df, fetch_start, fetch_end):
+        BHID, b, _ = broker_key
+        rows = [
+            (stock_id, BHID, b, d, float(buy), float(sell), float(net))
+            for d, buy, sell, net in zip(df['DateStr'], df['買進'], df['賣出'], df['買賣超'])
+        ]
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with _write_lock, connect(self.path) as conn:
+            conn.executemany("INSERT OR REPLACE INTO broker_daily VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.execute("""
+                INSERT INTO broker_daily_sync VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(stock_id, bhid, b) DO UPDATE SET
+                    first_date=MIN(first_date, excluded.first_date),
+                    last_date=MAX(last_date, excluded.last_date),
+                    synced_at=excluded.synced_at
+            """, (stock_id, BHID, b, fetch_start, fetch_end, now))
+
+    def load(self, stock_id, broker_key, start_date, end_date):
+        BHID, b, _ = broker_key
+        with connect(self.path) as conn:
+            df = pd.read_sql_query(
+                "SELECT date AS DateStr, buy AS 買進, sell AS 賣出, net AS 買賣超 FROM broker_daily "
+                "WHERE stock_id=? AND bhid=? AND b=? AND date BETWEEN ? AND ? ORDER BY date",
+                conn, params=(stock_id, BHID, b, start_date, end_date),
+            )
+        df.insert(0, '日期', df['DateStr'])
+        df['買賣超_Calc'] = df['買進'] - df['賣出']
+        return df
+
+_write_lock = threading.Lock()
+_stores = {}
+
+def get_broker_store(path=None):
+    path = path or DB_PATH
+    with _write_lock:
+        if path not in _stores:
+            _stores[path] = BrokerFlowStore(path)
+        return _stores[path]
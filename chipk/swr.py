@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from chipk.cache_backend import decode, encode, make_backend
+from chipk.singleflight import get_single_flight
+from chipk.timing import record_cache
+
+# ================= stale-while-revalidate 快取 =================
+
+# 各資料類型的 (soft, hard) TTL 秒數：soft 內直接使用；soft~hard 之間先回上次結果、背景重抓；
+# 超過 hard (或從沒抓過) 才讓使用者等
+TTL = {
+    "ranking": (6 * 3600, 7 * 86400),
+    "broker_daily": (12 * 3600, 7 * 86400),
+    "stock_price": (3600, 3 * 86400),
+}
+SWR_WORKERS = int(os.environ.get("CHIPK_SWR_WORKERS", "2"))
+RETRY_SECONDS = 300  # 背景重抓失敗後，這段時間內不再自動重試 (強制更新除外)
+MEMORY_ENTRIES = 64
+
+class SWRCache:
+    """結果連同抓取時間存在快取後端 (本機檔案或 Redis，見 chipk.cache_backend)；同一個 key 同時只會有一個背景重抓"""
+
+    def __init__(self, backend=None, max_workers=SWR_WORKERS):
+        self.backend = backend or make_backend()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="chipk-swr")
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._failed = {}
+        # 每次重跑都會讀，最近用過的留在記憶體免得反覆解碼
+        self._memory = {}
+
+    def _read(self, namespace, key):
+        cached = self._memory.get((namespace, key))
+        # 記憶體裡的已過 soft TTL 時再讀一次後端：別的副本可能已經更新過
+        if cached is not None and time.time() - cached[1] <= TTL[namespace][0]:
+            return cached
+        row = self.backend.get(namespace, key)
+        if row is None or (cached is not None and row[1] <= cached[1]):
+            return cached
+        entry = (decode(row[0]), row[1])
+        self._remember(namespace, key, entry)
+        return entry
+
+    def _remember(self, namespace, key, entry):
+        with self._lock:
+            if len(self._memory) >= MEMORY_ENTRIES:
+                self._memory.clear()
+            self._memory[(namespace, key)] = entry
+
+    def _write(self, namespace, key, value, fetched_at):
+        # 超過 hard TTL 的資料不會再用，交給後端過期刪除
+        self.backend.set(namespace, key, encode(value), fetched_at, ttl=TTL[namespace][1])
+        self._remember(namespace, key, (value, fetched_at))
+
+    def get(self, namespace, key, loader, force=False, valid=None, empty=None):
+        """回傳 (value, fetched_at, state)；state 為 fresh / stale (已在背景重抓或剛失敗) / miss (當場抓取) /
+        coalesced (等別的使用者正在進行的同一抓取) /
+        failed (沒有可用的舊資料且剛抓失敗，RETRY_SECONDS 內不再重抓)
+        loader() 可能在背景執行緒執行，不可呼叫 Streamlit；loader 拋例外視同回傳 None，
+        valid(value) 為 False 的結果不寫入快取；抓不到 (None) 時回傳 empty，呼叫端可直接拆 tuple"""
+        soft, hard = TTL[namespace]
+        key = repr(key)
+        valid = valid or (lambda v: v is not None)
+        entry = self._read(namespace, key)
+        now = time.time()
+
+        if entry is None or now - entry[1] > hard:
+            failed_at, failed_value = self._failed.get((namespace, key), (0, None))
+            if not force and now - failed_at < RETRY_SECONDS:
+                record_cache(namespace, "failed")
+                return (empty if failed_value is None else failed_value), failed_at, "failed"
+            # ✅ 多個使用者同時 miss 同一個 key 時只抓一次，其他人等結果 (寫入快取後才喚醒)
+            value, shared = get_single_flight().do(
+                namespace, key, lambda: self._load(namespace, key, loader, valid, now)
+            )
+            state = "coalesced" if shared else "miss"
+            record_cache(namespace, state)
+            return (empty if value is None else value), now, state
+
+        value, fetched_at = entry
+        if force or now - fetched_at > soft:
+            self.revalidate(namespace, key, loader, valid, force=force)
+            record_cache(namespace, "stale")
+            return value, fetched_at, "stale"
+        record_cache(namespace, "fresh")
+        return value, fetched_at, "fresh"
+
+    def _load(self, namespace, key, loader, valid, now):
+        try:
+            value = loader()
+        except Exception:
+            value = None
+        if value is not None and valid(value):
+            self._write(namespace, key, value, now)
+            with self._lock:
+                self._failed.pop((namespace, key), None)
+        else:
+            with self._lock:
+                self._failed[(namespace, key)] = (now, value)
+        return value
+
+    def revalidate(self, namespace, key, loader, valid, force=False):
+        with self._lock:
+            if (namespace, key) in self._inflight:
+                return self._inflight[(namespace, key)]
+            if not force and time.time() - self._failed.get((namespace, key), (0, None))[0] < RETRY_SECONDS:
+                return None
+            future = self._pool.submit(self._refresh, namespace, key, loader, valid)
+            self._inflight[(namespace, key)] = future
+        future.add_done_callback(lambda _: self._done(namespace, key))
+        return future
+
+    def _refresh(self, namespace, key, loader, valid):
+        value = self._load(namespace, key, loader, valid, time.time())
+        return value is not None and valid(value)
+
+    def _done(self, namespace, key):
+        with self._lock:
+            self._inflight.pop((namespace, key), None)
+
+    def pending(self, namespace, key):
+        """這個 key 是否還在背景重抓"""
+        with self._lock:
+            return (namespace, repr(key)) in self._inflight
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_swr_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SWRCache()
+        return _cache
@@ -0,0 +1,214 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from chipk.store import DATA_DIR
+
+# ================= 分段計時 (JSON log + Prometheus 文字檔) =================
+
+# 設定後每個 span 以一行 JSON 寫入該檔案 ("-" 表示 stderr)；未設定時仍交給 logging 由 App 決定去處
+TIMING_LOG = os.environ.get("CHIPK_TIMING_LOG", "")
+# Prometheus textfile 格式，可給 node_exporter 的 textfile collector 讀取
+METRICS_FILE = os.environ.get("CHIPK_METRICS_FILE", os.path.join(DATA_DIR, "metrics.prom"))
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float("inf"))
+
+logger = logging.getLogger("chipk.timing")
+
+def _setup_logger():
+    if not TIMING_LOG or logger.handlers:
+        return
+    handler = logging.StreamHandler() if TIMING_LOG == "-" else logging.FileHandler(TIMING_LOG, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_setup_logger()
+
+class Metrics:
+    """程序內累計的各階段耗時 (histogram) 與快取命中次數"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}   # name -> [bucket counts..., sum, count]
+        self.cache = {}    # (name, result) -> count
+        self.flights = {}  # (name, executed / coalesced) -> count
+        self.evictions = {}  # 快取後端 -> 淘汰筆數
+        self.sources = {}  # (來源, ok / failure / rejected) -> count
+        self.gauges = {}   # (metric, 來源) -> (help, value)
+
+    def observe(self, name, seconds):
+        with self._lock:
+            row = self.stages.setdefault(name, [0] * len(BUCKETS) + [0.0, 0])
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    row[i] += 1
+            row[-2] += seconds
+            row[-1] += 1
+
+    def count_cache(self, name, result):
+        with self._lock:
+            self.cache[(name, result)] = self.cache.get((name, result), 0) + 1
+
+    def count_flight(self, name, result):
+        with self._lock:
+            self.flights[(name, result)] = self.flights.get((name, result), 0) + 1
+
+    def count_eviction(self, name, n=1):
+        with self._lock:
+            self.evictions[name] = self.evictions.get(name, 0) + n
+
+    def count_source(self, name, result):
+        with self._lock:
+            self.sources[(name, result)] = self.sources.get((name, result), 0) + 1
+
+    def set_gauge(self, metric, source, value, help_text):
+        with self._lock:
+            self.gauges[(metric, source)] = (help_text, value)
+
+    def render(self):
+        with self._lock:
+            stages = {k: list(v) for k, v in self.stages.items()}
+            cache = dict(self.cache)
+            flights = dict(self.flights)
+            evictions = dict(self.evictions)
+            sources = dict(self.sources)
+            gauges = dict(self.gauges)
+        lines = [
+            "# HELP chipk_stage_seconds Time spent in each fetch/parse/render stage.",
+            "# TYPE chipk_stage_seconds histogram",
+        ]
+        for name, row in sorted(stages.items()):
+            for bound, n in zip(BUCKETS, row):
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'chipk_stage_seconds_bucket{{stage="{name}",le="{le}"}} {n}')
+            lines.append(f'chipk_stage_seconds_sum{{stage="{name}"}} {row[-2]:.6f}')
+            lines.append(f'chipk_stage_seconds_count{{stage="{name}"}} {row[-1]}')
+        lines += [
+            "# HELP chipk_cache_lookups_total Cached function lookups by result.",
+            "# TYPE chipk_cache_lookups_total counter",
+        ]
+        for (name, result), n in sorted(cache.items()):
+            lines.append(f'chipk_cache_lookups_total{{cache="{name}",result="{result}"}} {n}')
+        lines += [
+            "# HELP chipk_fetches_total Upstream fetches by whether they ran or joined an identical in-flight fetch.",
+            "# TYPE chipk_fetches_total counter",
+        ]
+        for (name, result), n in sorted(flights.items()):
+            lines.append(f'chipk_fetches_total{{fetch="{name}",result="{result}"}} {n}')
+        lines += [
+            "# HELP chipk_cache_evictions_total Entries removed from a cache backend (size cap or expiry).",
+            "# TYPE chipk_cache_evictions_total counter",
+        ]
+        for name, n in sorted(evictions.items()):
+            lines.append(f'chipk_cache_evictions_total{{cache="{name}"}} {n}')
+        lines += [
+            "# HELP chipk_source_requests_total Requests to an upstream source by outcome (rejected = not sent).",
+            "# TYPE chipk_source_requests_total counter",
+        ]
+        for (name, result), n in sorted(sources.items()):
+            lines.append(f'chipk_source_requests_total{{source="{name}",result="{result}"}} {n}')
+        described = set()
+        for (metric, source), (help_text, value) in sorted(gauges.items()):
+            if metric not in described:
+                lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge"]
+                described.add(metric)
+            lines.append(f'{metric}{{source="{source}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path=None):
+        path = path or METRICS_FILE
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+metrics = Metrics()
+
+class Trace:
+    """單次重跑 (rerun) 內的 span 與快取命中紀錄，供側邊欄顯示"""
+
+    def __init__(self, name):
+        self.name = name
+        self.spans = []    # [name, depth, ms, attrs]
+        self.cache = {}    # name -> 查詢結果
+        self.started = time.perf_counter()
+
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+_trace = contextvars.ContextVar("chipk_trace", default=None)
+_depth = contextvars.ContextVar("chipk_span_depth", default=0)
+
+def start_trace(name="rerun"):
+    trace = Trace(name)
+    _trace.set(trace)
+    return trace
+
+def current_trace():
+    return _trace.get()
+
+def finish_trace(trace, write_metrics=True):
+    """結束這次重跑：寫一行總結 log，並更新 Prometheus 檔"""
+    _log({"event": "trace", "trace": trace.name, "ms": round(trace.total_ms(), 2), "cache": trace.cache})
+    if _trace.get() is trace:
+        _trace.set(None)
+    if write_metrics:
+        try:
+            metrics.write()
+        except OSError:
+            pass
+
+def _log(record):
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+@contextmanager
+def span(name, **attrs):
+    """計時一個階段；巢狀呼叫會記錄深度。不在 trace 內 (例如背景執行緒) 時只更新 metrics 與 log"""
+    depth = _depth.get()
+    token = _depth.set(depth + 1)
+    trace = _trace.get()
+    # 進入時先佔位，讓面板上父階段排在子階段前面
+    entry = [name, depth, 0.0, attrs]
+    if trace is not None:
+        trace.spans.append(entry)
+    t0 = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as e:
+        attrs["error"] = type(e).__name__
+        raise
+    finally:
+        _depth.reset(token)
+        entry[2] = _observe(name, time.perf_counter() - t0, depth, attrs)
+
+def record_span(name, seconds, **attrs):
+    """記錄一段已量好的耗時 (不方便用 with 包住的程式區塊)"""
+    depth = _depth.get()
+    ms = _observe(name, seconds, depth, attrs)
+    trace = _trace.get()
+    if trace is not None:
+        trace.spans.append([name, depth, ms, attrs])
+
+def _observe(name, seconds, depth, attrs):
+    metrics.observe(name, seconds)
+    ms = seconds * 1000
+    _log({"event": "span", "span": name, "ms": round(ms, 2), "depth": depth, **attrs})
+    return ms
+
+def record_cache(name, result):
+    """記錄一次快取查詢結果 (hit / miss / fresh / stale ...)"""
+    metrics.count_cache(name, result)
+    trace = _trace.get()
+    if trace is not None:
+        trace.cache[name] = result
+
+def record_flight(name, result):
+    """記錄一次上游抓取是自己執行 (executed) 還是併入別人進行中的同一請求 (coalesced)"""
+    metrics.count_flight(name, result)
@@ -0,0 +1,171 @@
+import csv
+import logging
+import os
+import threading
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+from chipk.store import DATA_DIR
+
+# ================= 台股交易日曆 (週末 + 證交所休市日) =================
+
+BUNDLED_HOLIDAYS = os.path.join(os.path.dirname(__file__), "data", "twse_holidays.csv")
+# update_holidays() 下載的最新休市表，與內建表合併
+LOCAL_HOLIDAYS = os.path.join(DATA_DIR, "twse_holidays.csv")
+TWSE_HOLIDAY_API = "https://openapi.twse.com.tw/v1/holidaySchedule/holidaySchedule"
+TAIPEI = ZoneInfo("Asia/Taipei")
+
+logger = logging.getLogger("chipk.calendar")
+
+# 盤後分點進出在收盤後才公布完整，這個時間 (台北) 之前當天的資料視為尚未結算
+SETTLE_TIME = time(16, 0)
+
+def now_taipei():
+    return datetime.now(TAIPEI)
+
+def today_taipei():
+    return now_taipei().date()
+
+def _to_day(d):
+    if isinstance(d, np.datetime64):
+        return d.astype("datetime64[D]")
+    if isinstance(d, (datetime, pd.Timestamp)):
+        d = d.date()
+    return np.datetime64(d, "D")
+
+def _read_holidays(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return {row["date"]: row["name"] for row in csv.DictReader(f)}
+
+class TradingCalendar:
+    """以 numpy busdaycalendar 查交易日，所有查詢皆為本機運算"""
+
+    def __init__(self, holidays):
+        self.holidays = dict(sorted(holidays.items()))
+        days = np.array(list(self.holidays), dtype="datetime64[D]")
+        self._cal = np.busdaycalendar(weekmask="1111100", holidays=days)
+        self.covered_years = sorted({int(d[:4]) for d in self.holidays})
+        self._warned_years = set()
+
+    @classmethod
+    def load(cls):
+        holidays = _read_holidays(BUNDLED_HOLIDAYS)
+        holidays.update(_read_holidays(LOCAL_HOLIDAYS))
+        return cls(holidays)
+
+    def uncovered_years(self, start, end):
+        """start~end 之間休市表沒有資料的年份 (這些年份只排除週末，休市日會被當成交易日)"""
+        first, last = int(str(_to_day(start))[:4]), int(str(_to_day(end))[:4])
+        return [y for y in range(first, last + 1) if y not in self.covered_years]
+
+    def covers(self, start, end):
+        """start~end 的休市日是否都已知；沒涵蓋的年份每年只記一次 warning (請執行 update_holidays)"""
+        missing = self.uncovered_years(start, end)
+        new = [y for y in missing if y not in self._warned_years]
+        if new:
+            self._warned_years.update(new)
+            logger.warning("休市表未涵蓋 %s 年，這些年份的休市日無法排除", ", ".join(map(str, new)))
+        return not missing
+
+    def is_trading_day(self, d):
+        return bool(np.is_busday(_to_day(d), busdaycal=self._cal))
+
+    def nth_trading_day_before(self, d, n):
+        """d 當天或之前最近的交易日往前數 n 個交易日 (n=0 即最近交易日)"""
+        day = np.busday_offset(_to_day(d), -n, roll="backward", busdaycal=self._cal)
+        return day.astype(date)
+
+    def last_settled_day(self, now=None):
+        """最近一個已結算的交易日：今天要過了 SETTLE_TIME 才算，否則取前一個交易日"""
+        now = now or now_taipei()
+        day = now.date() if now.time() >= SETTLE_TIME else now.date() - timedelta(days=1)
+        return self.nth_trading_day_before(day, 0)
+
+    def trading_days_between(self, start, end):
+        """start~end (含) 之間的交易日"""
+        start, end = _to_day(start), _to_day(end)
+        if end < start:
+            return pd.DatetimeIndex([])
+        days = np.arange(start, end + 1, dtype="datetime64[D]")
+        return pd.DatetimeIndex(days[np.is_busday(days, busdaycal=self._cal)])
+
+    def count_trading_days(self, start, end):
+        return int(np.busday_count(_to_day(start), _to_day(end) + 1, busdaycal=self._cal))
+
+    def non_trading_days(self, start, end):
+        """start~end (含) 之間所有不開盤的日子 (週末 + 休市日)"""
+        start, end = _to_day(start), _to_day(end)
+        if end < start:
+            return pd.DatetimeIndex([])
+        days = np.arange(start, end + 1, dtype="datetime64[D]")
+        return pd.DatetimeIndex(days[~np.is_busday(days, busdaycal=self._cal)])
+
+    def holidays_between(self, start, end):
+        """start~end (含) 之間落在平日的休市日"""
+        start, end = str(_to_day(start)), str(_to_day(end))
+        return [d for d in self.holidays if start <= d <= end]
+
+    def rangebreaks(self, start, end, trading_days=None):
+        """Plotly 用的 rangebreaks：週末以 bounds 樣式表示，只列出平日休市日與資料缺漏的交易日 (如停牌)。
+        休市表沒涵蓋的年份，休市日會當成資料缺漏由 trading_days 推得，因此這時應傳入 trading_days"""
+        self.covers(start, end)
+        skip = pd.DatetimeIndex(self.holidays_between(start, end))
+        skip = skip[skip.dayofweek < 5]
+        if trading_days is not None and len(trading_days):
+            trading_days = pd.DatetimeIndex(trading_days).normalize()
+            gaps = self.trading_days_between(trading_days.min(), trading_days.max()).difference(trading_days)
+            skip = skip.union(gaps)
+        breaks = [dict(bounds=["sat", "mon"])]
+        if len(skip):
+            breaks.append(dict(values=skip.strftime("%Y-%m-%d").tolist()))
+        return breaks
+
+_calendar = None
+_lock = threading.Lock()
+
+def get_trading_calendar():
+    global _calendar
+    with _lock:
+        if _calendar is None:
+            _calendar = TradingCalendar.load()
+        return _calendar
+
+def _parse_twse_date(s):
+    s = str(s).strip()
+    # OpenAPI 日期為民國年 YYYMMDD
+    return f"{int(s[:-4]) + 1911:04d}-{s[-4:-2]}-{s[-2:]}"
+
+def update_holidays(timeout=10):
+    """從證交所 OpenAPI 下載今年休市表存到本機，回傳新增的日期數"""
+    from chipk.fetch import get_session
+
+    resp = get_session().get(TWSE_HOLIDAY_API, timeout=timeout)
+    resp.raise_for_status()
+    fetched = {}
+    for item in resp.json():
+        name = str(item.get("Name", "")).strip()
+        # 「開始交易日」「最後交易日」等是有開盤的日子
+        if "交易日" in name and "無交易" not in name:
+            continue
+        d = _parse_twse_date(item["Date"])
+        if np.is_busday(np.datetime64(d, "D")):
+            fetched[d] = name
+
+    holidays = _read_holidays(LOCAL_HOLIDAYS)
+    before = len(holidays)
+    holidays.update(fetched)
+    os.makedirs(os.path.dirname(LOCAL_HOLIDAYS), exist_ok=True)
+    with open(LOCAL_HOLIDAYS, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["date", "name"])
+        writer.writerows(sorted(holidays.items()))
+
+    global _calendar
+    with _lock:
+        _calendar = None
+    return len(holidays) - before
@@ -0,0 +1,266 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from chipk.fetch import fetch_ranking, ranking_url
+from chipk.parsing import normalize_name
+from chipk.store import DB_PATH, connect
+from chipk.trading_calendar import SETTLE_TIME, get_trading_calendar, now_taipei
+
+# ================= 由每日排行聚合任意區間的主力買賣超 =================
+#
+# 每個交易日抓一次「單日」排行頁存下所有列出的分點，任何區間的排行、合計與
+# 平均成本都由前綴和算出，切換統計天數不必再連網。
+# 單日頁只列出當天進榜的分點，未進榜的日子以 0 計，因此結果是下限估計；
+# 平均成本以收盤價估算、沒有佔比，畫面上須標示為估計值，只在使用者選擇或抓取失敗時使用。
+
+# 結算前 (SETTLE_TIME 之前) 抓的單日排行視為未定，超過這個分鐘數後重抓
+RECAPTURE_MINUTES = 30
+
+class DailyRankingStore:
+    def __init__(self, path=None):
+        self.path = path or DB_PATH
+        with connect(self.path) as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS ranking_daily (
+                    stock_id TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    broker TEXT NOT NULL,
+                    bhid TEXT,
+                    b TEXT,
+                    buy REAL NOT NULL,
+                    sell REAL NOT NULL,
+                    PRIMARY KEY (stock_id, date, broker)
+                );
+                CREATE TABLE IF NOT EXISTS ranking_daily_sync (
+                    stock_id TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    fetched_at TEXT NOT NULL,
+                    PRIMARY KEY (stock_id, date)
+                );
+            """)
+
+    def captured_days(self, stock_id):
+        with connect(self.path) as conn:
+            rows = conn.execute("SELECT date FROM ranking_daily_sync WHERE stock_id=? ORDER BY date", (stock_id,)).fetchall()
+        return [r[0] for r in rows]
+
+    def days_to_capture(self, stock_id, days, recapture_minutes=RECAPTURE_MINUTES):
+        """days 之中需要 (重新) 抓取的日子：沒抓過，或是在該日結算 (SETTLE_TIME) 前抓的且已超過 recapture_minutes"""
+        with connect(self.path) as conn:
+            fetched = dict(conn.execute("SELECT date, fetched_at FROM ranking_daily_sync WHERE stock_id=?", (stock_id,)).fetchall())
+        cutoff = (now_taipei() - timedelta(minutes=recapture_minutes)).strftime("%Y-%m-%d %H:%M:%S")
+        settle = SETTLE_TIME.strftime("%H:%M:%S")
+        # 結算後抓的即為定案，不再重抓
+        return [d for d in days if d not in fetched or (fetched[d] < f"{d} {settle}" and fetched[d] < cutoff)]
+
+    def version(self, stock_id):
+        with connect(self.path) as conn:
+            row = conn.execute("SELECT COUNT(*), MAX(fetched_at) FROM ranking_daily_sync WHERE stock_id=?", (stock_id,)).fetchone()
+        return tuple(row)
+
+    def save_day(self, stock_id, day, result):
+        df_buy, df_sell, _, _, broker_info, _ = result
+        rows = {}
+        for df in (df_buy, df_sell):
+            for rec in df.to_dict("records"):
+                params = broker_info.get(normalize_name(rec["broker"]), {})
+                rows[rec["broker"]] = (stock_id, day, rec["broker"], params.get("BHID"), params.get("b"),
+                                       float(rec["buy"]), float(rec["sell"]))
+        # 以台北時間記錄，才能和該日的結算時間比較
+        now = now_taipei().strftime("%Y-%m-%d %H:%M:%S")
+        with _lock, connect(self.path) as conn:
+            conn.execute("DELETE FROM ranking_daily WHERE stock_id=? AND date=?", (stock_id, day))
+            conn.executemany("INSERT OR REPLACE INTO ranking_daily VALUES (?, ?, ?, ?, ?, ?, ?)", list(rows.values()))
+            conn.execute("INSERT OR REPLACE INTO ranking_daily_sync VALUES (?, ?, ?)", (stock_id, day, now))
+
+    def load(self, stock_id):
+        with connect(self.path) as conn:
+            return pd.read_sql_query(
+                "SELECT date, broker, bhid, b, buy, sell FROM ranking_daily WHERE stock_id=? ORDER BY date",
+                conn, params=(stock_id,),
+            )
+
+def _fmt_int(v):
+    return f"{int(round(v)):,}"
+
+class WindowEngine:
+    """分點 × 交易日矩陣的前綴和；ranking() 為 O(分點數) 的本機計算"""
+
+    def __init__(self, stock_id, rows, days, prices=None):
+        self.stock_id = stock_id
+        self.days = np.array(sorted(days), dtype="datetime64[D]")
+        rows = rows[rows["date"].isin(set(days))]
+
+        brokers = rows.drop_duplicates("broker", keep="last").set_index("broker")
+        self.brokers = brokers.index.to_numpy()
+        self.broker_info = {
+            normalize_name(name): {"BHID": r.bhid, "b": r.b}
+            for name, r in brokers.iterrows() if pd.notna(r.bhid) and pd.notna(r.b)
+        }
+
+        day_strs = [str(d) for d in self.days]
+        buy = rows.pivot_table(index="broker", columns="date", values="buy", aggfunc="sum")
+        sell = rows.pivot_table(index="broker", columns="date", values="sell", aggfunc="sum")
+        buy = buy.reindex(index=self.brokers, columns=day_strs).fillna(0).to_numpy()
+        sell = sell.reindex(index=self.brokers, columns=day_strs).fillna(0).to_numpy()
+
+        # 收盤價當作當日成交均價，用來估平均成本；缺價的日子不計入成本
+        close = np.zeros(len(day_strs))
+        if prices is not None and not prices.empty:
+            close = prices.set_index("DateStr")["Close"].reindex(day_strs).fillna(0).to_numpy()
+        net = buy - sell
+        priced = (close > 0).astype(float)
+
+        zeros = np.zeros((len(self.brokers), 1))
+        self.cum_buy = np.hstack([zeros, np.cumsum(buy, axis=1)])
+        self.cum_sell = np.hstack([zeros, np.cumsum(sell, axis=1)])
+        self.cum_amount = np.hstack([zeros, np.cumsum(net * close, axis=1)])
+        self.cum_priced_net = np.hstack([zeros, np.cumsum(net * priced, axis=1)])
+
+    def covers(self, start_date, end_date):
+        expected = get_trading_calendar().trading_days_between(start_date, end_date)
+        if len(expected) == 0:
+            return False
+        return bool(np.isin(expected.values.astype("datetime64[D]"), self.days).all())
+
+    def _window(self, start_date, end_date):
+        i = np.searchsorted(self.days, np.datetime64(start_date, "D"), side="left")
+        j = np.searchsorted(self.days, np.datetime64(end_date, "D"), side="right")
+        return i, j
+
+    def ranking(self, start_date, end_date, top=15):
+        """回傳與 get_real_data_matrix 相同的 (df_buy, df_sell, sum_buy, sum_sell, broker_info, url)"""
+        i, j = self._window(start_date, end_date)
+        buy = self.cum_buy[:, j] - self.cum_buy[:, i]
+        sell = self.cum_sell[:, j] - self.cum_sell[:, i]
+        amount = self.cum_amount[:, j] - self.cum_amount[:, i]
+        priced_net = self.cum_priced_net[:, j] - self.cum_priced_net[:, i]
+        net = buy - sell
+
+        def side(idx):
+            df = pd.DataFrame({
+                "broker": self.brokers[idx],
+                "buy": buy[idx].round().astype(int),
+                "sell": sell[idx].round().astype(int),
+                "net": net[idx].round().astype(int),
+                # 單日頁只有進榜分點，算不出真正的成交佔比
+                "pct": "",
+            })
+            total = net[idx].sum()
+            weight = priced_net[idx].sum()
+            avg = amount[idx].sum() / weight if weight else 0
+            return df.reset_index(drop=True), {"total": _fmt_int(abs(total)), "avg": f"{avg:.2f}"}
+
+        buy_idx = np.argsort(-net, kind="stable")
+        buy_idx = buy_idx[net[buy_idx] > 0][:top]
+        sell_idx = np.argsort(net, kind="stable")
+        sell_idx = sell_idx[net[sell_idx] < 0][:top]
+
+        df_buy, sum_buy = side(buy_idx)
+        df_sell, sum_sell = side(sell_idx)
+        return df_buy, df_sell, sum_buy, sum_sell, self.broker_info, ranking_url(self.stock_id, start_date, end_date)
+
+def _days_due(stock_id, start_date, end_date, store):
+    days = [d.strftime("%Y-%m-%d") for d in get_trading_calendar().trading_days_between(start_date, end_date)]
+    return store.days_to_capture(stock_id, days)
+
+def _save_days(stock_id, results, store):
+    ok = failed = 0
+    for day, result in results:
+        if result is None or isinstance(result, BaseException):
+            failed += 1
+            continue
+        store.save_day(stock_id, day, result)
+        ok += 1
+    return ok, failed
+
+def collect_daily(stock_id, start_date, end_date, max_workers=4, store=None, fetch=fetch_ranking):
+    """補抓 start~end 之間尚未存下 (或還沒結算) 的交易日單日排行，回傳 (成功天數, 失敗天數)"""
+    store = store or get_daily_ranking_store()
+    missing = _days_due(stock_id, start_date, end_date, store)
+    if not missing:
+        return 0, 0
+
+    def fetch_day(day):
+        try:
+            return day, fetch(stock_id, day, day, limit=None)
+        except Exception:
+            return day, None
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(missing))) as pool:
+        return _save_days(stock_id, pool.map(fetch_day, missing), store)
+
+def collect_daily_aio(stock_id, start_date, end_date, store=None, **fetcher_kwargs):
+    """同 collect_daily，但以 chipk.aio 非同步抓取 (每主機 token bucket 限速)，供命令列批次回補"""
+    from chipk.aio import run_rankings
+
+    store = store or get_daily_ranking_store()
+    missing = _days_due(stock_id, start_date, end_date, store)
+    if not missing:
+        return 0, 0
+    results = run_rankings([(stock_id, day, day) for day in missing], limit=None, **fetcher_kwargs)
+    return _save_days(stock_id, zip(missing, results), store)
+
+_engines = {}
+
+def load_window_engine(stock_id, prices=None, store=None):
+    store = store or get_daily_ranking_store()
+    version = store.version(stock_id)
+    if not version[0]:
+        return None
+    if prices is not None and not prices.empty:
+        version += (prices["DateStr"].iloc[-1],)
+    cached = _engines.get(stock_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    engine = WindowEngine(stock_id, store.load(stock_id), store.captured_days(stock_id), prices)
+    if len(_engines) >= 64:
+        _engines.clear()
+    _engines[stock_id] = (version, engine)
+    return engine
+
+def window_ranking(stock_id, start_date, end_date, prices=None):
+    """每日資料涵蓋整個區間時回傳本機計算的排行，否則 None"""
+    engine = load_window_engine(stock_id, prices)
+    if engine is None or not engine.covers(start_date, end_date):
+        return None
+    return engine.ranking(start_date, end_date)
+
+_collector = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chipk-collect")
+_collecting = {}
+
+def collect_recent_async(stock_id, end_date, max_gap=5):
+    """已回補過的股票，背景補上最近幾個交易日 (含盤中抓的未結算日)，讓每日資料持續滾動"""
+    store = get_daily_ranking_store()
+    captured = store.captured_days(stock_id)
+    if not captured:
+        return None
+    running = _collecting.get(stock_id)
+    if running is not None and not running.done():
+        return running
+    calendar = get_trading_calendar()
+    if len(calendar.trading_days_between(captured[-1], end_date)) - 1 > max_gap:
+        return None
+    # 往回看 max_gap 天：之前盤中抓的日子也要在結算後重抓
+    window_start = calendar.nth_trading_day_before(captured[-1], max_gap)
+    days = [d.strftime("%Y-%m-%d") for d in calendar.trading_days_between(window_start, end_date)]
+    due = store.days_to_capture(stock_id, days)
+    if not due:
+        return None
+    future = _collector.submit(collect_daily, stock_id, due[0], end_date, 2, store)
+    _collecting[stock_id] = future
+    return future
+
+_lock = threading.Lock()
+_stores = {}
+
+def get_daily_ranking_store(path=None):
+    path = path or DB_PATH
+    with _lock:
+        if path not in _stores:
+            _stores[path] = DailyRankingStore(path)
+        return _stores[path]
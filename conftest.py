@@ -0,0 +1 @@
+# 讓 pytest 不論從哪裡執行都能 import chipk
@@ -1,25 +1,30 @@
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import yfinance as yf
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
-from io import StringIO
-import time
 import re
 from datetime import datetime, timedelta
 import pytz
-from urllib.parse import urlparse, parse_qs
-import shutil
-import twstock
-import copy
-import numpy as np
+from chipk.branch_index import get_branch_index
+from chipk.browser_fetch import fetch_broker_daily_browser, fetch_ranking_browser
+from chipk.chart import (
+    CHART_CONFIG,
+    COLOR_DOWN,
+    COLOR_UP,
+    build_chart,
+    merge_broker_flow,
+    prepare_plot_df,
+    trading_days_of,
+)
+from chipk.fetch import broker_daily_url, fetch_ranking, ranking_url
+from chipk.governor import get_governor
+from chipk.parsing import broker_key_of, find_broker_params
+from chipk.prefetch import PREFETCH_TOP, get_prefetcher, sync_broker_daily
+from chipk.prices import get_price_history, get_stock_name
+from chipk.scan import ranking_rows
+from chipk.store import get_broker_store
+from chipk.swr import get_swr_cache
+from chipk.timing import finish_trace, span, start_trace
+from chipk.trading_calendar import get_trading_calendar
+from chipk.windows import collect_recent_async, window_ranking
 
 # ================= 1. 系統設定 =================
 
@@ -101,21 +106,17 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
-COLOR_UP = '#ef5350'
-COLOR_DOWN = '#26a69a'
-
 # ================= 2. 輔助函式 =================
 
-def normalize_name(name):
-    return str(name).strip().replace(" ", "").replace("　", "")
+MOBILE_UA = re.compile(r"Mobi|Android|iPhone|iPad|iPod", re.IGNORECASE)
 
-def get_stock_name(stock_id):
+def is_mobile_client():
+    """依瀏覽器 User-Agent 判斷是否為手機 (讀不到標頭時當作電腦)"""
     try:
-        if stock_id in twstock.codes:
-            return twstock.codes[stock_id].name
-        return ""
-    except:
-        return ""
+        ua = st.context.headers.get("User-Agent", "")
+    except Exception:
+        ua = ""
+    return bool(MOBILE_UA.search(ua or ""))
 
 def render_broker_table(df, sum_data, color_hex, title):
     st.markdown(f"#### {title}")
@@ -155,282 +156,85 @@ def render_broker_table(df, sum_data, color_hex, title):
 
 # ================= 3. 爬蟲核心 =================
 
-@st.cache_resource
-def get_driver_path():
-    return ChromeDriverManager().install()
-
-def get_driver():
-    options = Options()
-    options.add_argument('--headless=new')
-    options.add_argument('--no-sandbox')
-    options.add_argument('--disable-dev-shm-usage')
-    options.add_argument('--disable-gpu')
-    options.add_argument('--window-size=1920,1080')
-    options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
-    
-    if shutil.which("chromium"):
-        options.binary_location = shutil.which("chromium")
-    elif shutil.which("chromium-browser"):
-        options.binary_location = shutil.which("chromium-browser")
-        
-    if shutil.which("chromedriver"):
-        service = Service(shutil.which("chromedriver"))
-    else:
-        service = Service(get_driver_path())
-
-    driver = webdriver.Chrome(service=service, options=options)
-    return driver
-
-def calculate_date_range(stock_id, days):
-    try:
-        adj_days = days
-        if days >= 120:
-            adj_days = days - 1
-            
-        ticker = f"{stock_id}.TW"
-        df = yf.Ticker(ticker).history(period=f"{max(adj_days + 60, 200)}d")
-        
-        if df.empty:
-            ticker = f"{stock_id}.TWO"
-            df = yf.Ticker(ticker).history(period=f"{max(adj_days + 60, 200)}d")
-            
-        if df.empty:
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=adj_days * 1.5)
-            return start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
-            
-        df_target = df.tail(adj_days)
-        start_date = df_target.index[0].strftime('%Y-%m-%d')
-        end_date = df_target.index[-1].strftime('%Y-%m-%d')
-        return start_date, end_date
-    except:
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=days)
-        return start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
-
-@st.cache_data(persist="disk", ttl=604800)
-def get_real_data_matrix(stock_id, start_date, end_date, refresh_nonce=0):
-    driver = get_driver()
-    base_url = "https://fubon-ebrokerdj.fbs.com.tw/z/zc/zco/zco.djhtm"
-    url = f"{base_url}?a={stock_id}&e={start_date}&f={end_date}"
-
-    try:
-        driver.get(url)
-        try:
-            WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.XPATH, "//*[contains(text(), '買超券商')]"))
-            )
-        except:
-            return None, None, None, None, None, url
-
-        html = driver.page_source
-        tables = pd.read_html(StringIO(html), match="買超券商")
-        if not tables:
-            return None, None, None, None, None, url
-        df = tables[0]
-        
-        header_row = -1
-        for i, row in df.iterrows():
-            row_str = row.astype(str).values
-            if "買超券商" in row_str and "賣超券商" in row_str:
-                header_row = i
-                break
-        if header_row == -1:
-            return None, None, None, None, None, url
-
-        broker_info = {}
-        try:
-            links = driver.find_elements(By.XPATH, "//table//a[contains(@href, 'zco0/zco0.djhtm')]")
-            for link in links:
-                name = normalize_name(link.text)
-                href = link.get_attribute('href')
-                if name and href:
-                    parsed = urlparse(href)
-                    params = parse_qs(parsed.query)
-                    if 'b' in params and 'BHID' in params:
-                        broker_info[name] = {
-                            'b': params['b'][0],
-                            'BHID': params['BHID'][0]
-                        }
-        except:
-            pass
-
-        sum_buy = {"total": "0", "avg": "0"}
-        sum_sell = {"total": "0", "avg": "0"}
-        
-        try:
-            total_buy_elem = driver.find_element(By.XPATH, "/html/body/div[1]/table/tbody/tr[2]/td[2]/table/tbody/tr/td/form/table/tbody/tr/td/table/tbody/tr[22]/td[2]")
-            sum_buy['total'] = total_buy_elem.text.strip()
-            
-            avg_buy_elem = driver.find_element(By.XPATH, "/html/body/div[1]/table/tbody/tr[2]/td[2]/table/tbody/tr/td/form/table/tbody/tr/td/table/tbody/tr[23]/td[2]")
-            sum_buy['avg'] = avg_buy_elem.text.strip()
-
-            total_sell_elem = driver.find_element(By.XPATH, "/html/body/div[1]/table/tbody/tr[2]/td[2]/table/tbody/tr/td/form/table/tbody/tr/td/table/tbody/tr[22]/td[4]")
-            sum_sell['total'] = total_sell_elem.text.strip()
-            
-            avg_sell_elem = driver.find_element(By.XPATH, "/html/body/div[1]/table/tbody/tr[2]/td[2]/table/tbody/tr/td/form/table/tbody/tr/td/table/tbody/tr[23]/td[4]")
-            sum_sell['avg'] = avg_sell_elem.text.strip()
-        except Exception:
-            pass
-
-        df_clean = df.iloc[header_row+1:].copy()
-        df_buy = df_clean.iloc[:, [0, 1, 2, 3, 4]].copy()
-        df_buy.columns = ['broker', 'buy', 'sell', 'net', 'pct']
-        df_sell = df_clean.iloc[:, [5, 6, 7, 8, 9]].copy()
-        df_sell.columns = ['broker', 'buy', 'sell', 'net', 'pct']
-
-        def clean_sub_df(d):
-            d = d.dropna(subset=['broker'])
-            mask = d['broker'].astype(str).str.contains("合計|平均|買超券商|賣超券商", na=False)
-            d = d[~mask]
-            for col in ['buy', 'sell', 'net']:
-                d[col] = d[col].astype(str).str.replace(',', '', regex=False).str.replace('+', '', regex=False).str.replace('nan', '', regex=False)
-                d[col] = pd.to_numeric(d[col], errors='coerce').fillna(0).astype(int)
-            return d
-
-        df_buy = clean_sub_df(df_buy)
-        df_sell = clean_sub_df(df_sell)
-        df_buy = df_buy[df_buy['net'] > 0].sort_values('net', ascending=False).head(15).reset_index(drop=True)
-        df_sell['abs_net'] = df_sell['net'].abs()
-        df_sell = df_sell.sort_values('abs_net', ascending=False).head(15).drop(columns=['abs_net']).reset_index(drop=True)
-
-        return df_buy, df_sell, sum_buy, sum_sell, broker_info, url
-    except:
-        return None, None, None, None, None, url
-    finally:
-        driver.quit()
-
-# ✅ 使用 tuple key 增加 cache 穩定性
-@st.cache_data(persist="disk", ttl=604800)
-def get_specific_broker_daily(stock_id, broker_key, start_date, end_date, refresh_nonce=0):
-    BHID, b, c_val = broker_key
-    driver = get_driver()
-    base_url = "https://fubon-ebrokerdj.fbs.com.tw/z/zc/zco/zco0/zco0.djhtm"
-    target_url = (f"{base_url}?A={stock_id}"
-                  f"&BHID={BHID}"
-                  f"&b={b}"
-                  f"&C={c_val}"
-                  f"&D={start_date}"
-                  f"&E={end_date}"
-                  f"&ver=V3")
-
-    table_xpath = "/html/body/div[1]/table/tbody/tr[2]/td[2]/table/tbody/tr/td/form/table/tbody/tr/td/table/tbody/tr[6]/td/table"
-
-    try:
-        driver.get(target_url)
-        all_dfs = []
-        page_count = 0
-        max_pages = 60
-        
-        while page_count < max_pages:
-            try:
-                WebDriverWait(driver, 3).until(
-                    EC.presence_of_element_located((By.XPATH, table_xpath))
-                )
-            except:
-                break
-
-            try:
-                target_table = driver.find_element(By.XPATH, table_xpath)
-                table_html = target_table.get_attribute('outerHTML')
-                tables = pd.read_html(StringIO(table_html))
-                current_df = tables[0] if tables else None
-            except:
-                html = driver.page_source
-                tables = pd.read_html(StringIO(html), match="日期")
-                current_df = tables[0] if tables else None
-
-            if current_df is not None:
-                all_dfs.append(current_df)
-            
-            try:
-                next_links = driver.find_elements(By.XPATH, "//a[contains(text(), '下一頁')]")
-                if next_links and next_links[0].is_enabled():
-                    next_links[0].click()
-                    time.sleep(0.5) 
-                    page_count += 1
-                else:
-                    break 
-            except:
-                break
-
-        if not all_dfs:
-            return None, target_url
-
-        df = pd.concat(all_dfs, ignore_index=True)
-        df.columns = [str(c).strip().replace(" ", "") for c in df.columns]
-        
-        if '買賣超' not in df.columns and len(df.columns) >= 4:
-            df = df.iloc[:, :4]
-            df.columns = ['日期', '買進', '賣出', '買賣超']
-            
-        required = ['日期', '買進', '賣出', '買賣超']
-        if not all(c in df.columns for c in required):
-            return None, target_url
-
-        df = df[df['日期'] != '日期']
-        
-        for col in ['買進', '賣出', '買賣超']:
-             df[col] = (df[col].astype(str)
-                        .str.replace(',', '', regex=False)
-                        .str.replace('+', '', regex=False)
-                        .str.replace('nan', '', regex=False))
-             df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-
-        df['買賣超_Calc'] = df['買進'] - df['賣出']
-
-        def parse_date(d_str):
-            s = str(d_str).strip()
-            parts = re.split(r'[/-]', s)
-            if len(parts) == 3:
-                y, m, d = int(parts[0]), int(parts[1]), int(parts[2])
-                if y < 1911: y += 1911
-                return f"{y:04d}-{m:02d}-{d:02d}"
-            elif len(parts) == 2:
-                m, d = int(parts[0]), int(parts[1])
-                now = datetime.now()
-                y = now.year
-                if m > now.month + 2: y -= 1
-                return f"{y:04d}-{m:02d}-{d:02d}"
-            return None
-
-        df['DateStr'] = df['日期'].apply(parse_date)
-        df = df.dropna(subset=['DateStr'])
-        df = df.sort_values('DateStr', ascending=True)
-        
-        return df, target_url
-        
-    except Exception:
+def calculate_date_range(days, df_price=None):
+    # ✅ 用本機交易日曆往回數 N 個交易日，不需要網路
+    adj_days = days
+    if days >= 120:
+        adj_days = days - 1
+
+    calendar = get_trading_calendar()
+    # 以最近已結算的交易日為區間終點：盤中或收盤結算前，當天還沒有完整的分點資料
+    end_date = calendar.last_settled_day()
+    start_date = calendar.nth_trading_day_before(end_date, adj_days - 1)
+    start_date, end_date = start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
+    if not calendar.covers(start_date, end_date) and df_price is not None and len(df_price) >= adj_days:
+        # 休市表沒涵蓋的年份改以股價日K的日期當交易日
+        df_target = df_price[df_price['DateStr'] <= end_date].tail(adj_days)
+        return df_target['DateStr'].iloc[0], df_target['DateStr'].iloc[-1]
+    return start_date, end_date
+
+# ✅ 以下三個抓取函式交給 chipk.swr 快取 (先回上次結果、背景重抓)，會在背景執行緒執行，不可呼叫 st.*
+def get_real_data_matrix(stock_id, start_date, end_date):
+    # ✅ 先走純 HTTP (不開瀏覽器)，頁面沒有排行表才退回 Selenium
+    with span("ranking.http"):
+        result = fetch_ranking(stock_id, start_date, end_date)
+    if result is not None:
+        return result
+    with span("ranking.selenium"):
+        return fetch_ranking_browser(stock_id, start_date, end_date)
+
+def get_specific_broker_daily(stock_id, broker_key, start_date, end_date):
+    target_url = broker_daily_url(stock_id, broker_key, start_date, end_date)
+
+    # ✅ 背景預抓中的分點直接等它完成
+    with span("broker_daily.prefetch_wait"):
+        get_prefetcher().wait_for(stock_id, broker_key, timeout=120)
+
+    # ✅ 本機資料庫已有的日期不再重抓，只補最後一天之後的部分
+    # 先用 HTTP 並行抓所有分頁，翻頁需要 JS 時才退回 Selenium 逐頁點擊
+    with span("broker_daily.sync"):
+        sync_broker_daily(stock_id, broker_key, start_date, end_date, fallback=fetch_broker_daily_browser)
+
+    with span("broker_daily.load"):
+        df = get_broker_store().load(stock_id, broker_key, start_date, end_date)
+    if df.empty:
         return None, target_url
-    finally:
-        driver.quit()
+    return df, target_url
 
-@st.cache_data(ttl=21600)
 def get_stock_price(stock_id):
-    ticker = f"{stock_id}.TW" if not stock_id.endswith('.TW') else stock_id
+    # ✅ 本機保存歷史K棒，只下載最後一根之後的資料並從尾端更新均線
     try:
-        stock = yf.Ticker(ticker)
-        df = stock.history(period="2y")
-        if df.empty:
-            ticker = f"{stock_id}.TWO"
-            stock = yf.Ticker(ticker)
-            df = stock.history(period="2y")
-        if df.empty: return None
-        df.index = df.index.tz_localize(None)
-        df['DateStr'] = df.index.strftime('%Y-%m-%d')
-        
-        df['MA5'] = df['Close'].rolling(window=5).mean()
-        df['MA10'] = df['Close'].rolling(window=10).mean()
-        df['MA20'] = df['Close'].rolling(window=20).mean()
-        df['MA60'] = df['Close'].rolling(window=60).mean()
-        
-        return df
+        with span("price.history"):
+            return get_price_history(stock_id)
     except Exception:
         return None
 
+def format_fetched_at(ts):
+    return datetime.fromtimestamp(ts, pytz.timezone('Asia/Taipei')).strftime('%m/%d %H:%M')
+
+def data_age_note(ts, state):
+    note = f"資料時間 {format_fetched_at(ts)}"
+    if state == "stale":
+        note += "・背景更新中"
+    return note
+
+@st.fragment(run_every=2)
+def revalidation_watcher(pending):
+    # ✅ 背景重抓都結束後整頁重跑一次，換上新資料 (之後不再輪詢)
+    swr = get_swr_cache()
+    if any(swr.pending(namespace, key) for namespace, key in pending):
+        st.caption("🔄 背景更新資料中…")
+    else:
+        st.rerun()
+
 # ================= 4. 介面邏輯 =================
 
+# ✅ 每次重跑一個 trace：各階段耗時寫 JSON log / Prometheus 檔，也可在側邊欄查看
+rerun_trace = start_trace()
+
 st.title(f"📊 籌碼K線")
+# 資料來源斷路時的提示，等抓取都跑完才知道狀態，先佔位置
+source_banner = st.empty()
 
 tz = pytz.timezone('Asia/Taipei')
 current_time = datetime.now(tz).strftime('%Y-%m-%d %H:%M:%S')
@@ -458,29 +262,74 @@ with st.sidebar:
     if st.button("查詢", type="primary"):
         st.rerun()
     
-    # 強制更新按鈕
-    if "refresh_nonce" not in st.session_state:
-        st.session_state.refresh_nonce = 0
+    # 強制更新按鈕：先顯示現有資料，背景立即重抓
     if st.button("🔄 強制更新籌碼資料（忽略快取）"):
-        st.session_state.refresh_nonce = int(time.time())
+        st.session_state.force_refresh = True
         st.rerun()
 
+    # 本機每日排行彙總只是估計值 (下限)，預設仍以富邦區間排行為準
+    use_local_ranking = st.checkbox("⚡ 以本機每日排行快速估算", value=False,
+                                    help="僅計入每日進榜分點 (數值為下限)，平均成本以收盤價估算，沒有佔比")
+    show_timing = st.checkbox("⏱️ 顯示效能明細", value=False)
+
+swr = get_swr_cache()
+force_refresh = st.session_state.pop("force_refresh", False)
+pending_refresh = []
+
+def swr_get(namespace, key, loader, force=False, valid=None, empty=None):
+    value, fetched_at, state = swr.get(namespace, key, loader, force=force, valid=valid, empty=empty)
+    if state == "stale" and swr.pending(namespace, key):
+        pending_refresh.append((namespace, key))
+    return value, fetched_at, state
+
 if stock_input:
     stock_name = get_stock_name(stock_input)
     stock_display = f"{stock_input} {stock_name}" if stock_name else stock_input
 
-    rank_start_date, rank_end_date = calculate_date_range(stock_input, selected_days)
+    df_price, _, _ = swr_get("stock_price", (stock_input,), lambda: get_stock_price(stock_input))
+    rank_start_date, rank_end_date = calculate_date_range(selected_days, df_price)
+    uncovered = get_trading_calendar().uncovered_years(rank_start_date, rank_end_date)
+    if uncovered:
+        st.caption(f"⚠️ 內建休市表未涵蓋 {', '.join(map(str, uncovered))} 年，交易日改由股價日K推算 (可執行 `python -m chipk calendar-update` 更新)")
     
-    with st.spinner(f"正在分析 {stock_display} 近 {selected_days} 交易日 ({rank_start_date} ~ {rank_end_date})..."):
-        df_buy, df_sell, sum_buy, sum_sell, broker_info, target_url = get_real_data_matrix(
-            stock_input, rank_start_date, rank_end_date, st.session_state.refresh_nonce
-        )
-        
-    df_price = get_stock_price(stock_input)
+    # ✅ 已回補的每日排行涵蓋整個區間時可在本機彙總；只在使用者選擇或抓取失敗時使用
+    collect_recent_async(stock_input, rank_end_date)
+    local_ranking = None
+    if use_local_ranking:
+        local_ranking = window_ranking(stock_input, rank_start_date, rank_end_date, df_price)
+
+    if local_ranking is not None:
+        df_buy, df_sell, sum_buy, sum_sell, broker_info, target_url = local_ranking
+    else:
+        with st.spinner(f"正在分析 {stock_display} 近 {selected_days} 交易日 ({rank_start_date} ~ {rank_end_date})..."):
+            ranking, rank_fetched_at, rank_state = swr_get(
+                "ranking", (stock_input, rank_start_date, rank_end_date),
+                lambda: get_real_data_matrix(stock_input, rank_start_date, rank_end_date),
+                force=force_refresh, valid=lambda r: r[0] is not None,
+                empty=(None, None, None, None, None, ranking_url(stock_input, rank_start_date, rank_end_date)),
+            )
+            df_buy, df_sell, sum_buy, sum_sell, broker_info, target_url = ranking
+        if df_buy is None:
+            # 抓不到區間排行時退回本機估計值
+            local_ranking = window_ranking(stock_input, rank_start_date, rank_end_date, df_price)
+            if local_ranking is not None:
+                df_buy, df_sell, sum_buy, sum_sell, broker_info, _ = local_ranking
 
     if df_buy is not None and df_sell is not None:
+        # ✅ 查過的排行也寫進分點反向索引 (本機估計值不寫)
+        indexed_key = (stock_input, selected_days, rank_start_date, rank_end_date, target_url, len(df_buy))
+        if local_ranking is None and st.session_state.get('indexed_key') != indexed_key:
+            get_branch_index().add_rows(ranking_rows(
+                stock_input, selected_days, rank_start_date, rank_end_date,
+                (df_buy, df_sell, sum_buy, sum_sell, broker_info or {}, target_url),
+            ))
+            st.session_state['indexed_key'] = indexed_key
+
         st.subheader(f"🏆 {stock_display} 區間累積 ({rank_start_date} ~ {rank_end_date}) - 主力買賣超排行")
-        st.caption(f"排行總表網址：{target_url}")
+        if local_ranking is not None:
+            st.warning("⚠️ 估計值：由本機每日排行彙總，僅計入每日進榜分點 (買賣超為下限)，平均成本以收盤價估算，不含佔比")
+        else:
+            st.caption(f"排行總表網址：{target_url}　{data_age_note(rank_fetched_at, rank_state)}")
         
         with st.container():
             st.markdown('<div class="desktop-marker"></div>', unsafe_allow_html=True)
@@ -500,6 +349,19 @@ if stock_input:
 
         st.markdown("---")
 
+        if df_price is not None and not df_price.empty and broker_info:
+            # ✅ 背景先抓買賣超前幾名分點的 2 年明細，切換券商時直接讀資料庫 (同樣的股票/區間/分點只送一次)
+            top_names = df_buy['broker'].head(PREFETCH_TOP).tolist() + df_sell['broker'].head(PREFETCH_TOP).tolist()
+            prefetch_range = (df_price['DateStr'].iloc[0], df_price['DateStr'].iloc[-1])
+            prefetch_key = (stock_input, prefetch_range, tuple(top_names))
+            if st.session_state.get('prefetch_key') != prefetch_key:
+                prefetcher = get_prefetcher()
+                for name in top_names:
+                    params = find_broker_params(broker_info, name)
+                    if params:
+                        prefetcher.submit(stock_input, broker_key_of(params), *prefetch_range)
+                st.session_state['prefetch_key'] = prefetch_key
+
         if df_price is not None and not df_price.empty:
             st.subheader("🔍 分點進出 vs 股價走勢")
             
@@ -512,75 +374,43 @@ if stock_input:
             target_broker = st.selectbox("選擇要查看每日明細的券商", brokers_list)
             
             merged_df = None
-            target_key = normalize_name(target_broker)
-            
-            broker_params = None
-            if broker_info:
-                if target_key in broker_info:
-                    broker_params = broker_info[target_key]
-                else:
-                    for k, v in broker_info.items():
-                        if target_key in k or k in target_key:
-                            broker_params = v
-                            break
+            broker_params = find_broker_params(broker_info, target_broker)
 
             if broker_params:
                 long_start_date = df_price['DateStr'].iloc[0] 
                 long_end_date = df_price['DateStr'].iloc[-1] 
                 
-                broker_key = (broker_params['BHID'], broker_params['b'], broker_params.get('C', '1'))
-                merged_key = (stock_input, broker_key, st.session_state.refresh_nonce)
+                broker_key = broker_key_of(broker_params)
+                with st.spinner(f"正在爬取 {target_broker} 完整 2 年每日明細..."):
+                    (broker_daily_df, detail_url), broker_fetched_at, broker_state = swr_get(
+                        "broker_daily", (stock_input, broker_key, long_start_date, long_end_date),
+                        lambda: get_specific_broker_daily(stock_input, broker_key, long_start_date, long_end_date),
+                        force=force_refresh, valid=lambda r: r[0] is not None,
+                        empty=(None, broker_daily_url(stock_input, broker_key, long_start_date, long_end_date)),
+                    )
+                # 背景重抓完成 (抓取時間改變) 或股價多一根時才重新合併
+                merged_key = (stock_input, broker_key, broker_fetched_at, long_end_date)
 
                 if st.session_state.get('merged_key') != merged_key:
-                    with st.spinner(f"正在爬取 {target_broker} 完整 2 年每日明細..."):
-                        broker_daily_df, detail_url = get_specific_broker_daily(
-                            stock_input, broker_key, long_start_date, long_end_date, st.session_state.refresh_nonce
-                        )
+                    st.markdown(f"**🔗 正在爬取單一券商網址：** `{detail_url}`")
+                    
+                    if broker_daily_df is not None and not broker_daily_df.empty:
+                        merged_df = merge_broker_flow(df_price, broker_daily_df)
                         
-                        st.markdown(f"**🔗 正在爬取單一券商網址：** `{detail_url}`")
-                        
-                        if broker_daily_df is not None and not broker_daily_df.empty:
-                            broker_daily_df = broker_daily_df.drop_duplicates(subset=["DateStr"], keep="last").sort_values('DateStr')
-                            merged_df = pd.merge(df_price, broker_daily_df, on='DateStr', how='left')
-                            merged_df['買賣超_Final'] = merged_df['買賣超_Calc'].fillna(0)
-                            merged_df['cumulative_net'] = merged_df['買賣超_Final'].cumsum()
-                            
-                            st.success(f"✅ 已載入 {target_broker} 2 年籌碼明細")
-                            st.session_state['merged_df'] = merged_df
-                            st.session_state['merged_key'] = merged_key
-                        else:
-                            st.session_state.pop('merged_df', None)
-                            st.session_state['merged_key'] = merged_key
-                            st.warning("⚠️ 該券商明細抓取失敗，先顯示純股價")
+                        st.success(f"✅ 已載入 {target_broker} 2 年籌碼明細")
+                        st.session_state['merged_df'] = merged_df
+                    else:
+                        st.session_state.pop('merged_df', None)
+                        st.warning("⚠️ 該券商明細抓取失敗，先顯示純股價")
+                    st.session_state['merged_key'] = merged_key
                 else:
                     merged_df = st.session_state.get('merged_df')
 
-            # 安全更新函式
-            def safe_update_yaxes(fig, row, col, **kwargs):
-                try:
-                    fig.update_yaxes(row=row, col=col, **kwargs)
-                except ValueError:
-                    kwargs.pop("showspikelabels", None)
-                    kwargs.pop("spikesnap", None)
-                    kwargs.pop("ticklabelposition", None)
-                    fig.update_yaxes(row=row, col=col, **kwargs)
-
-            def safe_update_xaxes(fig, row, col, **kwargs):
-                try:
-                    fig.update_xaxes(row=row, col=col, **kwargs)
-                except ValueError:
-                    kwargs.pop("showspikelabels", None)
-                    kwargs.pop("spikesnap", None)
-                    kwargs.pop("ticklabelposition", None)
-                    fig.update_xaxes(row=row, col=col, **kwargs)
+                if merged_df is not None:
+                    st.caption(f"{target_broker} 明細{data_age_note(broker_fetched_at, broker_state)}")
 
             # 使用 Streamlit 原生按鈕控制區間
-            plot_df = merged_df if merged_df is not None else df_price
-            plot_df = plot_df.copy()
-            
-            # ✅ 先保證 Date 欄位存在並排序，避免 KeyError
-            plot_df["Date"] = pd.to_datetime(plot_df["DateStr"], errors="coerce")
-            plot_df = plot_df.dropna(subset=["Date"]).sort_values("Date").reset_index(drop=True)
+            plot_df = prepare_plot_df(merged_df if merged_df is not None else df_price)
             
             # --- 區間按鈕邏輯 ---
             last_dt = plot_df['Date'].iloc[-1] 
@@ -612,225 +442,124 @@ if stock_input:
 
             # ---------------------
 
-            fig = make_subplots(
-                rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.03, 
-                row_heights=[0.85, 0.15], specs=[[{"secondary_y": False}], [{"secondary_y": True}]]
-            )
-            
-            if '買賣超_Final' not in plot_df.columns:
-                plot_df['買賣超_Final'] = 0
-
-            # 移除重複的 Date 轉換
-            x_data = plot_df['Date']
-
-            trading_days = pd.to_datetime(plot_df['Date']).dt.normalize().dropna().unique()
-            trading_days = pd.DatetimeIndex(trading_days).sort_values()
-
+            trading_days = trading_days_of(plot_df)
             min_dt = trading_days[0]
             last_dt_calc = trading_days[-1]
 
-            all_days = pd.date_range(min_dt, last_dt_calc, freq="D")
-            missing_days_dt = pd.date_range(min_dt, last_dt_calc, freq="D").difference(trading_days)
-            missing_dates = [d.strftime("%Y-%m-%d") for d in missing_days_dt]
-
-            plot_df["買賣超_Final"] = pd.to_numeric(plot_df.get("買賣超_Final", 0), errors="coerce").fillna(0)
-
-            custom = np.stack([
-                plot_df["DateStr"].astype(str).to_numpy(),
-                plot_df["買賣超_Final"].to_numpy(dtype=float),
-            ], axis=-1)
-
-            # K線圖
-            fig.add_trace(go.Candlestick(
-                x=x_data, open=plot_df['Open'], high=plot_df['High'],
-                low=plot_df['Low'], close=plot_df['Close'], name='股價',
-                increasing_line_color=COLOR_UP, decreasing_line_color=COLOR_DOWN,
-                increasing_fillcolor=COLOR_UP, decreasing_fillcolor=COLOR_DOWN,
-                hoverinfo="skip" 
-            ), row=1, col=1)
-
-            # 隱形 Close 點
-            fig.add_trace(go.Scatter(
-                x=x_data,
-                y=plot_df["Close"],
-                mode="markers",
-                marker=dict(size=18, opacity=0), 
-                customdata=custom,
-                hovertemplate=(
-                    "<b>日期：%{customdata[0]}</b><br>"
-                    "<b>收盤：%{y:.1f}</b><br>"
-                    "<b>買賣超：%{customdata[1]:,.0f} 張</b>"
-                    "<extra></extra>"
-                ),
-                showlegend=False,
-            ), row=1, col=1)
-
-            ma_colors = {'MA5': 'orange', 'MA10': 'cyan', 'MA20': 'magenta', 'MA60': 'green'}
-            for ma in selected_mas:
-                if ma in plot_df.columns:
-                    plot_df[ma] = pd.to_numeric(plot_df[ma], errors='coerce')
-                    fig.add_trace(go.Scatter(
-                        x=x_data, y=plot_df[ma], name=ma,
-                        mode='lines',
-                        connectgaps=True,
-                        line=dict(color=ma_colors.get(ma, 'white'), width=1.5),
-                        hoverinfo='skip' 
-                    ), row=1, col=1)
-
-            if merged_df is not None:
-                extended_buy_sell = list(merged_df['買賣超_Final'])
-                
-                merged_df['cumulative_net'] = pd.to_numeric(merged_df['cumulative_net'], errors='coerce')
-                
-                bar_colors = [
-                    COLOR_UP if (v is not None and v > 0) else 
-                    COLOR_DOWN if (v is not None and v < 0) else 'gray' 
-                    for v in extended_buy_sell
-                ]
-                
-                fig.add_trace(go.Bar(
-                    x=x_data, 
-                    y=extended_buy_sell, 
-                    name='每日買賣超', 
-                    marker_color=bar_colors,
-                    opacity=0.55,
-                    hoverinfo='skip'
-                ), row=2, col=1, secondary_y=False)
-                
-                fig.add_trace(go.Scatter(
-                    x=x_data,
-                    y=merged_df['cumulative_net'],
-                    name='兩年累計買賣超',
-                    mode='lines',
-                    line=dict(color='yellow', width=2.5),
-                    connectgaps=True,
-                    hoverinfo='skip'
-                ), row=2, col=1, secondary_y=True)
-                
-                start_dt_vrect = pd.to_datetime(rank_start_date)
-                end_dt_vrect = pd.to_datetime(rank_end_date)
-
-                fig.add_vrect(
-                    x0=start_dt_vrect, 
-                    x1=end_dt_vrect,
-                    fillcolor="gray", 
-                    opacity=0.15, 
-                    layer="below", 
-                    line_width=0,
-                    annotation_text="統計區間", 
-                    annotation_position="top left",
-                    row='all', col=1
+            # ✅ 週末用 bounds 樣式，只列平日休市日 + 資料缺漏日；每檔股票算一次後重用 (切換區間不重算)
+            breaks_key = (stock_input, min_dt, last_dt_calc, len(trading_days))
+            if st.session_state.get('rangebreaks_key') != breaks_key:
+                st.session_state['rangebreaks'] = get_trading_calendar().rangebreaks(
+                    min_dt, last_dt_calc + timedelta(days=7), trading_days
+                )
+                st.session_state['rangebreaks_key'] = breaks_key
+            rangebreaks = st.session_state['rangebreaks']
+
+            with span("chart.build", bars=len(plot_df)):
+                fig = build_chart(
+                    plot_df, start_dt, x_range_end_val, rangebreaks,
+                    title=f"{stock_display} - {target_broker if target_broker else '股價'} 籌碼追蹤",
+                    selected_mas=selected_mas,
+                    has_flow=merged_df is not None,
+                    rank_range=(rank_start_date, rank_end_date),
+                    mobile=is_mobile_client(),
                 )
 
-            # 設定 Y 軸
-            safe_update_yaxes(
-                fig, row=1, col=1,
-                autorange=True,
-                fixedrange=True,
-                showgrid=True, gridcolor='rgba(128,128,128,0.2)',
-                ticklabelposition="inside", 
-                tickfont=dict(size=10, color='rgba(255,255,255,0.7)'),
-                showspikes=True, spikemode="across", spikesnap="data",
-                showspikelabels=True, 
-                spikedash="solid", spikecolor="rgba(255,255,255,0.6)", spikethickness=1
-            )
-            fig.update_yaxes(
-                fixedrange=True, 
-                showticklabels=True, 
-                row=2, col=1, 
-                secondary_y=False, 
-                showgrid=True, gridcolor='rgba(128,128,128,0.2)',
-                ticklabelposition="inside", 
-                tickfont=dict(size=10, color='rgba(255,255,255,0.7)')
-            )
-            fig.update_yaxes(
-                fixedrange=True, 
-                showticklabels=True, 
-                row=2, col=1, 
-                secondary_y=True, 
-                showgrid=False,
-                ticklabelposition="inside", 
-                tickfont=dict(size=10, color='yellow')
-            )
-
-            # ✅ 修正：使用 Streamlit 按鈕計算出的 range
-            safe_update_xaxes(
-                fig, row=1, col=1,
-                type='date',
-                rangebreaks=[dict(values=missing_dates)], 
-                range=[start_dt, x_range_end_val], 
-                fixedrange=False,
-                showspikes=True, spikemode="across", spikesnap="data",
-                showspikelabels=True,
-                spikedash="solid", spikecolor="rgba(255,255,255,0.6)", spikethickness=1
-            )
-            
-            safe_update_xaxes(
-                fig, row=2, col=1,
-                type='date',
-                rangebreaks=[dict(values=missing_dates)], 
-                range=[start_dt, x_range_end_val], 
-                fixedrange=False,
-                showspikes=True, spikemode="across", spikesnap="data",
-                showspikelabels=True,
-                spikedash="solid", spikecolor="rgba(255,255,255,0.6)", spikethickness=1
-            )
+            # 序列化與送出都發生在 st.plotly_chart 內
+            with span("chart.render"):
+                st.plotly_chart(fig, use_container_width=True, config=CHART_CONFIG)
 
-            # ✅ 修正：移除 updatemenus，優化 hoverlabel 樣式 (字體 16 + 加粗)
-            fig.update_layout(
-                xaxis_rangeslider_visible=False, 
-                plot_bgcolor='rgba(20,20,20,1)', 
-                paper_bgcolor='rgba(20,20,20,1)',
-                font=dict(color='white', size=12), 
-                title=dict(
-                    text=f"{stock_display} - {target_broker if target_broker else '股價'} 籌碼追蹤", 
-                    font=dict(size=28, color='white'), 
-                    x=0, xanchor="left",
-                    y=0.985, yanchor="top",
-                    pad=dict(t=8, b=0, l=0, r=0)
-                ), 
-                hovermode='x unified', 
-                hoverlabel=dict(
-                    bgcolor="rgba(0,0,0,0.78)", # 深色背景
-                    bordercolor="rgba(255,255,255,0.25)",
-                    font=dict(color="white", size=16), # 放大字體
-                    align="left"
-                ),
-                spikedistance=-1, 
-                hoverdistance=50,
-                legend=dict(orientation="h", y=0.88, yanchor="top", x=0, xanchor="left", bgcolor='rgba(0,0,0,0.5)', font=dict(size=10)),
-            )
+    else:
+        st.error(f"⚠️ 查無資料，請確認股票代號或稍後再試。")
 
-            fig_desktop = copy.deepcopy(fig)
-            fig_mobile = copy.deepcopy(fig)
+# ================= 5. 分點跨股追蹤 =================
 
-            fig_desktop.update_layout(
-                height=800,
-                dragmode='pan',
-                margin=dict(l=0, r=0, t=120, b=0) 
-            )
+# ✅ 每次重跑 (含收合時) 都會執行這段；查詢以索引檔修改時間為鍵快取，沒有新掃描就不碰 SQLite
+@st.cache_data(show_spinner=False, max_entries=64)
+def load_branches(version):
+    return get_branch_index().branches()
 
-            fig_mobile.update_layout(
-                height=520, 
-                dragmode='pan',  
-                title={**fig.layout.title.to_plotly_json(), "y": 1.0, "yanchor": "top"},
-                margin=dict(l=0, r=0, t=100, b=0) 
-            )
-            
-            config = {
-                "scrollZoom": True,
-                "displayModeBar": False,
-                "responsive": True,
-                "doubleClick": "reset"
-            }
+@st.cache_data(show_spinner=False, max_entries=64)
+def load_window_days(version, bhid, b):
+    return get_branch_index().window_days(bhid, b)
 
-            with st.container():
-                st.markdown('<div class="desktop-marker"></div>', unsafe_allow_html=True)
-                st.plotly_chart(fig_desktop, use_container_width=True, config=config)
+@st.cache_data(show_spinner=False, max_entries=64)
+def load_top_stocks(version, bhid, b, days, side):
+    return get_branch_index().top_stocks(bhid, b, days, side=side)
 
-            with st.container():
-                st.markdown('<div class="mobile-marker"></div>', unsafe_allow_html=True)
-                st.plotly_chart(fig_mobile, use_container_width=True, config=config)
+@st.cache_data(show_spinner=False, max_entries=64)
+def load_accumulated(version, bhid, b, since):
+    return get_branch_index().accumulated(bhid, b, since)
 
+with st.expander("🏦 分點跨股布局 (批次掃描與查詢過的排行)"):
+    index_version = get_branch_index().version()
+    branches = load_branches(index_version)
+    if branches.empty:
+        st.info("尚無索引資料，請先執行 `python -m chipk scan` 或查詢個股排行")
     else:
-        st.error(f"⚠️ 查無資料，請確認股票代號或稍後再試。")
+        labels = [f"{r.broker} ({r.BHID}/{r.b})・{r.stocks} 檔" for r in branches.itertuples()]
+        branch_label = st.selectbox("選擇分點", labels)
+        branch = branches.iloc[labels.index(branch_label)]
+
+        c1, c2 = st.columns(2)
+        window_days = c1.selectbox("統計天數", load_window_days(index_version, branch.BHID, branch.b), format_func=lambda d: f"{d}日")
+        side_label = c2.radio("方向", ["買超", "賣超"], horizontal=True)
+
+        top_df = load_top_stocks(index_version, branch.BHID, branch.b, window_days, "buy" if side_label == "買超" else "sell")
+        top_df.insert(1, "name", top_df["stock_id"].map(get_stock_name))
+        st.dataframe(
+            top_df, use_container_width=True, hide_index=True,
+            column_config={
+                "stock_id": "股票代號", "name": "名稱", "start_date": "起", "end_date": "迄",
+                "buy": st.column_config.NumberColumn("買進", format="%d"),
+                "sell": st.column_config.NumberColumn("賣出", format="%d"),
+                "net": st.column_config.NumberColumn("買賣超", format="%d"),
+            },
+        )
+
+        since = (datetime.now() - timedelta(days=365)).strftime('%Y-%m-%d')
+        acc_df = load_accumulated(index_version, branch.BHID, branch.b, since)
+        if not acc_df.empty:
+            st.markdown("##### 近一年每日明細累計 (已抓過明細的股票)")
+            acc_df.insert(1, "name", acc_df["stock_id"].map(get_stock_name))
+            st.dataframe(
+                acc_df, use_container_width=True, hide_index=True,
+                column_config={
+                    "stock_id": "股票代號", "name": "名稱", "first_date": "起", "last_date": "迄",
+                    "buy": st.column_config.NumberColumn("買進", format="%d"),
+                    "sell": st.column_config.NumberColumn("賣出", format="%d"),
+                    "net": st.column_config.NumberColumn("買賣超", format="%d"),
+                },
+            )
+
+# ================= 6. 背景更新與效能明細 =================
+
+# ✅ 富邦來源斷路中：抓取直接跳過，畫面上是快取資料
+governor = get_governor()
+source_state = governor.state
+if source_state != "closed":
+    retry_note = f"約 {governor.retry_in():.0f} 秒後自動重試" if source_state == "open" else "正在試探是否恢復"
+    source_banner.warning(f"⚠️ 富邦資料來源目前回應異常，暫時顯示快取資料 ({retry_note})")
+
+if pending_refresh:
+    with st.sidebar:
+        revalidation_watcher(pending_refresh)
+
+finish_trace(rerun_trace)
+if show_timing:
+    with st.sidebar.expander("⏱️ 本次重跑耗時", expanded=True):
+        st.markdown(f"**總計 {rerun_trace.total_ms():,.0f} ms**")
+        if rerun_trace.cache:
+            icons = {"fresh": "✅", "stale": "🔄", "miss": "⬜", "coalesced": "🔗", "failed": "⚠️"}
+            st.markdown("　".join(f"{icons.get(r, '⬜')} {name} {r}" for name, r in rerun_trace.cache.items()))
+        cache_stats = swr.backend.stats()
+        st.caption(
+            f"快取後端 {cache_stats['backend']}：{cache_stats['bytes'] / 2**20:.1f} / {cache_stats['max_bytes'] / 2**20:.0f} MB"
+            f"・命中 {cache_stats['hits']}・未命中 {cache_stats['misses']}・淘汰 {cache_stats['evictions']}"
+        )
+        timing_df = pd.DataFrame(
+            [("　" * depth + name, ms) for name, depth, ms, _ in rerun_trace.spans],
+            columns=["階段", "ms"],
+        )
+        st.dataframe(timing_df, use_container_width=True, hide_index=True,
+                     column_config={"ms": st.column_config.NumberColumn("ms", format="%.1f")})
@@ -1,3 +1,4 @@
+# ⚠️ 舊版 App 的凍結副本，僅供對照，不再維護也不套用 chipk 的改動；請執行 main.py
 import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
@@ -0,0 +1,43 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from benchmarks.fixture_server import serve_fixtures
+from chipk import fetch
+from chipk.aio import FetchError, run_rankings
+from chipk.windows import DailyRankingStore, collect_daily_aio
+
+def status_server(status, hits):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            hits.append(self.path)
+            self.send_error(status)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+@pytest.mark.parametrize("status, attempts", [(404, 1), (503, 3)])
+def test_only_throttle_and_server_errors_are_retried(monkeypatch, status, attempts):
+    hits = []
+    server = status_server(status, hits)
+    monkeypatch.setattr(fetch, "FUBON_BASE", f"http://127.0.0.1:{server.server_address[1]}")
+    try:
+        (result,) = run_rankings([("2313", "2026-10-15", "2026-10-15")], retries=2, backoff=0, rate=100, burst=10)
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert isinstance(result, FetchError)
+    assert len(hits) == attempts
+
+def test_collect_daily_aio_saves_fetched_days(tmp_path, monkeypatch):
+    store = DailyRankingStore(str(tmp_path / "chipk.db"))
+    with serve_fixtures() as base:
+        monkeypatch.setattr(fetch, "FUBON_BASE", base)
+        ok, failed = collect_daily_aio("2313", "2026-10-13", "2026-10-15", store=store, rate=100, burst=10)
+    assert (ok, failed) == (3, 0)
+    assert store.captured_days("2313") == ["2026-10-13", "2026-10-14", "2026-10-15"]
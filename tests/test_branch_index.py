@@ -0,0 +1,23 @@
+from chipk.branch_index import BranchIndex
+
+def row(stock_id, end_date, net):
+    return {"BHID": "9A00", "b": "9A9R", "broker": "永豐金-信義", "stock_id": stock_id, "days": 5,
+            "start_date": "2026-10-01", "end_date": end_date, "buy": max(net, 0), "sell": max(-net, 0), "net": net}
+
+def test_top_stocks_keeps_stocks_scanned_on_other_days(tmp_path):
+    index = BranchIndex(str(tmp_path / "chipk.db"))
+    index.add_rows([
+        row("2330", "2026-10-16", 300),
+        row("2313", "2026-10-14", 900),  # 較早掃描，仍應出現
+        row("2313", "2026-10-09", 50),   # 同股較舊的一筆不重複列出
+    ])
+    top = index.top_stocks("9A00", "9A9R", 5)
+    assert top[["stock_id", "end_date", "net"]].values.tolist() == [["2313", "2026-10-14", 900], ["2330", "2026-10-16", 300]]
+
+def test_top_stocks_date_range(tmp_path):
+    index = BranchIndex(str(tmp_path / "chipk.db"))
+    index.add_rows([row("2330", "2026-10-16", 300), row("2313", "2026-10-14", 900), row("2313", "2026-10-09", 50)])
+    top = index.top_stocks("9A00", "9A9R", 5, until="2026-10-10")
+    assert top[["stock_id", "net"]].values.tolist() == [["2313", 50]]
+    top = index.top_stocks("9A00", "9A9R", 5, since="2026-10-15", side="sell")
+    assert top["stock_id"].tolist() == ["2330"]
@@ -0,0 +1,110 @@
+import os
+from contextlib import contextmanager
+
+import pytest
+
+from benchmarks.fixture_server import FIXTURE_DIR
+from chipk import browser_fetch, governor
+from chipk.fetch import decode_html
+from chipk.parsing import parse_ranking_html
+
+KEY = ("9200", "9268", "1")
+
+def daily_page(n, total):
+    rows = "".join(f'<tr><td class="t3t1">115/{n:02d}/{d:02d}</td><td>10</td><td>4</td><td>6</td></tr>'
+                   for d in range(1, 4))
+    pager = f'<a href="#">下一頁</a> 共{total}頁' if n < total else f"共{total}頁"
+    return (f"<html><body><table><tr><td>日期</td><td>買進</td><td>賣出</td><td>買賣超</td></tr>{rows}</table>"
+            f"<table><tr><td>{pager}</td></tr></table></body></html>")
+
+class FakeElement:
+    def __init__(self, driver, text=""):
+        self.driver = driver
+        self.text = text
+
+    def click(self):
+        self.driver.page += 1
+
+class FakeDriver:
+    """只實作 _fetch_broker_daily_browser 用到的部分；date_cells=False 模擬日期格一直等不到"""
+
+    def __init__(self, total, date_cells=True):
+        self.total = total
+        self.date_cells = date_cells
+        self.page = 1
+        self.cells = {}
+
+    def get(self, url):
+        self.page = 1
+
+    @property
+    def page_source(self):
+        return daily_page(self.page, self.total)
+
+    def find_elements(self, by, xpath):
+        if xpath == browser_fetch.DATE_CELL_XPATH:
+            if not self.date_cells:
+                return []
+            # 同一頁回傳同一個元素，換頁後是新的元素
+            cell = self.cells.setdefault(self.page, FakeElement(self, f"115/{self.page:02d}/01"))
+            return [cell]
+        if "下一頁" in xpath:
+            return [FakeElement(self)] if self.page < self.total else []
+        return []
+
+    def find_element(self, by, xpath):
+        raise LookupError(xpath)  # 走 extract_daily_table 的備援解析
+
+@pytest.fixture
+def fake_browser(monkeypatch):
+    monkeypatch.setattr(governor, "_governor", governor.SourceGovernor())
+    monkeypatch.setattr(browser_fetch, "PAGE_TIMEOUT", 0.2)
+    drivers = []
+
+    class Pool:
+        @contextmanager
+        def borrow(self):
+            yield drivers[0]
+
+    monkeypatch.setattr(browser_fetch, "get_driver_pool", lambda: Pool())
+    return drivers
+
+def test_clicks_through_every_page(fake_browser):
+    fake_browser.append(FakeDriver(total=4))
+    df, _ = browser_fetch._fetch_broker_daily_browser("2313", KEY, "2026-01-01", "2026-10-15")
+    assert len(df) == 4 * 3
+    assert fake_browser[0].page == 4
+
+def test_missing_date_cell_with_next_page_is_a_failed_fetch(fake_browser):
+    fake_browser.append(FakeDriver(total=4, date_cells=False))
+    df, url = browser_fetch._fetch_broker_daily_browser("2313", KEY, "2026-01-01", "2026-10-15")
+    assert df is None and "zco0" in url
+
+def test_single_page_without_date_cell_is_kept(fake_browser):
+    fake_browser.append(FakeDriver(total=1, date_cells=False))
+    df, _ = browser_fetch._fetch_broker_daily_browser("2313", KEY, "2026-01-01", "2026-10-15")
+    assert len(df) == 3
+
+class RankingDriver:
+    """排行頁：HTTP 回應沒有排行表，瀏覽器執行完 JS 後才有"""
+
+    def __init__(self, html):
+        self.html = html
+
+    def get(self, url):
+        pass
+
+    @property
+    def page_source(self):
+        return self.html
+
+    def find_element(self, by, xpath):
+        return FakeElement(self)
+
+def test_ranking_falls_back_to_browser_page(fake_browser):
+    with open(os.path.join(FIXTURE_DIR, "zco.html"), "rb") as f:
+        html = decode_html(f.read())
+    fake_browser.append(RankingDriver(html))
+    df_buy, df_sell, sum_buy, sum_sell, broker_info, url = browser_fetch._fetch_ranking_browser("2313", "2026-01-01", "2026-10-15")
+    assert df_buy is not None and broker_info
+    assert df_buy.equals(parse_ranking_html(html, url)[0])
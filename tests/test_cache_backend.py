@@ -0,0 +1,85 @@
+import time
+
+from chipk import cache_backend
+from chipk.cache_backend import FileBackend, RedisBackend
+
+def test_file_size_is_tracked_without_scanning(tmp_path, monkeypatch):
+    backend = FileBackend(str(tmp_path), max_bytes=10_000)
+    backend.set("ranking", "a", b"x" * 1000, 1.0)
+    backend.set("ranking", "a", b"x" * 400, 2.0)  # 覆寫同一筆只算差額
+    backend.set("ranking", "b", b"x" * 100, 3.0)
+    assert backend.size() == 500 + 2 * cache_backend._HEADER.size
+
+    # 沒超過上限也還沒到掃描時間時，寫入不掃目錄
+    monkeypatch.setattr(backend, "_entries", lambda: (_ for _ in ()).throw(AssertionError("scanned")))
+    backend.set("ranking", "c", b"x" * 100, 4.0)
+
+def test_file_evicts_only_when_over_cap(tmp_path):
+    backend = FileBackend(str(tmp_path), max_bytes=1000)
+    for i in range(5):
+        backend.set("ranking", i, b"x" * 300, float(i))
+        time.sleep(0.01)
+    assert backend.size() <= 1000
+    assert backend.get("ranking", 4) is not None
+    assert backend.get("ranking", 0) is None
+
+class FakeRedis:
+    """只實作 RedisBackend 用到的指令；過期的 key 讀不到 (如同 Redis 已刪除)"""
+
+    def __init__(self):
+        self.kv, self.expire, self.zsets, self.hashes = {}, {}, {}, {}
+
+    def _alive(self, k):
+        if k in self.expire and self.expire[k] <= time.time():
+            self.kv.pop(k, None)
+            self.expire.pop(k)
+        return k in self.kv
+
+    def get(self, k):
+        return self.kv[k] if self._alive(k) else None
+
+    def set(self, k, v, ex=None):
+        self.kv[k] = v
+        if ex:
+            self.expire[k] = time.time() + ex
+        else:
+            self.expire.pop(k, None)
+
+    def delete(self, k):
+        return int(self._alive(k) and self.kv.pop(k) is not None)
+
+    def incrby(self, k, n):
+        self.kv[k] = int(self.kv.get(k, 0)) + n
+
+    def zadd(self, name, mapping):
+        self.zsets.setdefault(name, {}).update(mapping)
+
+    def zrem(self, name, k):
+        self.zsets.get(name, {}).pop(k, None)
+
+    def zrange(self, name, start, end):
+        return sorted(self.zsets.get(name, {}), key=self.zsets[name].get)[start:end + 1]
+
+    def zrangebyscore(self, name, low, high, start=0, num=None):
+        items = sorted((k for k, v in self.zsets.get(name, {}).items() if low <= v <= high), key=self.zsets[name].get)
+        return items[start:start + num if num else None]
+
+    def hget(self, name, k):
+        return self.hashes.get(name, {}).get(k)
+
+    def hset(self, name, k, v):
+        self.hashes.setdefault(name, {})[k] = v
+
+    def hdel(self, name, k):
+        self.hashes.get(name, {}).pop(k, None)
+
+def test_redis_size_drops_when_keys_expire(monkeypatch):
+    backend = RedisBackend(client=FakeRedis(), max_bytes=10_000)
+    backend.set("ranking", "a", b"x" * 1000, 1.0, ttl=60)
+    backend.set("stock_price", "b", b"x" * 100, 1.0)
+    assert backend.size() == 1100 + 2 * cache_backend._HEADER.size
+
+    later = time.time() + 61
+    monkeypatch.setattr(cache_backend.time, "time", lambda: later)
+    backend.set("stock_price", "c", b"x" * 100, 2.0)
+    assert backend.size() == 200 + 2 * cache_backend._HEADER.size
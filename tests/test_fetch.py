@@ -0,0 +1,61 @@
+import os
+
+from benchmarks.fixture_server import FIXTURE_DIR
+from chipk import fetch
+from chipk.fetch import broker_daily_url, decode_html, fetch_broker_daily, fetch_ranking
+
+KEY = ("9200", "9268", "1")
+START, END = "2026-01-01", "2026-10-15"
+TOTAL = 8
+
+def daily_page(n, url, window=2, js_from=None):
+    """第 n 頁；分頁列只列前後 window 頁 (1 2 3 … 下一頁)，沒有「共 N 頁」"""
+    rows = "".join(f"<tr><td>115/{n:02d}/{d:02d}</td><td>10</td><td>4</td><td>6</td></tr>" for d in range(1, 4))
+    links = " ".join(str(p) if p == n else f'<a href="{url}&page={p}">{p}</a>'
+                     for p in range(max(1, n - window), min(TOTAL, n + window) + 1))
+    if n < TOTAL:
+        href = "javascript:go()" if js_from and n >= js_from else f"{url}&page={n + 1}"
+        links += f' <a href="{href}">下一頁</a>'
+    return (f"<html><body><table><tr><td>日期</td><td>買進</td><td>賣出</td><td>買賣超</td></tr>{rows}</table>"
+            f"<table><tr><td>{links}</td></tr></table></body></html>")
+
+def fake_site(monkeypatch, **kwargs):
+    base = broker_daily_url("2313", KEY, START, END)
+    hits = []
+
+    def fetch_html(url, timeout=10):
+        hits.append(url)
+        n = int(url.rsplit("&page=", 1)[1]) if "&page=" in url else 1
+        return daily_page(n, base, **kwargs)
+
+    monkeypatch.setattr(fetch, "fetch_html", fetch_html)
+    return hits
+
+def test_windowed_paginator_is_followed_to_the_last_page(monkeypatch):
+    hits = fake_site(monkeypatch)
+    df, _ = fetch_broker_daily("2313", KEY, START, END)
+    assert df is not None
+    assert len(df) == TOTAL * 3
+    assert len(hits) == TOTAL
+
+def test_unresolvable_next_page_is_a_failed_fetch(monkeypatch):
+    # 第 3 頁之後的「下一頁」是 JS，推不出網址時不能把前 3 頁當完整明細
+    hits = fake_site(monkeypatch, js_from=3)
+    df, url = fetch_broker_daily("2313", KEY, START, END)
+    assert df is None and url == broker_daily_url("2313", KEY, START, END)
+    assert len(hits) == 3
+
+def ranking_fixture():
+    with open(os.path.join(FIXTURE_DIR, "zco.html"), "rb") as f:
+        return decode_html(f.read())
+
+def test_ranking_page_is_parsed_over_http(monkeypatch):
+    monkeypatch.setattr(fetch, "fetch_html", lambda url, timeout=10: ranking_fixture())
+    df_buy, df_sell, sum_buy, sum_sell, broker_info, url = fetch_ranking("2313", START, END)
+    assert len(df_buy) and len(df_sell) and broker_info
+    assert "zco.djhtm" in url
+
+def test_ranking_page_without_table_falls_back(monkeypatch):
+    # 回應裡沒有「買超券商」表 (例如 JS 才畫出來或擋爬蟲頁)：回傳 None，呼叫端改用瀏覽器
+    monkeypatch.setattr(fetch, "fetch_html", lambda url, timeout=10: "<html><body>請稍候...</body></html>")
+    assert fetch_ranking("2313", START, END) is None
@@ -0,0 +1,45 @@
+import pytest
+import requests
+
+import chipk.browser_fetch as browser_fetch
+import chipk.governor as governor
+from chipk.fetch import fetch_ranking
+from chipk.governor import SourceGovernor, SourceUnavailable
+
+@pytest.fixture
+def open_breaker(monkeypatch):
+    """換上一個已斷路的 governor (連續失敗 FAILURE_THRESHOLD 次)"""
+    monkeypatch.setattr(governor, "BACKOFF_BASE", 0)
+    gov = SourceGovernor()
+    for _ in range(governor.FAILURE_THRESHOLD):
+        with pytest.raises(requests.ConnectionError):
+            with gov.request():
+                raise requests.ConnectionError("refused")
+    assert gov.state == "open"
+    monkeypatch.setattr(governor, "_governor", gov)
+    return gov
+
+def test_open_breaker_rejects_without_sending(open_breaker):
+    with pytest.raises(SourceUnavailable):
+        with open_breaker.request():
+            pytest.fail("斷路中不應送出請求")
+    assert not open_breaker.available()
+
+def test_ranking_path_does_not_raise_when_open(open_breaker, monkeypatch):
+    def no_browser():
+        raise AssertionError("斷路中不應借用瀏覽器")
+    monkeypatch.setattr(browser_fetch, "get_driver_pool", no_browser)
+
+    # 與 main.get_real_data_matrix 相同：HTTP 拿不到就退回瀏覽器
+    assert fetch_ranking("2313", "2026-01-02", "2026-03-31") is None
+    result = browser_fetch.fetch_ranking_browser("2313", "2026-01-02", "2026-03-31")
+    assert result[:5] == (None, None, None, None, None)
+    df, url = browser_fetch.fetch_broker_daily_browser("2313", ("9200", "9268", "1"), "2025-01-02", "2026-03-31")
+    assert df is None and url
+
+def test_successful_probe_closes_breaker(open_breaker, monkeypatch):
+    monkeypatch.setattr(open_breaker, "_open_for", 0)
+    assert open_breaker.state == "half_open"
+    with open_breaker.request():
+        pass
+    assert open_breaker.state == "closed"
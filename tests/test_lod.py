@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+from chipk.lod import MAX_DAILY_BARS, TRIM_MARGIN_BARS, bar_rule, chart_level_of_detail, minmax_downsample, resample_bars
+
+def daily_bars(n, start="2024-01-01"):
+    dates = pd.bdate_range(start, periods=n)
+    close = np.arange(1, n + 1, dtype=float)
+    return pd.DataFrame({
+        "Date": dates, "DateStr": dates.strftime("%Y-%m-%d"),
+        "Open": close - 0.5, "High": close + 1, "Low": close - 1, "Close": close, "Volume": 100.0,
+        "MA5": close, "買賣超_Final": 1.0, "cumulative_net": np.sin(np.arange(n) / 7) * 100,
+    })
+
+def test_bar_rule_thresholds():
+    assert bar_rule(MAX_DAILY_BARS) is None
+    assert bar_rule(MAX_DAILY_BARS + 1) == "W-FRI"
+    assert bar_rule(5 * 150 + 5) == "ME"
+
+def test_weekly_bars_aggregate_ohlc_and_flows():
+    df = daily_bars(10)  # 2024-01-01 (一) 起兩週
+    week = resample_bars(df, "W-FRI").iloc[0]
+    assert week["DateStr"] == "2024-01-05"  # 取該週最後一個交易日
+    assert (week["Open"], week["High"], week["Low"], week["Close"]) == (0.5, 6.0, 0.0, 5.0)
+    assert week["Volume"] == 500 and week["買賣超_Final"] == 5
+    assert week["MA5"] == 5.0
+
+def test_minmax_downsample_keeps_extremes_and_ends():
+    y = np.zeros(1000)
+    y[123], y[777] = 50, -80
+    keep = minmax_downsample(y, 20)
+    assert len(keep) <= 2 * 20 + 2
+    assert {0, 123, 777, 999} <= set(keep)
+    assert list(keep) == sorted(keep)
+    # 資料量不多時原樣保留
+    assert list(minmax_downsample(y[:30], 20)) == list(range(30))
+
+def test_short_range_is_trimmed_with_margin():
+    df = daily_bars(400)
+    bars, cum, rule = chart_level_of_detail(df, df["Date"].iloc[-60])
+    assert rule is None
+    assert len(bars) == 60 + TRIM_MARGIN_BARS
+    assert bars["Date"].iloc[-1] == df["Date"].iloc[-1]
+
+def test_long_range_switches_to_weekly_bars():
+    df = daily_bars(400)
+    bars, cum, rule = chart_level_of_detail(df, df["Date"].iloc[0])
+    assert rule == "W-FRI"
+    assert len(bars) == 80
+    assert len(cum) < len(df)
+    assert cum["cumulative_net"].max() == df["cumulative_net"].max()
+    assert cum["cumulative_net"].min() == df["cumulative_net"].min()
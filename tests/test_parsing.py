@@ -0,0 +1,34 @@
+import os
+
+from benchmarks.fixture_server import FIXTURE_DIR
+from chipk.fetch import decode_html
+from chipk.parsing import MAX_PAGES, resolve_page_urls
+
+URL = "https://example/z/zc/zco/zco0/zco0.djhtm?A=2313&BHID=9200&b=9200&C=1&D=2025-10-15&E=2026-10-15&ver=V3"
+
+def page(body):
+    return f"<html><body><table><tr><td>日期</td></tr></table>{body}</body></html>"
+
+def link(n, text=None):
+    return f'<a href="zco0.djhtm?A=2313&BHID=9200&b=9200&C=1&D=2025-10-15&E=2026-10-15&ver=V3&page={n}">{text or n}</a>'
+
+def test_recorded_first_page():
+    with open(os.path.join(FIXTURE_DIR, "zco0_p1.html"), "rb") as f:
+        urls = resolve_page_urls(decode_html(f.read()), URL)
+    assert [u.rsplit("page=", 1)[1] for u in urls] == ["2", "3", "4", "5", "6"]
+
+def test_numeric_links_outside_pagination_are_ignored():
+    # 頁面其他地方的數字連結 (例如年份、代號) 不能被當成頁碼
+    html = page(f'<p><a href="other.djhtm?page=2026">2026</a></p>'
+                f'<div>1 {link(2)} {link(3)} {link(2, "下一頁")}</div>')
+    assert len(resolve_page_urls(html, URL)) == 2
+
+def test_page_total_text_wins_and_is_clamped():
+    html = page(f'<div>1 {link(2)} {link(2, "下一頁")} 共 9999 頁</div>')
+    urls = resolve_page_urls(html, URL)
+    assert len(urls) == MAX_PAGES - 1
+    assert urls[-1].endswith(f"page={MAX_PAGES}")
+
+def test_javascript_pagination_returns_none():
+    html = page('<div>1 <a href="javascript:go(2)">下一頁</a></div>')
+    assert resolve_page_urls(html, URL) is None
@@ -0,0 +1,30 @@
+from chipk import prefetch
+from chipk.prefetch import BrokerPrefetcher
+
+KEY = ("9200", "9268", "1")
+
+def test_recently_synced_broker_is_skipped(monkeypatch):
+    calls = []
+
+    def fake_sync(stock_id, broker_key, start_date, end_date):
+        calls.append(broker_key)
+        return True
+
+    monkeypatch.setattr(prefetch, "sync_broker_daily", fake_sync)
+    prefetcher = BrokerPrefetcher(max_workers=1, recent_minutes=10)
+    prefetcher.submit("2313", KEY, "2024-10-01", "2026-10-16").result()
+    assert prefetcher.submit("2313", KEY, "2024-10-01", "2026-10-16") is None
+    assert calls == [KEY]
+
+def test_failed_sync_is_retried(monkeypatch):
+    calls = []
+
+    def fake_sync(stock_id, broker_key, start_date, end_date):
+        calls.append(broker_key)
+        return False
+
+    monkeypatch.setattr(prefetch, "sync_broker_daily", fake_sync)
+    prefetcher = BrokerPrefetcher(max_workers=1, recent_minutes=10)
+    prefetcher.submit("2313", KEY, "2024-10-01", "2026-10-16").result()
+    prefetcher.submit("2313", KEY, "2024-10-01", "2026-10-16").result()
+    assert calls == [KEY, KEY]
@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+
+from chipk import prices
+from chipk.prices import PriceStore, add_moving_averages, update_price_history
+
+def bars(closes, start="2026-10-01"):
+    index = pd.bdate_range(start, periods=len(closes))
+    df = pd.DataFrame({"Open": closes, "High": closes, "Low": closes, "Close": closes, "Volume": 1000.0}, index=index)
+    df["DateStr"] = index.strftime("%Y-%m-%d")
+    return df
+
+def test_unsettled_tail_bar_is_overwritten_without_full_download(tmp_path, monkeypatch):
+    store = PriceStore(str(tmp_path / "chipk.db"))
+    # 最後一根 (10/07) 是盤中存下的 12.0，收盤是 12.5
+    store.save("2313", "2313.TW", add_moving_averages(bars([10.0, 10.5, 11.0, 11.5, 12.0])))
+    calls = []
+
+    def fake_download(ticker, **kwargs):
+        calls.append(kwargs)
+        return bars([11.5, 12.5, 13.0], start="2026-10-06")
+
+    monkeypatch.setattr(prices, "_download", fake_download)
+    assert update_price_history("2313", store) == "2313.TW"
+    assert calls == [{"start": "2026-10-06"}]  # 沒有退回 2 年完整下載
+    closes = store.tail("2313", 10)
+    assert closes["close"].tolist() == [10.0, 10.5, 11.0, 11.5, 12.5, 13.0]
+
+def test_adjusted_settled_bar_triggers_full_download(tmp_path, monkeypatch):
+    store = PriceStore(str(tmp_path / "chipk.db"))
+    store.save("2313", "2313.TW", add_moving_averages(bars([10.0, 10.5, 11.0])))
+    calls = []
+
+    def fake_download(ticker, **kwargs):
+        calls.append(kwargs)
+        # 除權息回溯調整：已收定的 10/02 也變了
+        return bars([9.5, 10.0, 10.5]) if "period" in kwargs else bars([10.0, 10.5], start="2026-10-02")
+
+    monkeypatch.setattr(prices, "_download", fake_download)
+    update_price_history("2313", store)
+    assert calls[-1] == {"period": "2y"}
+    assert store.tail("2313", 10)["close"].tolist() == [9.5, 10.0, 10.5]
+
+def test_anchor_bar_moving_averages_survive_incremental_refresh(tmp_path, monkeypatch):
+    store = PriceStore(str(tmp_path / "chipk.db"))
+    closes = [100.0 + i for i in range(80)]
+    store.save("2313", "2313.TW", add_moving_averages(bars(closes)))
+    anchor = bars(closes)["DateStr"].iloc[-2]
+    before = store.load("2313", anchor).iloc[0]
+
+    def fake_download(ticker, **kwargs):
+        # 倒數第二根 (已收定) 不變，最後一根收定並多一根新K棒
+        return bars([closes[-2], closes[-1] + 0.5, closes[-1] + 1], start=anchor)
+
+    monkeypatch.setattr(prices, "_download", fake_download)
+    update_price_history("2313", store)
+    after = store.load("2313", anchor).iloc[0]
+    assert after["DateStr"] == anchor
+    for col in ("MA5", "MA10", "MA20", "MA60"):
+        assert after[col] == pytest.approx(before[col])
@@ -0,0 +1,13 @@
+from datetime import datetime
+
+from chipk import scan, trading_calendar
+from chipk.trading_calendar import TradingCalendar
+
+def test_default_window_end_is_last_settled_day(monkeypatch):
+    calendar = TradingCalendar({"2026-10-09": "國慶日補假"})
+    monkeypatch.setattr(scan, "get_trading_calendar", lambda: calendar)
+    morning = datetime(2026, 10, 15, 9, 0, tzinfo=trading_calendar.TAIPEI)
+    monkeypatch.setattr(trading_calendar, "now_taipei", lambda: morning)
+    assert scan.ranking_windows([1, 5]) == [(1, "2026-10-14", "2026-10-14"), (5, "2026-10-07", "2026-10-14")]
+    # 指定終點時照用
+    assert scan.ranking_windows([1], end="2026-10-15") == [(1, "2026-10-15", "2026-10-15")]
@@ -0,0 +1,69 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from chipk.singleflight import SingleFlight
+
+def wait_for_waiters(flight, key, n, timeout=5):
+    deadline = time.monotonic() + timeout
+    while flight.inflight().get(key) != n:
+        assert time.monotonic() < deadline, flight.inflight()
+        time.sleep(0.005)
+
+def run_concurrently(flight, fn, n, key=("2313",)):
+    """第一個呼叫卡在 fn 裡，等其餘 n-1 個都排上同一個 key 才放行"""
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        return fn()
+
+    with ThreadPoolExecutor(n) as pool:
+        futures = [pool.submit(flight.do, "ranking", key, slow) for _ in range(n)]
+        wait_for_waiters(flight, ("ranking", key), n - 1)
+        release.set()
+        results = []
+        for f in futures:
+            try:
+                results.append(f.result())
+            except Exception as e:
+                results.append(e)
+    return calls, results
+
+def test_concurrent_callers_share_one_fetch():
+    flight = SingleFlight()
+    calls, results = run_concurrently(flight, lambda: "html", 5)
+    assert len(calls) == 1
+    assert [value for value, _ in results] == ["html"] * 5
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert flight.inflight() == {}
+
+def test_error_is_raised_to_every_waiter():
+    flight = SingleFlight()
+    calls, results = run_concurrently(flight, lambda: 1 / 0, 3)
+    assert len(calls) == 1
+    assert all(isinstance(r, ZeroDivisionError) for r in results)
+
+def test_finished_call_is_not_reused():
+    flight = SingleFlight()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return len(calls)
+
+    assert flight.do("ranking", ("2313",), fetch) == (1, False)
+    assert flight.do("ranking", ("2313",), fetch) == (2, False)
+
+def test_different_keys_run_independently():
+    flight = SingleFlight()
+    release = threading.Event()
+    with ThreadPoolExecutor(2) as pool:
+        first = pool.submit(flight.do, "ranking", ("2313",), lambda: release.wait(5) and "2313")
+        wait_for_waiters(flight, ("ranking", ("2313",)), 0)
+        # 另一個 key 不必等前一個完成
+        assert flight.do("ranking", ("2330",), lambda: "2330") == ("2330", False)
+        release.set()
+        assert first.result() == ("2313", False)
@@ -0,0 +1,45 @@
+import pandas as pd
+
+from chipk.store import BrokerFlowStore, connect
+
+KEY = ("9200", "9268", "1")
+
+def daily(dates):
+    return pd.DataFrame({"DateStr": dates, "買進": [10.0] * len(dates), "賣出": [4.0] * len(dates), "買賣超": [6.0] * len(dates)})
+
+def set_synced_at(store, synced_at):
+    with connect(store.path) as conn:
+        conn.execute("UPDATE broker_daily_sync SET synced_at=?", (synced_at,))
+
+def test_missing_from_fetches_only_the_tail(tmp_path):
+    store = BrokerFlowStore(str(tmp_path / "chipk.db"))
+    assert store.missing_from("2313", KEY, "2026-10-01", "2026-10-15") == "2026-10-01"
+
+    store.save("2313", KEY, daily(["2026-10-01", "2026-10-02"]), "2026-10-01", "2026-10-02")
+    set_synced_at(store, "2026-10-05 09:00:00")
+    # 已涵蓋的區間不再抓；往後延伸只補最後一天之後 (含最後一天)
+    assert store.missing_from("2313", KEY, "2026-10-01", "2026-10-02") is None
+    assert store.missing_from("2313", KEY, "2026-10-01", "2026-10-15") == "2026-10-02"
+    # 起點早於已同步的第一天：整段重抓
+    assert store.missing_from("2313", KEY, "2026-09-01", "2026-10-02") == "2026-09-01"
+
+def test_last_day_synced_the_same_day_is_refetched(tmp_path):
+    store = BrokerFlowStore(str(tmp_path / "chipk.db"))
+    store.save("2313", KEY, daily(["2026-10-15"]), "2026-10-01", "2026-10-15")
+    set_synced_at(store, "2026-10-15 10:30:00")  # 當天盤中抓的，可能尚未結算
+    assert store.missing_from("2313", KEY, "2026-10-01", "2026-10-15") == "2026-10-15"
+
+def test_incremental_saves_merge_the_synced_range(tmp_path):
+    store = BrokerFlowStore(str(tmp_path / "chipk.db"))
+    store.save("2313", KEY, daily(["2026-10-01", "2026-10-02"]), "2026-10-01", "2026-10-02")
+    # 重抓最後一天的新值覆蓋舊值，不會重複
+    tail = daily(["2026-10-02", "2026-10-05"])
+    tail.loc[0, ["賣出", "買賣超"]] = [1.0, 9.0]
+    store.save("2313", KEY, tail, "2026-10-02", "2026-10-05")
+
+    first_date, last_date, _ = store.synced_range("2313", KEY)
+    assert (first_date, last_date) == ("2026-10-01", "2026-10-05")
+    df = store.load("2313", KEY, "2026-10-01", "2026-10-05")
+    assert df["DateStr"].tolist() == ["2026-10-01", "2026-10-02", "2026-10-05"]
+    assert df["買賣超"].tolist() == [6.0, 9.0, 6.0]
+    assert df["買賣超_Calc"].tolist() == [6.0, 9.0, 6.0]
@@ -0,0 +1,27 @@
+from chipk.cache_backend import FileBackend
+from chipk.swr import SWRCache
+
+EMPTY = (None, "https://example/zco0.djhtm")
+
+def boom():
+    raise ConnectionError("refused")
+
+def test_loader_exception_returns_empty(tmp_path):
+    cache = SWRCache(backend=FileBackend(str(tmp_path)))
+    (df, url), _, state = cache.get("broker_daily", ("2313", "k"), boom, empty=EMPTY)
+    assert (df, url, state) == (None, EMPTY[1], "miss")
+
+    # RETRY_SECONDS 內不再重抓，仍回傳可拆解的 empty
+    (df, url), _, state = cache.get("broker_daily", ("2313", "k"), boom, empty=EMPTY)
+    assert (df, url, state) == (None, EMPTY[1], "failed")
+
+def test_background_refresh_failure_keeps_stale_value(tmp_path):
+    cache = SWRCache(backend=FileBackend(str(tmp_path)))
+    cache.get("ranking", ("2313",), lambda: ("ok", "url"))
+    # 強制重抓失敗：仍回傳舊值，之後也不會變成 None
+    value, _, state = cache.get("ranking", ("2313",), boom, force=True)
+    assert (value, state) == (("ok", "url"), "stale")
+    cache.revalidate("ranking", repr(("2313",)), boom, lambda v: v is not None, force=True)
+    cache._pool.shutdown(wait=True)
+    value, _, _ = cache.get("ranking", ("2313",), boom)
+    assert value == ("ok", "url")
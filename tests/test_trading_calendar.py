@@ -0,0 +1,32 @@
+import logging
+from datetime import datetime
+
+import pandas as pd
+
+from chipk import trading_calendar
+from chipk.trading_calendar import TradingCalendar
+
+def test_uncovered_year_is_reported_once(caplog):
+    calendar = TradingCalendar({"2026-10-09": "國慶日補假", "2026-10-10": "國慶日"})
+    with caplog.at_level(logging.WARNING, logger="chipk.calendar"):
+        assert calendar.covers("2026-01-05", "2026-12-31")
+        assert not calendar.covers("2026-12-01", "2027-01-29")
+        assert not calendar.covers("2027-01-04", "2027-01-29")
+    assert calendar.uncovered_years("2026-12-01", "2027-01-29") == [2027]
+    assert len([r for r in caplog.records if "2027" in r.getMessage()]) == 1
+
+def test_rangebreaks_infer_holidays_from_trading_days_in_uncovered_years():
+    calendar = TradingCalendar({"2026-10-09": "國慶日補假"})
+    # 2027-01-01 (週五) 休市，但休市表沒有 2027
+    days = pd.bdate_range("2026-12-28", "2027-01-08").drop(pd.Timestamp("2027-01-01"))
+    breaks = calendar.rangebreaks(days.min(), days.max(), days)
+    assert "2027-01-01" in breaks[1]["values"]
+
+def test_last_settled_day_waits_for_settlement():
+    calendar = TradingCalendar({"2026-10-09": "國慶日補假", "2026-10-10": "國慶日"})
+    tz = trading_calendar.TAIPEI
+    # 週四盤中 -> 週三；週四收盤結算後 -> 週四
+    assert str(calendar.last_settled_day(datetime(2026, 10, 15, 10, 0, tzinfo=tz))) == "2026-10-14"
+    assert str(calendar.last_settled_day(datetime(2026, 10, 15, 17, 0, tzinfo=tz))) == "2026-10-15"
+    # 週一早上 -> 上週四 (週五 10/09 休市)
+    assert str(calendar.last_settled_day(datetime(2026, 10, 12, 8, 0, tzinfo=tz))) == "2026-10-08"
@@ -0,0 +1,25 @@
+from chipk.store import connect
+from chipk.trading_calendar import now_taipei
+from chipk.windows import DailyRankingStore
+
+def mark(store, day, fetched_at):
+    with connect(store.path) as conn:
+        conn.execute("INSERT OR REPLACE INTO ranking_daily_sync VALUES (?, ?, ?)", ("2313", day, fetched_at))
+
+def test_intraday_capture_is_recaptured_after_settlement(tmp_path):
+    store = DailyRankingStore(str(tmp_path / "chipk.db"))
+    mark(store, "2026-10-14", "2026-10-15 09:00:00")  # 隔天抓的：已結算
+    mark(store, "2026-10-15", "2026-10-15 10:30:00")  # 盤中抓的：未結算且早已超過重抓間隔
+    days = ["2026-10-14", "2026-10-15", "2026-10-16"]
+    assert store.days_to_capture("2313", days) == ["2026-10-15", "2026-10-16"]
+
+def test_same_day_capture_after_settlement_is_final(tmp_path):
+    store = DailyRankingStore(str(tmp_path / "chipk.db"))
+    mark(store, "2026-10-15", "2026-10-15 17:05:00")  # 當天結算後抓的
+    assert store.days_to_capture("2313", ["2026-10-15"]) == []
+
+def test_fresh_intraday_capture_waits(tmp_path):
+    store = DailyRankingStore(str(tmp_path / "chipk.db"))
+    now = now_taipei()
+    mark(store, now.strftime("%Y-%m-%d"), now.strftime("%Y-%m-%d %H:%M:%S"))
+    assert store.days_to_capture("2313", [now.strftime("%Y-%m-%d")]) == []